@@ -1,3 +0,0 @@
-from .models import BaseModel, BaseUpdateModel
-
-__all__ = ["BaseModel", "BaseUpdateModel"]
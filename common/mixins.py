@@ -0,0 +1,50 @@
+from django.db import models
+from rest_framework.permissions import SAFE_METHODS
+
+PROJECTED_FIELD_TYPES = (models.JSONField, models.TextField)
+
+
+def get_serializer_sources(serializer) -> set[str]:
+    """
+    Return the model attributes read by the fields ``serializer`` kept for
+    the current action (the first part of every field ``source``).
+    """
+    sources = set()
+
+    for name, field in serializer.fields.items():
+        if field.write_only:
+            continue
+
+        source = field.source or name
+        # فیلدهای محاسباتی با نام خودشان در نظر گرفته می شوند
+        sources.add(name if source == "*" else source.split(".")[0])
+
+    return sources
+
+
+class SerializerProjectionMixin:
+    """
+    Defer the large (JSON and text) columns the serializer of the current
+    action does not return, so they are never fetched on read requests.
+
+    Applied in ``filter_queryset``, which DRF calls for ``list``,
+    ``retrieve`` and ``get_object``.
+    """
+
+    def project_queryset(self, queryset):
+        if self.request is None or self.request.method not in SAFE_METHODS:
+            return queryset
+
+        sources = get_serializer_sources(self.get_serializer())
+        deferred_fields = [
+            field.name
+            for field in queryset.model._meta.concrete_fields
+            if isinstance(field, PROJECTED_FIELD_TYPES) and field.name not in sources
+        ]
+
+        if deferred_fields:
+            queryset = queryset.defer(*deferred_fields)
+        return queryset
+
+    def filter_queryset(self, queryset):
+        return self.project_queryset(super().filter_queryset(queryset))
@@ -30,3 +30,21 @@ class SafeDeleteModel(models.Model):
 
     class Meta:
         abstract = True
+
+
+class OutboxEvent(BaseModel):
+    """
+    A celery task call recorded in the same transaction as the change that
+    caused it, and published later by ``common.tasks.relay_outbox_events``.
+    """
+
+    task = models.CharField(verbose_name=_("نام تسک"), max_length=255)
+    args = models.JSONField(verbose_name=_("آرگومان ها"), default=list, blank=True)
+
+    class Meta:
+        verbose_name = _("رویداد صندوق خروجی")
+        verbose_name_plural = _("رویدادهای صندوق خروجی")
+        ordering = ["id"]
+
+    def __str__(self):
+        return f"{self.task}{tuple(self.args)}"
@@ -0,0 +1,33 @@
+from celery import current_app, shared_task
+from django.conf import settings
+from django.db import transaction
+
+from .models import OutboxEvent
+from .utils import publish_outbox_event
+
+
+@shared_task(
+    soft_time_limit=settings.LONG_TASK_SOFT_TIME_LIMIT,
+    time_limit=settings.LONG_TASK_TIME_LIMIT,
+)
+def relay_outbox_events():
+    batch_size = settings.OUTBOX_RELAY_BATCH_SIZE
+
+    while True:
+        with transaction.atomic():
+            events = list(
+                OutboxEvent.objects.select_for_update(skip_locked=True).order_by("id")[
+                    :batch_size
+                ]
+            )
+            if not events:
+                return
+
+            with current_app.producer_or_acquire() as producer:
+                for event in events:
+                    publish_outbox_event(event, producer=producer)
+
+            OutboxEvent.objects.filter(pk__in=[event.pk for event in events]).delete()
+
+        if len(events) < batch_size:
+            return
@@ -0,0 +1,43 @@
+import asyncio
+
+from ..exports import stream_csv_response, xlsx_file_response
+
+
+def consume_first_part(response):
+    async def first_part():
+        content = aiter(response)
+        part = await anext(content)
+        await content.aclose()
+        return part
+
+    return asyncio.run(first_part())
+
+
+class TestExportResponses:
+    def test_csv_is_streamed_in_chunks_under_asgi(self, settings):
+        settings.EXPORT_CHUNK_SIZE = 10
+        consumed = []
+
+        def rows():
+            for number in range(1000):
+                consumed.append(number)
+                yield [number]
+
+        response = stream_csv_response(
+            header=["number"], rows=rows(), filename="numbers.csv"
+        )
+
+        assert consume_first_part(response) == "\ufeffnumber\r\n".encode()
+        assert len(consumed) < 10
+
+    def test_xlsx_is_streamed_in_chunks_under_asgi(self, settings):
+        settings.EXPORT_CHUNK_SIZE = 1
+        response = xlsx_file_response(
+            header=["number"],
+            rows=[[number] for number in range(1000)],
+            filename="numbers.xlsx",
+        )
+        response.block_size = 16
+
+        assert len(consume_first_part(response)) == 16
+        assert response.file_to_stream.tell() == 16
@@ -0,0 +1,80 @@
+import threading
+from unittest.mock import patch
+
+import pytest
+from django.db import connection, transaction
+
+from submissions.tasks import handle_create_post_save_answer_set
+from submissions.tests.factories import AnswerSetFactory
+
+from ..models import OutboxEvent
+from ..tasks import relay_outbox_events
+from ..utils import enqueue_outbox_event
+
+
+def get_answer_set_events():
+    return OutboxEvent.objects.filter(task=handle_create_post_save_answer_set.name)
+
+
+@pytest.mark.django_db
+class TestOutboxEvents:
+    def test_event_is_written_in_the_same_transaction(self):
+        with transaction.atomic():
+            answer_set = AnswerSetFactory()
+
+            event = get_answer_set_events().get()
+            assert event.args == [answer_set.pk]
+
+    def test_event_is_not_written_on_rollback(self):
+        with pytest.raises(RuntimeError):
+            with transaction.atomic():
+                AnswerSetFactory()
+                raise RuntimeError
+
+        assert not get_answer_set_events().exists()
+
+    @patch("common.tasks.publish_outbox_event")
+    def test_event_is_published_once(self, mock_publish):
+        event = enqueue_outbox_event(handle_create_post_save_answer_set, 1)
+
+        relay_outbox_events()
+        relay_outbox_events()
+
+        mock_publish.assert_called_once()
+        assert mock_publish.call_args.args[0].pk == event.pk
+        assert not OutboxEvent.objects.exists()
+
+
+@pytest.mark.django_db(transaction=True)
+class TestConcurrentOutboxRelay:
+    def test_locked_event_is_relayed_once(self):
+        event = enqueue_outbox_event(handle_create_post_save_answer_set, 1)
+        publishing = threading.Event()
+        release = threading.Event()
+        published = []
+
+        def publish(event, producer=None):
+            published.append(event.pk)
+            publishing.set()
+            release.wait(5)
+
+        def relay():
+            try:
+                relay_outbox_events()
+            finally:
+                connection.close()
+
+        with patch("common.tasks.publish_outbox_event", side_effect=publish):
+            thread = threading.Thread(target=relay)
+            thread.start()
+            assert publishing.wait(5)
+
+            # رویداد قفل شده توسط رله دیگر رد می شود
+            relay_outbox_events()
+            assert thread.is_alive()
+
+            release.set()
+            thread.join()
+
+        assert published == [event.pk]
+        assert not OutboxEvent.objects.exists()
@@ -0,0 +1,41 @@
+from typing import Callable
+
+from celery import Task, current_app
+
+from .models import OutboxEvent
+
+_outbox_publishers: dict[str, Callable] = {}
+
+
+def register_outbox_publisher(task: Task, publisher: Callable) -> None:
+    """
+    Publish the outbox events of ``task`` by calling ``publisher(*args)``
+    instead of sending the task to the broker directly.
+    """
+    _outbox_publishers[task.name] = publisher
+
+
+def enqueue_outbox_event(task: Task, *args) -> OutboxEvent:
+    """
+    Record a call of ``task`` in the outbox.
+
+    The event is written in the current transaction, so it is published only
+    if (and after) that transaction commits.
+    """
+    return OutboxEvent.objects.create(task=task.name, args=list(args))
+
+
+def enqueue_outbox_events(task: Task, calls: list[list]) -> list[OutboxEvent]:
+    """Record one call of ``task`` per argument list of ``calls`` in the outbox."""
+    return OutboxEvent.objects.bulk_create(
+        [OutboxEvent(task=task.name, args=list(args)) for args in calls]
+    )
+
+
+def publish_outbox_event(event: OutboxEvent, producer=None) -> None:
+    publisher = _outbox_publishers.get(event.task)
+
+    if publisher is not None:
+        publisher(*event.args)
+    else:
+        current_app.send_task(event.task, args=event.args, producer=producer)
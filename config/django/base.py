@@ -11,6 +11,7 @@ ALLOWED_HOSTS = env.list("DJANGO_ALLOWED_HOSTS", default=["*"])
 # Application definition
 
 LOCAL_APPS = [
+    "common.apps.CommonConfig",
     "accounts.apps.AccountsConfig",
     "surveys.apps.SurveysConfig",
     "submissions.apps.SubmissionsConfig",
@@ -157,4 +158,6 @@ from config.settings.cors import *  # noqa
 from config.settings.email import *  # noqa
 from config.settings.jwt import *  # noqa
 from config.settings.rest import *  # noqa
+from config.settings.submissions import *  # noqa
+from config.settings.surveys import *  # noqa
 from config.settings.swagger import *  # noqa
@@ -1 +1,35 @@
-CELERY_BEAT_SCHEDULE = {}
+from config.settings.celery import OUTBOX_RELAY_INTERVAL
+from config.settings.submissions import (
+    OPTION_COUNTERS_RECONCILE_INTERVAL,
+    SUBMISSION_BATCH_CLAIM_IDLE,
+    SUBMISSION_BUFFER_CLAIM_IDLE,
+    SUBMISSION_QUOTAS_RECONCILE_INTERVAL,
+)
+from config.settings.surveys import ONE_TIME_LINK_TOKENS_CHECK_INTERVAL
+
+CELERY_BEAT_SCHEDULE = {
+    "relay-outbox-events": {
+        "task": "common.tasks.relay_outbox_events",
+        "schedule": OUTBOX_RELAY_INTERVAL,
+    },
+    "retry-pending-answer-sets": {
+        "task": "submissions.tasks.handle_pending_answer_sets",
+        "schedule": SUBMISSION_BATCH_CLAIM_IDLE,
+    },
+    "reconcile-option-counters": {
+        "task": "submissions.tasks.reconcile_option_counters",
+        "schedule": OPTION_COUNTERS_RECONCILE_INTERVAL,
+    },
+    "reconcile-submission-quotas": {
+        "task": "submissions.tasks.reconcile_submission_limits",
+        "schedule": SUBMISSION_QUOTAS_RECONCILE_INTERVAL,
+    },
+    "persist-buffered-answer-sets": {
+        "task": "submissions.tasks.persist_buffered_answer_sets",
+        "schedule": SUBMISSION_BUFFER_CLAIM_IDLE,
+    },
+    "refresh-one-time-link-tokens": {
+        "task": "surveys.tasks.refresh_one_time_link_tokens",
+        "schedule": ONE_TIME_LINK_TOKENS_CHECK_INTERVAL,
+    },
+}
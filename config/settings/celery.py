@@ -7,3 +7,14 @@ CELERY_TIMEZONE = "UTC"
 CELERY_TASK_SOFT_TIME_LIMIT = 20  # seconds
 CELERT_TASK_TIME_LIMIT = 30  # seconds
 CELERY_TASK_MAX_RETRIES = 3
+
+# Limits of the bulk tasks (form ingestion, link generation, reconciliation,
+# stream and outbox drains, cascading soft deletes) that outgrow the defaults
+LONG_TASK_SOFT_TIME_LIMIT = env.int(
+    "LONG_TASK_SOFT_TIME_LIMIT", default=60 * 10
+)  # seconds
+LONG_TASK_TIME_LIMIT = env.int("LONG_TASK_TIME_LIMIT", default=60 * 11)  # seconds
+
+# Transactional outbox relay (see common.tasks.relay_outbox_events)
+OUTBOX_RELAY_INTERVAL = env.float("OUTBOX_RELAY_INTERVAL", default=1.0)  # seconds
+OUTBOX_RELAY_BATCH_SIZE = env.int("OUTBOX_RELAY_BATCH_SIZE", default=500)
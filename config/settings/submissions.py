@@ -0,0 +1,44 @@
+from config.env import env
+
+# Batched ingestion of new answer sets (submissions per second above which
+# answer sets are queued and materialized in batches)
+SUBMISSION_BATCH_THRESHOLD = env.int("SUBMISSION_BATCH_THRESHOLD", default=20)
+SUBMISSION_BATCH_SIZE = env.int("SUBMISSION_BATCH_SIZE", default=100)
+SUBMISSION_BATCH_MAX_WAIT = env.float("SUBMISSION_BATCH_MAX_WAIT", default=0.5)
+SUBMISSION_BATCH_CLAIM_IDLE = env.float(
+    "SUBMISSION_BATCH_CLAIM_IDLE", default=60
+)  # seconds a claimed batch waits for its acknowledgement before it is retried
+
+# Live charts of a survey are recomputed and broadcast at most once per window
+LIVE_BROADCAST_WINDOW = env.float("LIVE_BROADCAST_WINDOW", default=0.25)  # seconds
+
+# Per-option chart counters kept in redis (rebuilt from the answers once expired)
+OPTION_COUNTERS_TIMEOUT = env.int("OPTION_COUNTERS_TIMEOUT", default=60 * 60 * 24)
+OPTION_COUNTERS_RECONCILE_INTERVAL = env.float(
+    "OPTION_COUNTERS_RECONCILE_INTERVAL", default=60 * 15
+)  # seconds
+OPTION_COUNTERS_REBUILD_TIMEOUT = env.int(
+    "OPTION_COUNTERS_REBUILD_TIMEOUT", default=60 * 10
+)  # seconds a rebuild may take before another one replaces it
+
+# Computed chart results, cached per form counters generation
+CHARTS_CACHE_TIMEOUT = env.int("CHARTS_CACHE_TIMEOUT", default=60 * 10)  # seconds
+CHARTS_CACHE_LOCK_TIMEOUT = env.float("CHARTS_CACHE_LOCK_TIMEOUT", default=5)  # seconds
+
+# Per-user submission quota counters are reset from the answer sets this often
+SUBMISSION_QUOTAS_RECONCILE_INTERVAL = env.float(
+    "SUBMISSION_QUOTAS_RECONCILE_INTERVAL", default=60 * 60
+)  # seconds
+
+# Buffered submissions: validated answer sets are appended to a redis stream
+# (the API answers 202) and inserted in batches by a consumer group
+SUBMISSION_BUFFER_ENABLED = env.bool("SUBMISSION_BUFFER_ENABLED", default=False)
+SUBMISSION_BUFFER_FLUSH_INTERVAL = env.float(
+    "SUBMISSION_BUFFER_FLUSH_INTERVAL", default=0.5
+)  # seconds
+SUBMISSION_BUFFER_CLAIM_IDLE = env.float(
+    "SUBMISSION_BUFFER_CLAIM_IDLE", default=60
+)  # seconds an unacknowledged entry waits before another consumer takes it
+SUBMISSION_BUFFER_STATUS_TIMEOUT = env.int(
+    "SUBMISSION_BUFFER_STATUS_TIMEOUT", default=60 * 60 * 24
+)
@@ -0,0 +1,59 @@
+from config.env import env
+
+# Forms with at most this many questions (nested ones included) are ingested
+# inside the upload request instead of by the post save task
+SURVEY_INLINE_INGESTION_MAX_QUESTIONS = env.int(
+    "SURVEY_INLINE_INGESTION_MAX_QUESTIONS", default=500
+)
+
+# Compiled form schemas, cached in redis and in a small per-process LRU
+FORM_SCHEMA_CACHE_TIMEOUT = env.int("FORM_SCHEMA_CACHE_TIMEOUT", default=60 * 60 * 24)
+FORM_SCHEMA_LOCAL_TIMEOUT = env.float("FORM_SCHEMA_LOCAL_TIMEOUT", default=5)  # seconds
+FORM_SCHEMA_LOCAL_CACHE_SIZE = env.int("FORM_SCHEMA_LOCAL_CACHE_SIZE", default=256)
+
+# Maximum number of surveys cloned from a prebuilt survey in one request
+PREBUILT_CLONE_BATCH_MAX_SIZE = env.int("PREBUILT_CLONE_BATCH_MAX_SIZE", default=100)
+
+# Number of documents created per batch by the NDJSON survey import
+SURVEY_IMPORT_BATCH_SIZE = env.int("SURVEY_IMPORT_BATCH_SIZE", default=100)
+
+# Redis bitmaps of audience members, rebuilt from the db once expired
+AUDIENCE_BITMAP_TIMEOUT = env.int("AUDIENCE_BITMAP_TIMEOUT", default=60 * 60)
+
+# Phone numbers checked per IN query when validating audience phone lists
+TARGET_AUDIENCE_PHONE_CHUNK_SIZE = env.int(
+    "TARGET_AUDIENCE_PHONE_CHUNK_SIZE", default=1000
+)
+
+# Cached active version, settings and target of a survey used by submissions
+SUBMISSION_CONTEXT_CACHE_TIMEOUT = env.int(
+    "SUBMISSION_CONTEXT_CACHE_TIMEOUT", default=60 * 60
+)
+
+# One-time links: requests for more than ONE_TIME_LINKS_INLINE_MAX links are
+# generated by a background job, in bulk inserts of ONE_TIME_LINKS_BATCH_SIZE
+ONE_TIME_LINKS_INLINE_MAX = env.int("ONE_TIME_LINKS_INLINE_MAX", default=1000)
+ONE_TIME_LINKS_BATCH_SIZE = env.int("ONE_TIME_LINKS_BATCH_SIZE", default=1000)
+ONE_TIME_LINKS_MAX_NUMBER = env.int("ONE_TIME_LINKS_MAX_NUMBER", default=100000)
+ONE_TIME_LINKS_JOB_TIMEOUT = env.int("ONE_TIME_LINKS_JOB_TIMEOUT", default=60 * 60 * 24)
+
+# Default and maximum ``limit`` of the one-time links list
+ONE_TIME_LINKS_PAGE_SIZE = env.int("ONE_TIME_LINKS_PAGE_SIZE", default=100)
+ONE_TIME_LINKS_MAX_PAGE_SIZE = env.int("ONE_TIME_LINKS_MAX_PAGE_SIZE", default=1000)
+
+# Redis set of every one-time link token, so unknown tokens never reach the db.
+# It is rebuilt from the db (in batches of ONE_TIME_LINK_TOKENS_BATCH_SIZE) once
+# ONE_TIME_LINK_TOKENS_TIMEOUT has passed, checked every
+# ONE_TIME_LINK_TOKENS_CHECK_INTERVAL seconds
+ONE_TIME_LINK_TOKENS_TIMEOUT = env.int(
+    "ONE_TIME_LINK_TOKENS_TIMEOUT", default=60 * 60 * 24
+)
+ONE_TIME_LINK_TOKENS_BATCH_SIZE = env.int(
+    "ONE_TIME_LINK_TOKENS_BATCH_SIZE", default=5000
+)
+ONE_TIME_LINK_TOKENS_CHECK_INTERVAL = env.float(
+    "ONE_TIME_LINK_TOKENS_CHECK_INTERVAL", default=60
+)
+
+# Rows fetched per round trip by the server-side cursors of streamed exports
+EXPORT_CHUNK_SIZE = env.int("EXPORT_CHUNK_SIZE", default=2000)
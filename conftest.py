@@ -1,10 +1,17 @@
 import pytest
+from django.core.cache import cache
 from rest_framework.test import APIClient
 
 from accounts.models import User
 from accounts.tests.factories import UserFactory
 
 
+@pytest.fixture(autouse=True)
+def clear_cache():
+    # شمارنده ها، بیت مپ ها و کش های redis نباید بین تست ها باقی بمانند
+    cache.clear()
+
+
 @pytest.fixture
 def api_client():
     return APIClient()
@@ -1,6 +1,6 @@
 from django.contrib import admin
 
-from .models import Answer, AnswerSet
+from .models import Answer, AnswerSet, SubmissionQuota
 
 
 @admin.register(AnswerSet)
@@ -11,3 +11,8 @@ class AnswerSetAdmin(admin.ModelAdmin):
 @admin.register(Answer)
 class AnswerAdmin(admin.ModelAdmin):
     pass
+
+
+@admin.register(SubmissionQuota)
+class SubmissionQuotaAdmin(admin.ModelAdmin):
+    pass
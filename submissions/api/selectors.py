@@ -1,13 +1,24 @@
-from collections import defaultdict
+import hashlib
+import json
+import time
+from typing import Iterator
 
+from django.conf import settings
+from django.core.cache import cache
 from django.db.models import QuerySet
 from django.shortcuts import get_object_or_404
+from django.utils.timezone import localtime
 
 from surveys.api.selectors import get_form_by_uuid
-from surveys.models import Question, SurveyForm
+from surveys.models import SurveyForm
+from surveys.schema import QuestionSchema, get_form_schema
 
+from ..counters import OPTION_COUNTERS_TOTAL, get_counters_generation, get_option_counts
 from ..models import Answer, AnswerSet
 
+CHARTS_CACHE_KEY = "charts:data"
+CHARTS_CACHE_POLL_INTERVAL = 0.05  # seconds
+
 
 def get_all_answersets_for_form(survey_uuid: str, form_uuid: str) -> QuerySet:
     form = get_form_by_uuid(parent_uuid=survey_uuid, form_uuid=form_uuid)
@@ -19,6 +30,20 @@ def get_all_deleted_answersets_for_form(survey_uuid: str, form_uuid: str) -> Que
     return AnswerSet.deleted_objects.filter(survey_form=form)
 
 
+def filter_answersets_by_option(
+    answer_sets: QuerySet, question_name: str, option: str
+) -> QuerySet:
+    """
+    Keep the answer sets whose multiple choice answer to ``question_name``
+    contains ``option`` (a JSONB containment query served by the GIN index
+    on ``Answer.json_value``).
+    """
+    answers = Answer.active_objects.filter(
+        question__name=question_name, json_value__contains=[option]
+    )
+    return answer_sets.filter(pk__in=answers.values("answer_set_id"))
+
+
 def get_answerset_by_uuid(uuid: str) -> AnswerSet:
     return get_object_or_404(AnswerSet, uuid=uuid)
 
@@ -31,13 +56,10 @@ def get_soft_deleted_answerset_by_uuid(uuid: str) -> AnswerSet:
     return get_object_or_404(AnswerSet.deleted_objects, uuid=uuid)
 
 
-def build_radiogroup_chart(question: Question, answers: list[dict]) -> dict:
-    options = list(question.options.all())
-    answer_map = defaultdict(int)
-    for ans in answers:
-        answer_map[ans["text_value"]] += 1
-
-    option_dict = {opt.text_value: answer_map.get(opt.value, 0) for opt in options}
+def build_radiogroup_chart(question: QuestionSchema, counts: dict[str, int]) -> dict:
+    option_dict = {
+        label: counts.get(value, 0) for value, label in question.labels.items()
+    }
     total_submissions = sum(option_dict.values())
 
     return {
@@ -48,17 +70,12 @@ def build_radiogroup_chart(question: Question, answers: list[dict]) -> dict:
     }
 
 
-def build_checkbox_chart(question: Question, answers: list[dict]) -> dict:
-    options = list(question.options.all())
-    option_counts = {opt.text_value: 0 for opt in options}
-
-    for ans in answers:
-        json_val = ans.get("json_value")
-        for opt in options:
-            if opt.value in str(json_val):
-                option_counts[opt.text_value] += 1
+def build_checkbox_chart(question: QuestionSchema, counts: dict[str, int]) -> dict:
+    option_counts = {
+        label: counts.get(value, 0) for value, label in question.labels.items()
+    }
+    total_submissions = counts.get(OPTION_COUNTERS_TOTAL, 0)
 
-    total_submissions = len(answers)
     return {
         "question_name": question.name,
         "question_title": question.title,
@@ -67,13 +84,11 @@ def build_checkbox_chart(question: Question, answers: list[dict]) -> dict:
     }
 
 
-def build_boolean_chart(question: Question, answers: list[dict]) -> dict:
-    options = list(question.options.all())
-    answer_map = defaultdict(int)
-    for ans in answers:
-        answer_map[ans["boolean_value"]] += 1
-
-    option_dict = {opt.value: answer_map.get(opt.boolean_value, 0) for opt in options}
+def build_boolean_chart(question: QuestionSchema, counts: dict[str, int]) -> dict:
+    option_dict = {
+        opt.value: counts.get("true" if opt.boolean_value else "false", 0)
+        for opt in question.options
+    }
     total_submissions = sum(option_dict.values())
 
     return {
@@ -84,13 +99,8 @@ def build_boolean_chart(question: Question, answers: list[dict]) -> dict:
     }
 
 
-def build_imagepicker_chart(question: Question, answers: list[dict]) -> dict:
-    options = list(question.options.all())
-    answer_map = defaultdict(int)
-    for ans in answers:
-        answer_map[ans["text_value"]] += 1
-
-    option_dict = {opt.value: answer_map.get(opt.value, 0) for opt in options}
+def build_imagepicker_chart(question: QuestionSchema, counts: dict[str, int]) -> dict:
+    option_dict = {opt.value: counts.get(opt.value, 0) for opt in question.options}
     total_submissions = sum(option_dict.values())
 
     return {
@@ -102,42 +112,145 @@ def build_imagepicker_chart(question: Question, answers: list[dict]) -> dict:
 
 
 def get_charts_data(form: SurveyForm, questions: list | None = None) -> list[dict]:
-    base_questions = form.questions.filter(
-        type__in=[
+    questions = get_form_schema(form).get_questions(
+        types=[
             "radiogroup",
             "checkbox",
             "dropdown",
             "tagbox",
             "boolean",
             "imagepicker",
-        ]
-    ).prefetch_related("options")
-
-    if questions is not None:
-        questions = list(base_questions.filter(name__in=questions))
-    else:
-        questions = list(base_questions)
-
-    all_answer_sets = AnswerSet.active_objects.filter(survey_form=form)
+        ],
+        names=questions,
+    )
 
-    all_answers = Answer.active_objects.filter(
-        answer_set__in=all_answer_sets, question__in=questions
-    ).values("question_id", "text_value", "boolean_value", "json_value")
-
-    answers_by_question = defaultdict(list)
-    for ans in all_answers:
-        answers_by_question[ans["question_id"]].append(ans)
+    counts = get_option_counts(form, [question.id for question in questions])
 
     chart_data = []
     for question in questions:
-        question_answers = answers_by_question.get(question.id, [])
+        question_counts = counts.get(question.id, {})
         if question.type in ["radiogroup", "dropdown"]:
-            chart_data.append(build_radiogroup_chart(question, question_answers))
+            chart_data.append(build_radiogroup_chart(question, question_counts))
         elif question.type in ["checkbox", "tagbox"]:
-            chart_data.append(build_checkbox_chart(question, question_answers))
+            chart_data.append(build_checkbox_chart(question, question_counts))
         elif question.type == "boolean":
-            chart_data.append(build_boolean_chart(question, question_answers))
+            chart_data.append(build_boolean_chart(question, question_counts))
         elif question.type == "imagepicker":
-            chart_data.append(build_imagepicker_chart(question, question_answers))
+            chart_data.append(build_imagepicker_chart(question, question_counts))
 
     return chart_data
+
+
+def get_cached_charts_data(
+    form: SurveyForm, questions: list | None = None
+) -> list[dict]:
+    """
+    ``get_charts_data`` cached per form counters generation and question
+    selection. Concurrent misses of the same entry wait for the request
+    that holds the lock to compute it instead of computing it again.
+    """
+    selection = "*" if questions is None else ",".join(sorted(set(questions)))
+    key = "{}:{}:{}:{}".format(
+        CHARTS_CACHE_KEY,
+        form.id,
+        get_counters_generation(form.id),
+        hashlib.md5(selection.encode()).hexdigest(),
+    )
+
+    data = cache.get(key)
+    if data is not None:
+        return data
+
+    lock_key = f"{key}:lock"
+    lock_timeout = settings.CHARTS_CACHE_LOCK_TIMEOUT
+    locked = cache.add(lock_key, 1, timeout=max(int(lock_timeout), 1))
+
+    if not locked:
+        deadline = time.monotonic() + lock_timeout
+        while time.monotonic() < deadline:
+            time.sleep(CHARTS_CACHE_POLL_INTERVAL)
+            data = cache.get(key)
+            if data is not None:
+                return data
+
+    try:
+        data = get_charts_data(form, questions)
+        cache.set(key, data, timeout=settings.CHARTS_CACHE_TIMEOUT)
+    finally:
+        if locked:
+            cache.delete(lock_key)
+
+    return data
+
+
+def _format_export_value(question: QuestionSchema, value):
+    if value is None:
+        return ""
+    if isinstance(value, list) and not any(
+        isinstance(item, (list, dict)) for item in value
+    ):
+        return ", ".join(str(_format_export_value(question, item)) for item in value)
+    if isinstance(value, (list, dict)):
+        return json.dumps(value, ensure_ascii=False)
+    if isinstance(value, bool):
+        return value
+    # مقدار گزینه ها با متن نمایش داده شده آن ها جایگزین می شود
+    return question.labels.get(str(value), value)
+
+
+def _get_export_questions(form: SurveyForm) -> list[QuestionSchema]:
+    """
+    Return the top-level questions of ``form`` in form order: the order of
+    their elements in the SurveyJS pages, then creation order (``id``).
+    """
+    positions = {}
+    for page in (form.metadata or {}).get("pages") or []:
+        for element in page.get("elements") or []:
+            positions.setdefault(element.get("name"), len(positions))
+
+    # جواب سوالات تو در تو داخل مقدار سوال والد ذخیره می شود
+    questions = [
+        question
+        for question in get_form_schema(form).questions
+        if question.parent_id is None
+    ]
+    return sorted(
+        questions,
+        key=lambda question: (
+            positions.get(question.name, len(positions)),
+            question.id,
+        ),
+    )
+
+
+def get_results_export_header(form: SurveyForm) -> list[str]:
+    questions = _get_export_questions(form)
+    return ["answer_set", "user", "created_at"] + [
+        question.title or question.name for question in questions
+    ]
+
+
+def iter_results_export_rows(form: SurveyForm) -> Iterator[list]:
+    """
+    Yield one row per active answer set of ``form``, with one column per
+    top-level question. The answer sets are read from a server-side cursor
+    in chunks of ``EXPORT_CHUNK_SIZE`` rows, so memory does not grow with
+    the number of responses.
+    """
+    questions = _get_export_questions(form)
+    answer_sets = (
+        AnswerSet.active_objects.filter(survey_form=form)
+        .order_by("created_at", "id")
+        .values_list("uuid", "user__phone_number", "created_at", "metadata")
+        .iterator(chunk_size=settings.EXPORT_CHUNK_SIZE)
+    )
+
+    for uuid, phone_number, created_at, metadata in answer_sets:
+        yield [
+            str(uuid),
+            phone_number or "",
+            localtime(created_at).strftime("%Y-%m-%d %H:%M:%S"),
+        ] + [
+            _format_export_value(question, metadata.get(question.name))
+            for question in questions
+        ]
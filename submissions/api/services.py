@@ -1,16 +1,30 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.contrib.auth.models import AnonymousUser
+from django.db import transaction
 from django.utils import timezone
+from rest_framework.exceptions import NotFound
 
-from surveys.api.selectors import (
-    get_active_version_form,
-    get_all_users_target,
-    get_one_time_link_by_token,
+from surveys.api.selectors import get_one_time_link_by_token
+from surveys.context import (
+    SubmissionContext,
+    aget_submission_context,
+    get_submission_context,
+)
+from surveys.links import (
+    clean_one_time_link_token,
+    is_one_time_link_token_known,
+    redeem_one_time_link,
 )
 
+from ..buffer import buffer_answer_set
 from ..models import AnswerSet
+from ..tasks import schedule_buffered_answer_sets_flush
 from .selectors import get_active_answeset_by_uuid
 from .validators import (
+    avalidate_user_in_target,
+    validate_answer_set_answers,
     validate_form_is_active,
     validate_form_is_editable,
     validate_one_time_link,
@@ -21,6 +35,58 @@ from .validators import (
 User = get_user_model()
 
 
+def _get_submitting_user(user: User | None) -> User | None:
+    if not user or isinstance(user, AnonymousUser):
+        return None
+    return user
+
+
+def _redeem_one_time_link(token: str, context: SubmissionContext) -> None:
+    token = clean_one_time_link_token(token)
+    if not is_one_time_link_token_known(token):
+        raise NotFound()
+
+    while not redeem_one_time_link(token, context.survey_id):
+        # علت شکست فقط در همین مسیر با خواندن لینک مشخص می شود؛ اگر لینک
+        # دوباره آزاد شده باشد اعتبارسنجی خطا نمی دهد و تلاش تکرار می شود
+        validate_one_time_link(get_one_time_link_by_token(token), context)
+
+
+@transaction.atomic
+def save_answerset(
+    *,
+    context: SubmissionContext,
+    user: User | None,
+    metadata: dict,
+    token: str | None = None,
+) -> AnswerSet:
+    """
+    Write a validated submission: redeem the one-time link ``token`` or
+    reserve the user's quota, then insert the answer set, in a single
+    transaction.
+
+    With ``SUBMISSION_BUFFER_ENABLED`` the answer set is appended to the
+    submission stream once the transaction commits and returned unsaved,
+    with its ``uuid``.
+    """
+    answer_set = AnswerSet(user=user, survey_form_id=context.form_id, metadata=metadata)
+    validate_answer_set_answers(answer_set)
+
+    if token:
+        _redeem_one_time_link(token, context)
+    else:
+        validate_user_submission_limit(context, user)
+
+    if settings.SUBMISSION_BUFFER_ENABLED:
+        transaction.on_commit(lambda: buffer_answer_set(answer_set))
+        transaction.on_commit(schedule_buffered_answer_sets_flush)
+    else:
+        answer_set.save()
+
+    return answer_set
+
+
+@transaction.atomic
 def create_answerset(
     *,
     user: User | None = None,
@@ -28,57 +94,79 @@ def create_answerset(
     metadata: dict,
     token: str | None = None,
 ) -> AnswerSet:
-    form = get_active_version_form(survey_uuid)
-    validate_form_is_active(form)
+    context = get_submission_context(survey_uuid)
+    validate_form_is_active(context)
 
     if token:
-        user = None
+        return save_answerset(
+            context=context, user=None, metadata=metadata, token=token
+        )
 
-        one_time_link = get_one_time_link_by_token(token)
-        validate_one_time_link(one_time_link, form)
+    user = _get_submitting_user(user)
+    if context.target_id:
+        validate_user_in_target(context.target_id, user)
 
-        one_time_link.is_used = True
-        one_time_link.save()
+    return save_answerset(context=context, user=user, metadata=metadata)
 
-    else:
-        target = form.target
 
-        if not user:
-            user = None
-        else:
-            if user and isinstance(user, AnonymousUser):
-                user = None
+async def acreate_answerset(
+    *,
+    user: User | None = None,
+    survey_uuid: str,
+    metadata: dict,
+    token: str | None = None,
+) -> AnswerSet:
+    """
+    ``create_answerset`` for async views: the lookups and validation use the
+    async cache and ORM. Django has no async transactions, so
+    ``save_answerset`` runs in a worker thread.
+    """
+    context = await aget_submission_context(survey_uuid)
+    validate_form_is_active(context)
 
-        if target:
-            target_users = get_all_users_target(target)
-            validate_user_in_target(target_users, user)
+    if token:
+        return await sync_to_async(save_answerset)(
+            context=context, user=None, metadata=metadata, token=token
+        )
 
-        validate_user_submission_limit(form, user)
+    user = _get_submitting_user(user)
+    if context.target_id:
+        await avalidate_user_in_target(context.target_id, user)
 
-    return AnswerSet.objects.create(user=user, survey_form=form, metadata=metadata)
+    return await sync_to_async(save_answerset)(
+        context=context, user=user, metadata=metadata
+    )
 
 
+@transaction.atomic
 def update_answerset(
     *,
     survey_uuid: str,
     answerset_uuid: str,
     metadata: dict,
 ) -> AnswerSet:
-    form = get_active_version_form(survey_uuid)
+    context = get_submission_context(survey_uuid)
     answer_set = get_active_answeset_by_uuid(answerset_uuid)
 
-    validate_form_is_active(form)
-    validate_form_is_editable(form)
+    validate_form_is_active(context)
+    validate_form_is_editable(context)
 
     updated_metadata = answer_set.metadata
-    updated_metadata.update(metadata)
+    for question_name, answer_value in metadata.items():
+        # مقدار null به معنای حذف جواب سوال است
+        if answer_value is None:
+            updated_metadata.pop(question_name, None)
+        else:
+            updated_metadata[question_name] = answer_value
 
     answer_set.metadata = updated_metadata
+    validate_answer_set_answers(answer_set)
     answer_set.save(update_fields=["metadata"])
 
     return answer_set
 
 
+@transaction.atomic
 def delete_answerset(answer_set: AnswerSet, user: User) -> None:
     if user.is_superuser or user.is_staff:
         answer_set.delete()
@@ -87,6 +175,7 @@ def delete_answerset(answer_set: AnswerSet, user: User) -> None:
         answer_set.save(update_fields=["deleted_at"])
 
 
+@transaction.atomic
 def restore_answerset(answer_set: AnswerSet) -> None:
     answer_set.deleted_at = None
     answer_set.save(update_fields=["deleted_at"])
@@ -1,4 +1,5 @@
 from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError as DjangoValidationError
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from rest_framework.exceptions import (
@@ -8,16 +9,19 @@ from rest_framework.exceptions import (
 )
 
 from submissions.models import AnswerSet
-from surveys.models import OneTimeLink, SurveyForm
+from submissions.quotas import reserve_submission_quota
+from submissions.utils import build_answer_set_answers
+from surveys.context import SubmissionContext
+from surveys.models import OneTimeLink, TargetAudienceMember
+from surveys.schema import get_form_schema
 
 User = get_user_model()
 
 
-def validate_form_is_active(form: SurveyForm):
-    settings = form.settings
+def validate_form_is_active(context: SubmissionContext):
     now = timezone.now()
 
-    if settings.start_date and settings.start_date > now:
+    if context.start_date and context.start_date > now:
         raise PermissionDenied(
             detail={
                 "code": "FORM_NOT_STARTED",
@@ -25,7 +29,7 @@ def validate_form_is_active(form: SurveyForm):
             }
         )
 
-    if settings.end_date and settings.end_date < now:
+    if context.end_date and context.end_date < now:
         raise PermissionDenied(
             detail={
                 "code": "FORM_EXPIRED",
@@ -42,9 +46,11 @@ def validate_form_is_active(form: SurveyForm):
     #     )
 
 
-def validate_user_submission_limit(form: SurveyForm, user: User | None = None):
-    settings = form.settings
-    max_response = settings.max_submissions_per_user
+def validate_user_submission_limit(
+    context: SubmissionContext, user: User | None = None
+):
+    """Reserve one submission of the user's quota on the form, if it has one."""
+    max_response = context.max_submissions_per_user
 
     if max_response:
         if not user:
@@ -55,9 +61,9 @@ def validate_user_submission_limit(form: SurveyForm, user: User | None = None):
                 }
             )
 
-        count = AnswerSet.objects.filter(user=user, survey_form=form).count()
-
-        if count >= max_response:
+        if not reserve_submission_quota(
+            form_id=context.form_id, user=user, limit=max_response
+        ):
             raise PermissionDenied(
                 detail={
                     "code": "TOO_MANY_SUBMISSIONS",
@@ -68,10 +74,26 @@ def validate_user_submission_limit(form: SurveyForm, user: User | None = None):
             )
 
 
-def validate_form_is_editable(form: SurveyForm):
-    settings = form.settings
+def validate_answer_set_answers(answer_set: AnswerSet):
+    """
+    Reject the submission if its answers cannot be materialized, instead of
+    leaving the answer set without answers once the task runs.
+    """
+    schema = get_form_schema(answer_set.survey_form)
+
+    try:
+        build_answer_set_answers(answer_set=answer_set, schema=schema)
+    except DjangoValidationError as exc:
+        raise ValidationError(
+            detail={
+                "code": "INVALID_ANSWERS",
+                "message": exc.messages,
+            }
+        )
+
 
-    if not settings.is_editable:
+def validate_form_is_editable(context: SubmissionContext):
+    if not context.is_editable:
         raise PermissionDenied(
             detail={
                 "code": "FORM_NOT_EDITABLE",
@@ -87,12 +109,28 @@ def validate_form_is_editable(form: SurveyForm):
 #         raise ValidationError({"answer_set": _("این جواب متعلق به این فرم نیست.")})
 
 
-def validate_user_in_target(users, user: User):
+def validate_user_in_target(target_id: int, user: User):
+    if user is None:
+        raise NotAuthenticated(
+            detail={"code": "USER_NOT_AUTHENTICATED", "message": _("احراز هویت بکنید.")}
+        )
+    if not TargetAudienceMember.objects.filter(target_id=target_id, user=user).exists():
+        raise PermissionDenied(
+            detail={
+                "code": "USER_NOT_IN_TARGET",
+                "message": _("شما اجازه پاسخگویی به این پرسشنامه را ندارید."),
+            }
+        )
+
+
+async def avalidate_user_in_target(target_id: int, user: User | None):
     if user is None:
         raise NotAuthenticated(
             detail={"code": "USER_NOT_AUTHENTICATED", "message": _("احراز هویت بکنید.")}
         )
-    if user not in users:
+    if not await TargetAudienceMember.objects.filter(
+        target_id=target_id, user=user
+    ).aexists():
         raise PermissionDenied(
             detail={
                 "code": "USER_NOT_IN_TARGET",
@@ -101,8 +139,8 @@ def validate_user_in_target(users, user: User):
         )
 
 
-def validate_one_time_link(link: OneTimeLink, form: SurveyForm):
-    if link.survey.active_version != form:
+def validate_one_time_link(link: OneTimeLink, context: SubmissionContext):
+    if link.survey_id != context.survey_id:
         raise ValidationError(
             detail={
                 "code": "TOKEN_NOT_FOR_SURVEY",
@@ -1,19 +1,43 @@
+import json
+
+from asgiref.sync import sync_to_async
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.http import JsonResponse
 from django.utils.translation import gettext_lazy as _
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
 from rest_framework import status
 from rest_framework.decorators import action
+from rest_framework.exceptions import APIException, NotFound, ParseError
 from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
 from rest_framework.viewsets import ModelViewSet
+from rest_framework_simplejwt.authentication import JWTAuthentication
 
+from common.exports import stream_csv_response, xlsx_file_response
+from common.mixins import SerializerProjectionMixin
 from surveys.api import selectors as surveys_selectors
 
+from ..buffer import get_buffered_answer_set_status
 from . import selectors as submission_selectors
 from . import services
 from .permissions import IsOwner, IsOwnerOrSurveyOwnerOrAdmin, IsSurveyOwnerOrAdmin
 from .serializers import AnswerSetSerializer
 
 
-class AnswerSetViewSet(ModelViewSet):
+def _created_response_data(answer_set) -> tuple[dict, int]:
+    data = {"answer_set": answer_set.uuid}
+
+    # پاسخ بافر شده هنوز در پایگاه داده ذخیره نشده است
+    if answer_set.pk is None:
+        return (
+            {"message": _("نظر شما دریافت شد و به زودی ثبت می‌شود."), "data": data},
+            status.HTTP_202_ACCEPTED,
+        )
+    return {"message": _("نظر شما ثبت شد."), "data": data}, status.HTTP_201_CREATED
+
+
+class AnswerSetViewSet(SerializerProjectionMixin, ModelViewSet):
     serializer_class = AnswerSetSerializer
     http_method_names = ["get", "options", "head", "post", "patch", "delete"]
     lookup_field = "uuid"
@@ -34,10 +58,17 @@ class AnswerSetViewSet(ModelViewSet):
                 survey_uuid, form_uuid
             )
 
+        question_name = self.request.query_params.get("question")
+        option = self.request.query_params.get("option")
+        if question_name and option:
+            base_queryset = submission_selectors.filter_answersets_by_option(
+                base_queryset, question_name, option
+            )
+
         return base_queryset.select_related("user", "survey_form")
 
     def get_permissions(self, *args, **kwargs):
-        if self.action == "create" or self.action == "chart":
+        if self.action in ["create", "chart", "submission_status"]:
             return [AllowAny()]
         elif self.action == "partial_update":
             return [IsOwner()]
@@ -67,10 +98,7 @@ class AnswerSetViewSet(ModelViewSet):
         )
         serializer.is_valid(raise_exception=True)
         answer_set = serializer.save()
-        return Response(
-            {"message": _("نظر شما ثبت شد."), "data": {"answer_set": answer_set.uuid}},
-            status=status.HTTP_201_CREATED,
-        )
+        return Response(*_created_response_data(answer_set))
 
     def update(self, request, *args, **kwargs):
         context = self.get_serializer_context()
@@ -117,24 +145,105 @@ class AnswerSetViewSet(ModelViewSet):
 
     @action(detail=False, methods=["get"], url_path="archived")
     def list_deleted(self, request, *args, **kwargs):
-        queryset = self.get_queryset()
+        queryset = self.filter_queryset(self.get_queryset())
         serializer = self.get_serializer(queryset, many=True)
         return Response(serializer.data)
 
-    @action(detail=False, methods=["get"])
-    def chart(self, request, *args, **kwargs):
+    @action(
+        detail=False,
+        methods=["get"],
+        url_path=r"status/(?P<answer_set_uuid>[^/.]+)",
+    )
+    def submission_status(self, request, *args, **kwargs):
+        answer_set_uuid = kwargs["answer_set_uuid"]
+        try:
+            answer_set_status = get_buffered_answer_set_status(answer_set_uuid)
+        except DjangoValidationError:
+            answer_set_status = None
+
+        if answer_set_status is None:
+            raise NotFound({"message": _("پاسخی با این شناسه یافت نشد.")})
+
+        return Response({"answer_set": answer_set_uuid, "status": answer_set_status})
+
+    def get_form(self):
         survey_uuid = self.kwargs.get("survey_uuid")
         form_uuid = self.request.query_params.get("form_uuid")
         if form_uuid:
             form_uuid = form_uuid.strip()
-            form = surveys_selectors.get_active_survey_form_by_uuid(
+            return surveys_selectors.get_active_survey_form_by_uuid(
                 survey_uuid, form_uuid
             )
-        else:
-            form = surveys_selectors.get_active_version_form(survey_uuid)
+        return surveys_selectors.get_active_version_form(survey_uuid)
+
+    @action(detail=False, methods=["get"])
+    def chart(self, request, *args, **kwargs):
+        form = self.get_form()
 
         questions = self.request.query_params.get("questions", None)
         questions = questions.split(",") if questions else None
 
-        data = submission_selectors.get_charts_data(form, questions)
+        data = submission_selectors.get_cached_charts_data(form, questions)
         return Response(data)
+
+    @action(detail=False, methods=["get"], url_path=r"export/(?P<file_format>csv|xlsx)")
+    def export(self, request, *args, **kwargs):
+        form = self.get_form()
+        header = submission_selectors.get_results_export_header(form)
+        rows = submission_selectors.iter_results_export_rows(form)
+        filename = f"results-{form.uuid}.{kwargs['file_format']}"
+
+        if kwargs["file_format"] == "xlsx":
+            return xlsx_file_response(header=header, rows=rows, filename=filename)
+        return stream_csv_response(header=header, rows=rows, filename=filename)
+
+
+async def _aauthenticate(request):
+    user_auth = await sync_to_async(JWTAuthentication().authenticate)(request)
+    return user_auth[0] if user_auth else None
+
+
+def _error_response(exc: APIException) -> JsonResponse:
+    detail = exc.detail
+    if not isinstance(detail, (list, dict)):
+        detail = {"detail": detail}
+    return JsonResponse(
+        detail,
+        status=exc.status_code,
+        safe=False,
+        json_dumps_params={"ensure_ascii": False},
+    )
+
+
+@csrf_exempt
+@require_POST
+async def submit_answer_set(request, survey_uuid):
+    """
+    Async version of ``AnswerSetViewSet.create`` with the same request and
+    response, so submissions do not hold a thread of the ASGI server while
+    they wait on the cache and the database.
+    """
+    try:
+        user = await _aauthenticate(request)
+
+        try:
+            data = json.loads(request.body or b"{}")
+        except ValueError as exc:
+            raise ParseError(f"JSON parse error - {exc}")
+
+        serializer = AnswerSetSerializer(data=data, context={"action": "create"})
+        serializer.is_valid(raise_exception=True)
+
+        answer_set = await services.acreate_answerset(
+            user=user,
+            survey_uuid=survey_uuid,
+            metadata=serializer.validated_data["metadata"],
+            token=request.GET.get("token"),
+        )
+    except APIException as exc:
+        return _error_response(exc)
+
+    data, response_status = _created_response_data(answer_set)
+    return JsonResponse(
+        data, status=response_status, json_dumps_params={"ensure_ascii": False}
+    )
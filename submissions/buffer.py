@@ -0,0 +1,221 @@
+import json
+import os
+import socket
+from uuid import UUID
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection as db_connection
+from django.utils import timezone
+from django_redis import get_redis_connection
+from redis.exceptions import ResponseError
+
+from .models import AnswerSet
+
+SUBMISSION_BUFFER_STREAM = "submissions:buffer"
+SUBMISSION_BUFFER_GROUP = "submissions:buffer:persisters"
+SUBMISSION_BUFFER_STATUS_KEY = "submissions:buffer:status"
+SUBMISSION_BUFFER_FLUSH_KEY = "submissions:buffer:flush"
+SUBMISSION_BUFFER_PENDING_KEY = "submissions:buffer:pending"
+
+INSERT_BUFFERED_ANSWER_SETS_SQL = """
+    INSERT INTO {answer_set_table} (
+        uuid, user_id, survey_form_id, metadata, created_at, updated_at
+    )
+    SELECT
+        buffered.uuid, buffered.user_id, buffered.survey_form_id,
+        buffered.metadata, buffered.created_at, buffered.created_at
+    FROM unnest(
+        %s::uuid[], %s::bigint[], %s::bigint[], %s::jsonb[], %s::timestamptz[]
+    ) AS buffered(uuid, user_id, survey_form_id, metadata, created_at)
+    ON CONFLICT (uuid) DO NOTHING
+    RETURNING id
+"""
+
+# Acknowledge and delete the entries ARGV[2], ARGV[4], ... and decrement the
+# pending count of their form (ARGV[3], ARGV[5], ...) once, only for the
+# entries that were still pending (an entry can be acknowledged twice when
+# it was claimed by another consumer).
+ACK_BUFFERED_ANSWER_SETS_SCRIPT = """
+for i = 2, #ARGV, 2 do
+    if redis.call('XACK', KEYS[1], ARGV[1], ARGV[i]) == 1 then
+        redis.call('HINCRBY', KEYS[2], ARGV[i + 1], -1)
+    end
+    redis.call('XDEL', KEYS[1], ARGV[i])
+end
+"""
+
+
+class BufferStatus:
+    PENDING = "pending"
+    PERSISTED = "persisted"
+    FAILED = "failed"
+
+
+def _status_key(answer_set_uuid: UUID | str) -> str:
+    return f"{SUBMISSION_BUFFER_STATUS_KEY}:{answer_set_uuid}"
+
+
+def _consumer_name() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def buffer_answer_set(answer_set: AnswerSet) -> None:
+    """
+    Append the unsaved ``answer_set`` to the submission stream. It is
+    inserted later by ``insert_buffered_answer_sets`` under its ``uuid``.
+
+    Call it once the transaction that validated the submission (and took its
+    quota or one-time link) commits, so a rolled back submission is never
+    persisted.
+    """
+    connection = get_redis_connection("default")
+
+    pipeline = connection.pipeline()
+    pipeline.xadd(
+        SUBMISSION_BUFFER_STREAM,
+        {
+            "uuid": str(answer_set.uuid),
+            "user_id": answer_set.user_id or "",
+            "survey_form_id": answer_set.survey_form_id,
+            "metadata": json.dumps(answer_set.metadata, cls=DjangoJSONEncoder),
+            "created_at": timezone.now().isoformat(),
+        },
+    )
+    pipeline.set(
+        _status_key(answer_set.uuid),
+        BufferStatus.PENDING,
+        ex=settings.SUBMISSION_BUFFER_STATUS_TIMEOUT,
+    )
+    pipeline.hincrby(SUBMISSION_BUFFER_PENDING_KEY, answer_set.survey_form_id, 1)
+    pipeline.execute()
+
+
+def acquire_buffer_flush() -> bool:
+    """Return ``True`` if no flush of the submission stream is scheduled yet."""
+    connection = get_redis_connection("default")
+    timeout = max(int(settings.SUBMISSION_BUFFER_FLUSH_INTERVAL * 1000), 1) * 10
+    return bool(connection.set(SUBMISSION_BUFFER_FLUSH_KEY, 1, nx=True, px=timeout))
+
+
+def _ensure_group(connection) -> None:
+    try:
+        connection.xgroup_create(
+            SUBMISSION_BUFFER_STREAM, SUBMISSION_BUFFER_GROUP, id="0", mkstream=True
+        )
+    except ResponseError as exc:
+        if "BUSYGROUP" not in str(exc):
+            raise
+
+
+def read_buffered_answer_sets(count: int) -> list[tuple[bytes, dict]]:
+    """
+    Read up to ``count`` stream entries for this consumer: first the entries
+    another consumer read but did not acknowledge within
+    ``SUBMISSION_BUFFER_CLAIM_IDLE`` seconds, then new ones.
+    """
+    connection = get_redis_connection("default")
+    connection.delete(SUBMISSION_BUFFER_FLUSH_KEY)
+    _ensure_group(connection)
+    consumer = _consumer_name()
+
+    _next_id, entries, *_deleted = connection.xautoclaim(
+        SUBMISSION_BUFFER_STREAM,
+        SUBMISSION_BUFFER_GROUP,
+        consumer,
+        min_idle_time=int(settings.SUBMISSION_BUFFER_CLAIM_IDLE * 1000),
+        count=count,
+    )
+    # ورودی هایی که در این فاصله حذف شده اند بدون فیلد برمی گردند
+    entries = [entry for entry in entries if entry and entry[1]]
+
+    if len(entries) < count:
+        for _stream, new_entries in connection.xreadgroup(
+            SUBMISSION_BUFFER_GROUP,
+            consumer,
+            {SUBMISSION_BUFFER_STREAM: ">"},
+            count=count - len(entries),
+        ):
+            entries.extend(new_entries)
+
+    return entries
+
+
+def insert_buffered_answer_sets(entries: list[tuple[bytes, dict]]) -> list[int]:
+    """
+    Insert the answer sets of ``entries`` with one multi-row insert. An
+    answer set whose ``uuid`` is already stored (an entry delivered again
+    after a crash) is skipped, so every submission is stored once.
+
+    Returns the ids of the inserted answer sets.
+    """
+    columns = [[], [], [], [], []]
+    for _entry_id, fields in entries:
+        columns[0].append(fields[b"uuid"].decode())
+        columns[1].append(int(fields[b"user_id"]) if fields[b"user_id"] else None)
+        columns[2].append(int(fields[b"survey_form_id"]))
+        columns[3].append(fields[b"metadata"].decode())
+        columns[4].append(fields[b"created_at"].decode())
+
+    sql = INSERT_BUFFERED_ANSWER_SETS_SQL.format(
+        answer_set_table=AnswerSet._meta.db_table
+    )
+    with db_connection.cursor() as cursor:
+        cursor.execute(sql, columns)
+        return [row[0] for row in cursor.fetchall()]
+
+
+def ack_buffered_answer_sets(
+    entries: list[tuple[bytes, dict]], failed: list[tuple[bytes, dict]] = ()
+) -> None:
+    """
+    Remove handled ``entries`` from the stream and their pending status. The
+    ``failed`` ones (a subset of ``entries``) are marked as failed instead.
+    """
+    connection = get_redis_connection("default")
+    ack = connection.register_script(ACK_BUFFERED_ANSWER_SETS_SCRIPT)
+    args = [SUBMISSION_BUFFER_GROUP]
+    for entry_id, fields in entries:
+        args.extend([entry_id, fields[b"survey_form_id"]])
+
+    pipeline = connection.pipeline()
+    ack(
+        keys=[SUBMISSION_BUFFER_STREAM, SUBMISSION_BUFFER_PENDING_KEY],
+        args=args,
+        client=pipeline,
+    )
+    pipeline.delete(
+        *[_status_key(fields[b"uuid"].decode()) for _entry_id, fields in entries]
+    )
+    for _entry_id, fields in failed:
+        pipeline.set(
+            _status_key(fields[b"uuid"].decode()),
+            BufferStatus.FAILED,
+            ex=settings.SUBMISSION_BUFFER_STATUS_TIMEOUT,
+        )
+    pipeline.execute()
+
+
+def has_buffered_answer_sets(form_id: int) -> bool:
+    """Return ``True`` while answer sets of ``form_id`` wait in the stream."""
+    connection = get_redis_connection("default")
+    pending = connection.hget(SUBMISSION_BUFFER_PENDING_KEY, form_id)
+    return int(pending or 0) > 0
+
+
+def get_buffered_answer_set_status(answer_set_uuid: UUID | str) -> str | None:
+    """
+    Return ``persisted`` once the answer set is stored, ``pending`` while it
+    waits in the stream, ``failed`` if it could not be stored, and ``None``
+    if it is unknown.
+    """
+    # وضعیت بعد از commit درج حذف می شود، پس ابتدا redis بررسی می شود
+    connection = get_redis_connection("default")
+    buffered_status = connection.get(_status_key(answer_set_uuid))
+    if buffered_status:
+        return buffered_status.decode()
+
+    if AnswerSet.objects.filter(uuid=answer_set_uuid).exists():
+        return BufferStatus.PERSISTED
+
+    return None
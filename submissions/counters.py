@@ -0,0 +1,458 @@
+from collections import defaultdict
+from typing import Iterable
+from uuid import uuid4
+
+from django.conf import settings
+from django.db import connection, transaction
+from django_redis import get_redis_connection
+
+from surveys.models import Question, SurveyForm
+
+from .models import Answer, AnswerSet
+
+OPTION_COUNTERS_KEY = "charts:counters"
+OPTION_COUNTERS_TOTAL = "__total__"
+
+COUNTED_QUESTION_TYPES = [
+    Question.QuestionType.RADIOGROUP,
+    Question.QuestionType.DROPDOWN,
+    Question.QuestionType.CHECKBOX,
+    Question.QuestionType.TAGBOX,
+    Question.QuestionType.BOOLEAN,
+    Question.QuestionType.IMAGEPICKER,
+]
+MULTIPLE_CHOICE_QUESTION_TYPES = [
+    Question.QuestionType.CHECKBOX,
+    Question.QuestionType.TAGBOX,
+]
+COUNTED_ANSWER_FIELDS = [
+    "question_id",
+    "question_type",
+    "text_value",
+    "boolean_value",
+    "json_value",
+]
+
+# Whether the transaction ARGV[1] of a delta committed before the counters
+# snapshot (a pg_snapshot "xmin:xmax:xip,...") was taken, i.e. whether the
+# rebuild that took it already counted the delta.
+_SNAPSHOT_VISIBLE_LUA = """
+local function visible(snapshot, xid)
+    local xmin, xmax, xip = string.match(snapshot, '^(%d+):(%d+):(.*)$')
+    if xid < tonumber(xmin) then
+        return true
+    end
+    if xid >= tonumber(xmax) then
+        return false
+    end
+    for running in string.gmatch(xip, '%d+') do
+        if tonumber(running) == xid then
+            return false
+        end
+    end
+    return true
+end
+"""
+
+# Apply the deltas (KEYS[5..], ARGV[2..] as field/delta pairs) of the
+# transaction ARGV[1] unless the counters snapshot (KEYS[1]) already counted
+# it. While a rebuild is in progress (KEYS[2]) the delta is also recorded in
+# its journal (KEYS[3]), to be replayed on top of the recount. The generation
+# (KEYS[4]) only changes when the counters do.
+UPDATE_OPTION_COUNTERS_SCRIPT = (
+    _SNAPSHOT_VISIBLE_LUA
+    + """
+local xid = tonumber(ARGV[1])
+if redis.call('EXISTS', KEYS[2]) == 1 then
+    local delta = {xid = xid, keys = {}, fields = {}, values = {}}
+    for i = 5, #KEYS do
+        table.insert(delta.keys, KEYS[i])
+        table.insert(delta.fields, ARGV[2 * i - 8])
+        table.insert(delta.values, ARGV[2 * i - 7])
+    end
+    redis.call('RPUSH', KEYS[3], cjson.encode(delta))
+    redis.call('PEXPIRE', KEYS[3], redis.call('PTTL', KEYS[2]))
+end
+local snapshot = redis.call('GET', KEYS[1])
+if not snapshot or visible(snapshot, xid) then
+    return 0
+end
+for i = 5, #KEYS do
+    redis.call('HINCRBY', KEYS[i], ARGV[2 * i - 8], ARGV[2 * i - 7])
+end
+redis.call('INCR', KEYS[4])
+return 1
+"""
+)
+
+# Store the recount of the rebuild ARGV[1] if it still owns the rebuild
+# (KEYS[2]): replace the hashes (KEYS[5..], ARGV[4..] as a field count
+# followed by field/value pairs per hash), replay the journaled deltas
+# (KEYS[3]) its snapshot ARGV[2] did not count and mark the counters ready
+# (KEYS[1]) for ARGV[3] seconds.
+STORE_OPTION_COUNTERS_SCRIPT = (
+    _SNAPSHOT_VISIBLE_LUA
+    + """
+if redis.call('GET', KEYS[2]) ~= ARGV[1] then
+    return 0
+end
+local position = 4
+for i = 5, #KEYS do
+    local count = tonumber(ARGV[position])
+    redis.call('DEL', KEYS[i])
+    if count > 0 then
+        redis.call('HSET', KEYS[i], unpack(ARGV, position + 1, position + 2 * count))
+    end
+    position = position + 2 * count + 1
+end
+for _, entry in ipairs(redis.call('LRANGE', KEYS[3], 0, -1)) do
+    local delta = cjson.decode(entry)
+    if not visible(ARGV[2], delta.xid) then
+        for j = 1, #delta.keys do
+            redis.call('HINCRBY', delta.keys[j], delta.fields[j], delta.values[j])
+        end
+    end
+end
+redis.call('SET', KEYS[1], ARGV[2], 'EX', ARGV[3])
+redis.call('DEL', KEYS[2], KEYS[3])
+redis.call('INCR', KEYS[4])
+return 1
+"""
+)
+
+
+def _counters_key(form_id: int, question_id: int) -> str:
+    return f"{OPTION_COUNTERS_KEY}:{form_id}:{question_id}"
+
+
+def _counters_ready_key(form_id: int) -> str:
+    return f"{OPTION_COUNTERS_KEY}:{form_id}:ready"
+
+
+def _counters_generation_key(form_id: int) -> str:
+    return f"{OPTION_COUNTERS_KEY}:{form_id}:generation"
+
+
+def _counters_rebuild_key(form_id: int) -> str:
+    return f"{OPTION_COUNTERS_KEY}:{form_id}:rebuild"
+
+
+def _counters_journal_key(form_id: int) -> str:
+    return f"{OPTION_COUNTERS_KEY}:{form_id}:journal"
+
+
+def _counters_state_keys(form_id: int) -> list[str]:
+    return [
+        _counters_ready_key(form_id),
+        _counters_rebuild_key(form_id),
+        _counters_journal_key(form_id),
+        _counters_generation_key(form_id),
+    ]
+
+
+def get_counters_snapshot(form_id: int) -> str | None:
+    """
+    Return the database snapshot the counters of ``form_id`` were counted
+    in, or ``None`` if they are not built.
+    """
+    snapshot = get_redis_connection("default").get(_counters_ready_key(form_id))
+    return snapshot.decode() if snapshot else None
+
+
+def get_counters_generation(form_id: int) -> int:
+    """
+    Return the generation of the counters of ``form_id``, bumped whenever
+    they change so results derived from them can be cached per generation.
+    """
+    generation = get_redis_connection("default").get(_counters_generation_key(form_id))
+    return int(generation or 0)
+
+
+def answer_to_counted(answer: Answer) -> dict:
+    return {field: getattr(answer, field) for field in COUNTED_ANSWER_FIELDS}
+
+
+def get_counted_values(answer: dict) -> list[str]:
+    """
+    Return the option values an answer counts for.
+
+    ``answer`` is a dict holding (at least) ``COUNTED_ANSWER_FIELDS``.
+    """
+    question_type = answer["question_type"]
+
+    if question_type == Question.QuestionType.BOOLEAN:
+        value = answer["boolean_value"]
+        if value is None:
+            return []
+        return ["true" if value else "false"]
+
+    if question_type in MULTIPLE_CHOICE_QUESTION_TYPES:
+        values = answer["json_value"]
+        if not isinstance(values, list):
+            return []
+        return list(dict.fromkeys(str(value) for value in values))
+
+    value = answer["text_value"]
+    return [] if value is None else [value]
+
+
+def count_answers(answers: Iterable[dict]) -> dict[int, dict[str, int]]:
+    """
+    Count ``answers`` per question and option value.
+
+    Every answer also counts for ``OPTION_COUNTERS_TOTAL``.
+    """
+    counts = defaultdict(lambda: defaultdict(int))
+
+    for answer in answers:
+        if answer["question_type"] not in COUNTED_QUESTION_TYPES:
+            continue
+
+        question_counts = counts[answer["question_id"]]
+        question_counts[OPTION_COUNTERS_TOTAL] += 1
+        for value in get_counted_values(answer):
+            question_counts[value] += 1
+
+    return counts
+
+
+def get_transaction_id() -> int:
+    """Return the id of the current database transaction."""
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT pg_current_xact_id()::text")
+        return int(cursor.fetchone()[0])
+
+
+def update_option_counters(
+    form_id: int,
+    transaction_id: int,
+    *,
+    added: Iterable[dict] = (),
+    removed: Iterable[dict] = (),
+) -> None:
+    """
+    Apply the answers ``added`` to and ``removed`` from ``form_id`` to its
+    counters with one script call.
+
+    ``transaction_id`` is the transaction that committed the change, so a
+    change already counted by a rebuild is not counted twice and one that
+    commits while a rebuild is counting is replayed on top of it.
+    """
+    deltas = defaultdict(lambda: defaultdict(int))
+
+    for sign, answers in [(1, added), (-1, removed)]:
+        for question_id, question_counts in count_answers(answers).items():
+            for value, count in question_counts.items():
+                deltas[question_id][value] += sign * count
+
+    keys = _counters_state_keys(form_id)
+    args = [transaction_id]
+    for question_id, question_deltas in deltas.items():
+        for value, delta in question_deltas.items():
+            if delta:
+                keys.append(_counters_key(form_id, question_id))
+                args.extend([value, delta])
+
+    connection = get_redis_connection("default")
+    update = connection.register_script(UPDATE_OPTION_COUNTERS_SCRIPT)
+    update(keys=keys, args=args)
+
+
+def update_option_counters_on_commit(
+    form_id: int,
+    *,
+    added: Iterable[dict] = (),
+    removed: Iterable[dict] = (),
+) -> None:
+    """Apply ``added`` and ``removed`` to the counters once the transaction commits."""
+    transaction_id = get_transaction_id()
+    transaction.on_commit(
+        lambda: update_option_counters(
+            form_id, transaction_id, added=added, removed=removed
+        )
+    )
+
+
+def invalidate_option_counters(form_ids: Iterable[int]) -> None:
+    """
+    Drop the counters of ``form_ids`` (rebuilt on next read), e.g. after
+    their answer sets were deleted or restored in bulk. A rebuild in progress
+    may have counted before the change, so it is abandoned as well.
+    """
+    pipeline = get_redis_connection("default").pipeline(transaction=False)
+    for form_id in form_ids:
+        pipeline.delete(
+            _counters_ready_key(form_id),
+            _counters_rebuild_key(form_id),
+            _counters_journal_key(form_id),
+        )
+        pipeline.incr(_counters_generation_key(form_id))
+    pipeline.execute()
+
+
+# A single statement, so the counts and the snapshot they were taken in match
+OPTION_COUNTS_SQL = """
+    WITH answer AS (
+        SELECT
+            answer.id,
+            answer.question_id,
+            answer.question_type,
+            answer.text_value,
+            answer.boolean_value,
+            answer.json_value
+        FROM {answer_table} AS answer
+        INNER JOIN {answer_set_table} AS answer_set
+            ON answer_set.id = answer.answer_set_id
+        WHERE answer_set.survey_form_id = %(form_id)s
+            AND answer_set.deleted_at IS NULL
+            AND answer.deleted_at IS NULL
+            AND answer.question_type = ANY(%(counted_types)s)
+    ),
+    counted AS (
+        SELECT answer.question_id, %(total)s AS value, COUNT(*) AS count
+        FROM answer
+        GROUP BY answer.question_id
+
+        UNION ALL
+
+        SELECT
+            answer.question_id,
+            CASE WHEN answer.boolean_value THEN 'true' ELSE 'false' END,
+            COUNT(*)
+        FROM answer
+        WHERE answer.question_type = %(boolean_type)s
+            AND answer.boolean_value IS NOT NULL
+        GROUP BY 1, 2
+
+        UNION ALL
+
+        SELECT answer.question_id, answer.text_value, COUNT(*)
+        FROM answer
+        WHERE answer.question_type <> %(boolean_type)s
+            AND answer.question_type <> ALL(%(multiple_choice_types)s)
+            AND answer.text_value IS NOT NULL
+        GROUP BY 1, 2
+
+        UNION ALL
+
+        SELECT answer.question_id, element.value, COUNT(DISTINCT answer.id)
+        FROM answer
+        CROSS JOIN LATERAL jsonb_array_elements_text(
+            CASE WHEN jsonb_typeof(answer.json_value) = 'array'
+                THEN answer.json_value
+                ELSE '[]'::jsonb
+            END
+        ) AS element(value)
+        WHERE answer.question_type = ANY(%(multiple_choice_types)s)
+        GROUP BY 1, 2
+    )
+    SELECT snapshot.value, counted.question_id, counted.value, counted.count
+    FROM (SELECT pg_current_snapshot()::text AS value) AS snapshot
+    LEFT JOIN counted ON TRUE
+"""
+
+
+def count_form_answers(form: SurveyForm) -> tuple[dict[int, dict[str, int]], str]:
+    """
+    Count the active answers of ``form`` per question and option value in
+    PostgreSQL: ``GROUP BY`` for single choice and boolean questions and
+    ``jsonb_array_elements_text`` over the answer arrays of multiple choice
+    questions.
+
+    Also return the database snapshot the answers were counted in.
+    """
+    counts = defaultdict(lambda: defaultdict(int))
+    sql = OPTION_COUNTS_SQL.format(
+        answer_table=Answer._meta.db_table,
+        answer_set_table=AnswerSet._meta.db_table,
+    )
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            sql,
+            {
+                "form_id": form.id,
+                "counted_types": [str(type_) for type_ in COUNTED_QUESTION_TYPES],
+                "multiple_choice_types": [
+                    str(type_) for type_ in MULTIPLE_CHOICE_QUESTION_TYPES
+                ],
+                "boolean_type": str(Question.QuestionType.BOOLEAN),
+                "total": OPTION_COUNTERS_TOTAL,
+            },
+        )
+        rows = cursor.fetchall()
+
+    for snapshot, question_id, value, count in rows:
+        if question_id is not None:
+            counts[question_id][value] += count
+
+    return counts, snapshot
+
+
+def rebuild_option_counters(form: SurveyForm) -> dict[int, dict[str, int]]:
+    """
+    Recount the answers of ``form`` from the database and replace its
+    counters with the result.
+
+    Changes committed while the answers are counted are journaled by
+    ``update_option_counters`` and replayed on top of the recount, so the
+    counters end up ready however busy the form is. If another rebuild is
+    already in progress the recount is only returned.
+    """
+    connection = get_redis_connection("default")
+    token = uuid4().hex
+    keys = _counters_state_keys(form.id)
+
+    # قبل از گرفتن snapshot ثبت می شود تا تغییرات بعدی در journal بمانند
+    rebuilding = connection.set(
+        _counters_rebuild_key(form.id),
+        token,
+        nx=True,
+        ex=settings.OPTION_COUNTERS_REBUILD_TIMEOUT,
+    )
+    counts, snapshot = count_form_answers(form)
+    if not rebuilding:
+        return counts
+
+    question_ids = form.questions.filter(type__in=COUNTED_QUESTION_TYPES).values_list(
+        "id", flat=True
+    )
+    args = [token, snapshot, settings.OPTION_COUNTERS_TIMEOUT]
+    for question_id in question_ids:
+        keys.append(_counters_key(form.id, question_id))
+        question_counts = counts.get(question_id, {})
+        args.append(len(question_counts))
+        for value, count in question_counts.items():
+            args.extend([value, count])
+
+    store = connection.register_script(STORE_OPTION_COUNTERS_SCRIPT)
+    store(keys=keys, args=args)
+
+    return counts
+
+
+def get_option_counts(
+    form: SurveyForm, question_ids: list[int]
+) -> dict[int, dict[str, int]]:
+    """
+    Read the counters of ``question_ids``, rebuilding the counters of
+    ``form`` first if they were never built or have expired.
+    """
+    connection = get_redis_connection("default")
+
+    if not connection.exists(_counters_ready_key(form.id)):
+        counts = rebuild_option_counters(form)
+        return {
+            question_id: counts.get(question_id, {}) for question_id in question_ids
+        }
+
+    pipeline = connection.pipeline(transaction=False)
+    for question_id in question_ids:
+        pipeline.hgetall(_counters_key(form.id, question_id))
+
+    return {
+        question_id: {
+            value.decode(): int(count) for value, count in question_counts.items()
+        }
+        for question_id, question_counts in zip(question_ids, pipeline.execute())
+    }
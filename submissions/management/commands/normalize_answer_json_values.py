@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from ...models import Answer
+
+NORMALIZE_JSON_VALUES_SQL = """
+    UPDATE {answer_table}
+    SET json_value = (json_value #>> '{{}}')::jsonb
+    WHERE id IN (
+        SELECT id
+        FROM {answer_table}
+        WHERE answer_type = %s
+            AND jsonb_typeof(json_value) = 'string'
+            AND left(btrim(json_value #>> '{{}}'), 1) IN ('[', '{{')
+        LIMIT %s
+    )
+"""
+
+
+class Command(BaseCommand):
+    help = (
+        "Convert list answers stored as JSON-encoded strings into native JSONB "
+        "arrays."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=5000)
+
+    def handle(self, *args, **options):
+        sql = NORMALIZE_JSON_VALUES_SQL.format(answer_table=Answer._meta.db_table)
+        total = 0
+
+        while True:
+            with connection.cursor() as cursor:
+                cursor.execute(sql, [Answer.AnswerType.JSON, options["batch_size"]])
+                updated = cursor.rowcount
+
+            total += updated
+            if updated < options["batch_size"]:
+                break
+
+        self.stdout.write(self.style.SUCCESS(f"Normalized {total} answers."))
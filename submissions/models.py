@@ -1,11 +1,12 @@
 from uuid import uuid4
 
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.indexes import GinIndex
 from django.core.exceptions import ValidationError
 from django.db import models
 from django.utils.translation import gettext_lazy as _
 
-from common.models import BaseUpdateModel, SafeDeleteModel
+from common.models import BaseModel, BaseUpdateModel, SafeDeleteModel
 from surveys.models import Question, SurveyForm
 
 User = get_user_model()
@@ -89,6 +90,13 @@ class Answer(BaseUpdateModel, SafeDeleteModel):
         verbose_name_plural = _("جواب ها")
         unique_together = ("question", "answer_set")
         ordering = ["-updated_at", "-created_at"]
+        indexes = [
+            GinIndex(
+                fields=["json_value"],
+                name="answer_json_value_gin",
+                opclasses=["jsonb_path_ops"],
+            ),
+        ]
 
     def __str__(self):
         return f"answer {self.question.id} from {self.answer_set.id}"
@@ -127,3 +135,32 @@ class Answer(BaseUpdateModel, SafeDeleteModel):
     def save(self, *args, **kwargs):
         self.full_clean()
         super().save(*args, **kwargs)
+
+
+class SubmissionQuota(BaseModel):
+    """
+    Number of answer sets a user has submitted on a form, incremented with a
+    conditional update on every submission (see ``submissions.quotas``).
+    """
+
+    user = models.ForeignKey(
+        User,
+        verbose_name=_("کاربر"),
+        on_delete=models.CASCADE,
+        related_name="submission_quotas",
+    )
+    survey_form = models.ForeignKey(
+        SurveyForm,
+        verbose_name=_("فرم پرسشنامه"),
+        on_delete=models.CASCADE,
+        related_name="submission_quotas",
+    )
+    count = models.PositiveIntegerField(verbose_name=_("تعداد پاسخ ها"), default=0)
+
+    class Meta:
+        verbose_name = _("سهمیه پاسخ")
+        verbose_name_plural = _("سهمیه های پاسخ")
+        unique_together = ("user", "survey_form")
+
+    def __str__(self):
+        return f"quota of {self.user_id} on {self.survey_form_id}: {self.count}"
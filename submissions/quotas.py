@@ -0,0 +1,74 @@
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from surveys.models import SurveyForm
+
+from .buffer import has_buffered_answer_sets
+from .models import AnswerSet, SubmissionQuota
+
+
+def _increment_quota(quotas, limit: int) -> bool:
+    return bool(quotas.filter(count__lt=limit).update(count=F("count") + 1))
+
+
+def reserve_submission_quota(*, form_id: int, user, limit: int) -> bool:
+    """
+    Take one of the ``limit`` submissions of ``user`` on form ``form_id`` with a
+    conditional ``UPDATE``; the row lock serializes concurrent requests, so
+    only ``limit`` of them can succeed. The quota row is created from the
+    existing answer sets on the first submission.
+
+    Must run in the transaction that creates the answer set, so a failed
+    submission gives its reservation back.
+    """
+    quotas = SubmissionQuota.objects.filter(user=user, survey_form_id=form_id)
+
+    if _increment_quota(quotas, limit):
+        return True
+    if quotas.exists():
+        return False
+
+    # اولین پاسخ کاربر: شمارنده از روی پاسخ های قبلی ساخته می شود
+    SubmissionQuota.objects.bulk_create(
+        [
+            SubmissionQuota(
+                user=user,
+                survey_form_id=form_id,
+                count=AnswerSet.objects.filter(
+                    user=user, survey_form_id=form_id
+                ).count(),
+            )
+        ],
+        ignore_conflicts=True,
+    )
+    return _increment_quota(quotas, limit)
+
+
+def reconcile_submission_quotas(form: SurveyForm) -> bool:
+    """
+    Reset the quota counters of ``form`` to the number of answer sets of
+    each user, e.g. after answer sets were hard deleted.
+
+    Forms with submissions still waiting in the submission stream are
+    skipped (their reservations are not in ``AnswerSet`` yet). Returns
+    whether the counters were reset.
+    """
+    submitted = (
+        AnswerSet.objects.filter(user=OuterRef("user"), survey_form=form)
+        .order_by()
+        .values("user")
+        .annotate(total=Count("id"))
+        .values("total")
+    )
+    quotas = SubmissionQuota.objects.filter(survey_form=form)
+
+    with transaction.atomic():
+        # قفل سطرها تا رزروهای در حال انجام قبل از شمارش ثبت شوند
+        list(quotas.select_for_update().values_list("id", flat=True))
+        if has_buffered_answer_sets(form.id):
+            return False
+
+        quotas.update(count=Coalesce(Subquery(submitted), 0))
+
+    return True
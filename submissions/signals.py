@@ -1,7 +1,8 @@
-from django.db import transaction
 from django.db.models.signals import post_save, pre_save
 from django.dispatch import receiver
 
+from common.utils import enqueue_outbox_event
+
 from .models import AnswerSet
 from .tasks import (
     handle_answerset_restore_delete,
@@ -16,9 +17,9 @@ _old_deleted_at = {}
 @receiver(post_save, sender=AnswerSet)
 def post_save_answer_set(sender, instance, created, **kwargs):
     if created:
-        handle_create_post_save_answer_set.delay(instance.pk)
+        enqueue_outbox_event(handle_create_post_save_answer_set, instance.pk)
     else:
-        handle_update_post_save_answer_set.delay(instance.pk)
+        enqueue_outbox_event(handle_update_post_save_answer_set, instance.pk)
 
 
 @receiver(pre_save, sender=AnswerSet)
@@ -35,12 +36,12 @@ def pre_save_answer_set_to_capture_delete_time(sender, instance, **kwargs):
 def post_save_answer_set_soft_delete(sender, instance, created, **kwargs):
     if not created:
         if instance.deleted_at:
-            transaction.on_commit(
-                lambda: handle_answerset_soft_delete.delay(instance.pk)
-            )
+            enqueue_outbox_event(handle_answerset_soft_delete, instance.pk)
         else:
             delete_time = _old_deleted_at.pop(instance.pk, None)
             if delete_time:
-                handle_answerset_restore_delete.delay(
-                    instance.pk, delete_time.isoformat()
+                enqueue_outbox_event(
+                    handle_answerset_restore_delete,
+                    instance.pk,
+                    delete_time.isoformat(),
                 )
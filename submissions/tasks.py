@@ -1,15 +1,50 @@
+import logging
 from datetime import datetime
 
 from asgiref.sync import async_to_sync, sync_to_async
 from celery import shared_task
+from celery.exceptions import SoftTimeLimitExceeded
 from channels.layers import get_channel_layer
-from django.db import transaction
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, InterfaceError, OperationalError, transaction
 from django.utils.dateparse import parse_datetime
 from django.utils.timezone import is_naive, make_aware
 
-from .api.selectors import get_charts_data
+from common.utils import enqueue_outbox_events, register_outbox_publisher
+from surveys.models import Survey, SurveyForm
+from surveys.schema import get_form_schema
+
+from .api.selectors import get_cached_charts_data
+from .buffer import (
+    ack_buffered_answer_sets,
+    acquire_buffer_flush,
+    insert_buffered_answer_sets,
+    read_buffered_answer_sets,
+)
+from .counters import (
+    COUNTED_ANSWER_FIELDS,
+    rebuild_option_counters,
+    update_option_counters_on_commit,
+)
 from .models import Answer, AnswerSet
-from .utils import create_answer, update_answer
+from .quotas import reconcile_submission_quotas
+from .utils import (
+    LIVE_BROADCAST_KEY,
+    ack_pending_answer_sets,
+    acquire_pending_answer_sets_drain,
+    claim_pending_answer_sets,
+    create_answers,
+    create_answers_for_answer_sets,
+    push_pending_answer_set,
+    update_answers,
+)
+
+logger = logging.getLogger(__name__)
+
+# خطاهای گذرا ورودی ها را تایید نشده نگه می دارند تا بعدا دوباره برداشته شوند
+TRANSIENT_ERRORS = (OperationalError, InterfaceError, SoftTimeLimitExceeded)
 
 
 def _parse_datetime(dt):
@@ -22,63 +57,142 @@ def _parse_datetime(dt):
     return parsed
 
 
+def schedule_live_charts_broadcast(survey: Survey) -> None:
+    """
+    Coalesce chart updates of a live survey: at most one snapshot is
+    computed and broadcast per ``LIVE_BROADCAST_WINDOW`` seconds, and the
+    updates arriving in the meantime are folded into it.
+    """
+    if not survey.is_live:
+        return
+
+    window = settings.LIVE_BROADCAST_WINDOW
+    if cache.add(f"{LIVE_BROADCAST_KEY}:{survey.pk}", 1, timeout=max(window * 10, 1)):
+        broadcast_live_charts.apply_async((survey.pk,), countdown=window)
+
+
+@shared_task
+def broadcast_live_charts(survey_pk: int):
+    # از این لحظه به بعد تغییرات جدید در پنجره بعدی ارسال می شوند
+    cache.delete(f"{LIVE_BROADCAST_KEY}:{survey_pk}")
+
+    try:
+        survey = Survey.objects.select_related("active_version").get(pk=survey_pk)
+    except Survey.DoesNotExist:
+        return
+
+    if survey.is_live and survey.active_version:
+        channel_layer = get_channel_layer()
+        form = survey.active_version
+        questions = get_form_schema(form).get_live_question_names()
+        async_to_sync(channel_layer.group_send)(
+            f"live_{survey.uuid}",
+            {
+                "type": "chart_update",
+                "data": get_cached_charts_data(form, questions),
+            },
+        )
+
+
+def dispatch_created_answer_set(pk: int) -> None:
+    """
+    Materialize a new answer set right away when the load is low, otherwise
+    queue it for ``handle_pending_answer_sets``, which is flushed when the
+    batch is full or after ``SUBMISSION_BATCH_MAX_WAIT`` seconds.
+    """
+    queue_length = push_pending_answer_set(pk)
+
+    if queue_length is None:
+        handle_create_post_save_answer_set.delay(pk)
+
+    elif queue_length >= settings.SUBMISSION_BATCH_SIZE:
+        handle_pending_answer_sets.delay()
+
+    elif acquire_pending_answer_sets_drain():
+        handle_pending_answer_sets.apply_async(
+            countdown=settings.SUBMISSION_BATCH_MAX_WAIT
+        )
+
+
 @shared_task
 def handle_create_post_save_answer_set(pk: int):
     try:
-        answerset = AnswerSet.objects.get(pk=pk)
-        metadata = answerset.metadata
+        # مانند مسیر دسته ای، جواب های موجود دوباره ساخته نمی شوند
+        answerset = AnswerSet.objects.select_related("survey_form__parent").get(
+            pk=pk, answers__isnull=True
+        )
         survey = answerset.survey_form.parent
 
         with transaction.atomic():
-            for question_name, answer_value in metadata.items():
-                create_answer(
-                    answer_set=answerset,
-                    question_name=question_name,
-                    answer_value=answer_value,
-                )
-
-        if survey.is_live and survey.active_version:
-            channel_layer = get_channel_layer()
-            form = survey.active_version
-            questions = list(
-                form.questions.filter(is_live=True).values_list("name", flat=True)
-            )
-            async_to_sync(channel_layer.group_send)(
-                f"live_{survey.uuid}",
-                {
-                    "type": "chart_update",
-                    "data": get_charts_data(form, questions),
-                },
-            )
+            create_answers(answer_set=answerset)
+
+        schedule_live_charts_broadcast(survey)
 
     except AnswerSet.DoesNotExist:
         return
 
 
+register_outbox_publisher(
+    handle_create_post_save_answer_set, dispatch_created_answer_set
+)
+
+
+def _create_pending_answers(pks: list[int]) -> None:
+    # مجموعه هایی که قبلا پاسخ هایشان ساخته شده (تحویل دوباره) کنار گذاشته می شوند
+    answer_sets = list(
+        AnswerSet.objects.select_related("survey_form__parent").filter(
+            pk__in=pks, answers__isnull=True
+        )
+    )
+
+    with transaction.atomic():
+        create_answers_for_answer_sets(answer_sets)
+
+    surveys = {
+        answer_set.survey_form.parent_id: answer_set.survey_form.parent
+        for answer_set in answer_sets
+    }
+    for survey in surveys.values():
+        schedule_live_charts_broadcast(survey)
+
+
+@shared_task
+def handle_pending_answer_sets():
+    pks, remaining = claim_pending_answer_sets(settings.SUBMISSION_BATCH_SIZE)
+
+    if pks:
+        try:
+            _create_pending_answers(pks)
+        except (IntegrityError, ValidationError):
+            # یک مجموعه نامعتبر نباید کل دسته را متوقف کند
+            for pk in pks:
+                try:
+                    _create_pending_answers([pk])
+                except IntegrityError:
+                    logger.exception("Dropping pending answer set %s", pk)
+                except ValidationError:
+                    # مانند مسیر تکی، خطا در نتیجه تسک ثبت می شود
+                    handle_create_post_save_answer_set.delay(pk)
+
+        # سایر خطاها شناسه ها را در حال پردازش نگه می دارند تا دوباره برداشته شوند
+        ack_pending_answer_sets(pks)
+
+    if remaining:
+        handle_pending_answer_sets.delay()
+
+
 @shared_task
 def handle_update_post_save_answer_set(answerset_pk: int):
     try:
-        answerset = AnswerSet.objects.get(pk=answerset_pk)
-        metadata = answerset.metadata
+        answerset = AnswerSet.objects.select_related("survey_form__parent").get(
+            pk=answerset_pk
+        )
         survey = answerset.survey_form.parent
 
         with transaction.atomic():
-            for question_name, answer_value in metadata.items():
-                update_answer(answerset, question_name, answer_value)
-
-        if survey.is_live and survey.active_version:
-            channel_layer = get_channel_layer()
-            form = survey.active_version
-            questions = list(
-                form.questions.filter(is_live=True).values_list("name", flat=True)
-            )
-            async_to_sync(channel_layer.group_send)(
-                f"live_{survey.uuid}",
-                {
-                    "type": "chart_update",
-                    "data": get_charts_data(form, questions),
-                },
-            )
+            update_answers(answer_set=answerset)
+
+        schedule_live_charts_broadcast(survey)
 
     except AnswerSet.DoesNotExist:
         return
@@ -92,8 +206,13 @@ def handle_answerset_soft_delete(answerset_pk: int):
 
         with transaction.atomic():
             answers = Answer.active_objects.filter(answer_set=answerset)
+            deleted_answers = list(answers.values(*COUNTED_ANSWER_FIELDS))
             answers.update(deleted_at=delete_time)
 
+            update_option_counters_on_commit(
+                answerset.survey_form_id, removed=deleted_answers
+            )
+
     except AnswerSet.DoesNotExist:
         return
 
@@ -108,7 +227,81 @@ def handle_answerset_restore_delete(answerset_pk: int, delete_time):
             answers = Answer.deleted_objects.filter(
                 answer_set=answerset, deleted_at=parsed_delete_time
             )
+            restored_answers = list(answers.values(*COUNTED_ANSWER_FIELDS))
             answers.update(deleted_at=None)
 
+            update_option_counters_on_commit(
+                answerset.survey_form_id, added=restored_answers
+            )
+
     except AnswerSet.DoesNotExist:
         return
+
+
+@shared_task(
+    soft_time_limit=settings.LONG_TASK_SOFT_TIME_LIMIT,
+    time_limit=settings.LONG_TASK_TIME_LIMIT,
+)
+def reconcile_option_counters():
+    active_versions = Survey.active_objects.filter(active_version__isnull=False).values(
+        "active_version"
+    )
+    forms = SurveyForm.active_objects.filter(pk__in=active_versions)
+    for form in forms.iterator():
+        rebuild_option_counters(form)
+
+
+@shared_task(
+    soft_time_limit=settings.LONG_TASK_SOFT_TIME_LIMIT,
+    time_limit=settings.LONG_TASK_TIME_LIMIT,
+)
+def reconcile_submission_limits():
+    active_versions = Survey.active_objects.filter(active_version__isnull=False).values(
+        "active_version"
+    )
+    forms = SurveyForm.active_objects.filter(
+        pk__in=active_versions, settings__max_submissions_per_user__isnull=False
+    )
+    for form in forms.iterator():
+        reconcile_submission_quotas(form)
+
+
+def schedule_buffered_answer_sets_flush() -> None:
+    """Persist the submission stream within ``SUBMISSION_BUFFER_FLUSH_INTERVAL``."""
+    if acquire_buffer_flush():
+        persist_buffered_answer_sets.apply_async(
+            countdown=settings.SUBMISSION_BUFFER_FLUSH_INTERVAL
+        )
+
+
+def _persist_buffered_entries(entries: list) -> None:
+    with transaction.atomic():
+        pks = insert_buffered_answer_sets(entries)
+        enqueue_outbox_events(handle_create_post_save_answer_set, [[pk] for pk in pks])
+
+
+@shared_task(
+    soft_time_limit=settings.LONG_TASK_SOFT_TIME_LIMIT,
+    time_limit=settings.LONG_TASK_TIME_LIMIT,
+)
+def persist_buffered_answer_sets():
+    while entries := read_buffered_answer_sets(settings.SUBMISSION_BATCH_SIZE):
+        failed = []
+        try:
+            _persist_buffered_entries(entries)
+        except TRANSIENT_ERRORS:
+            raise
+        except Exception:
+            # یک ورودی نامعتبر (مثلا فرم حذف شده) نباید کل دسته را متوقف کند
+            for entry in entries:
+                try:
+                    _persist_buffered_entries([entry])
+                except TRANSIENT_ERRORS:
+                    raise
+                except Exception:
+                    logger.exception(
+                        "Dropping buffered answer set %s", entry[1].get(b"uuid")
+                    )
+                    failed.append(entry)
+
+        ack_buffered_answer_sets(entries, failed=failed)
@@ -2,10 +2,14 @@ import os
 import uuid
 
 import pytest
+from django.db import transaction
 from django.urls import reverse
 from django.utils import timezone
+from django_redis import get_redis_connection
+from rest_framework_simplejwt.tokens import RefreshToken
 
 from config.env import BASE_DIR
+from surveys.context import get_submission_context
 from surveys.models import SurveyFormSettings, generate_secure_token
 from surveys.tests.factories import (
     OneTimeLinkFactory,
@@ -14,7 +18,20 @@ from surveys.tests.factories import (
     TargetAudienceFactory,
 )
 
-from ..models import AnswerSet
+from ..api.services import save_answerset
+from ..buffer import (
+    buffer_answer_set,
+    get_buffered_answer_set_status,
+    read_buffered_answer_sets,
+)
+from ..models import AnswerSet, SubmissionQuota
+from ..quotas import reconcile_submission_quotas
+from ..tasks import handle_pending_answer_sets, persist_buffered_answer_sets
+from ..utils import (
+    PENDING_ANSWER_SETS_KEY,
+    PENDING_ANSWER_SETS_PROCESSING_KEY,
+    claim_pending_answer_sets,
+)
 from .factories import AnswerSetFactory
 
 
@@ -81,6 +98,15 @@ class TestAnswerSetCreation:
 
         assert response.status_code == 404
 
+    def test_if_survey_uuid_malformed_returns_404(self, api_client):
+        response = api_client.post(
+            reverse(self.submission_view_name, args=["not-a-uuid"]),
+            data={"metadata": {}},
+            format="json",
+        )
+
+        assert response.status_code == 404
+
     def test_if_form_not_exists_returns_400(self, api_client, superuser):
         # Create a survey
         survey = SurveyFactory(created_by=superuser)
@@ -213,6 +239,31 @@ class TestAnswerSetCreation:
         assert response.status_code == 403
         assert response.data.get("code") == "TOO_MANY_SUBMISSIONS"
 
+    def test_submission_quota_counts_and_reconciles(self, api_client, normal_user):
+        survey = SurveyFactory()
+        form = SurveyFormFactory(parent=survey)
+        SurveyFormSettings.objects.create(
+            is_active=True, is_editable=True, form=form, max_submissions_per_user=2
+        )
+        AnswerSetFactory(survey_form=form, user=normal_user)
+
+        api_client.force_authenticate(user=normal_user)
+        response = api_client.post(
+            reverse(self.submission_view_name, args=[survey.uuid]),
+            data={"metadata": {}},
+            format="json",
+        )
+
+        assert response.status_code == 201
+        quota = SubmissionQuota.objects.get(user=normal_user, survey_form=form)
+        assert quota.count == 2
+
+        AnswerSet.objects.filter(user=normal_user, survey_form=form).first().delete()
+        reconcile_submission_quotas(form)
+
+        quota.refresh_from_db()
+        assert quota.count == 1
+
     def test_if_form_has_target_valid_data_returns_200(self, api_client, student):
         survey = SurveyFactory()
         target = TargetAudienceFactory(roles=[1])
@@ -273,6 +324,24 @@ class TestAnswerSetCreation:
 
         assert response.status_code == 201
 
+    def test_if_one_time_link_redeemed_twice_returns_403(self, api_client):
+        survey = SurveyFactory()
+        one_time_link = OneTimeLinkFactory(survey=survey)
+        form = SurveyFormFactory(parent=survey)
+        SurveyFormSettings.objects.create(is_active=True, is_editable=True, form=form)
+
+        url = reverse(self.submission_view_name, args=[survey.uuid])
+        url = f"{url}?token={one_time_link.token}"
+
+        first = api_client.post(url, data={"metadata": {}}, format="json")
+        second = api_client.post(url, data={"metadata": {}}, format="json")
+
+        assert first.status_code == 201
+        assert second.status_code == 403
+        assert second.data.get("code") == "LINK_USED"
+        one_time_link.refresh_from_db()
+        assert one_time_link.is_used
+
     def test_if_one_time_link_used_returns_400(self, api_client):
         survey = SurveyFactory()
         one_time_link = OneTimeLinkFactory(survey=survey, is_used=True)
@@ -318,6 +387,191 @@ class TestAnswerSetCreation:
         assert response.data.get("code") == "TOKEN_NOT_FOR_SURVEY"
 
 
+@pytest.mark.django_db
+class TestAsyncAnswerSetCreation:
+    view_name = "survey-submit"
+
+    def submit(self, api_client, survey, user=None, **extra):
+        if user is not None:
+            token = RefreshToken.for_user(user).access_token
+            extra["HTTP_AUTHORIZATION"] = f"Bearer {token}"
+
+        return api_client.post(
+            reverse(self.view_name, args=[survey.uuid]),
+            data={"metadata": {"q1": "answer"}},
+            format="json",
+            **extra,
+        )
+
+    def test_if_data_valid_returns_201(self, api_client, normal_user):
+        survey = SurveyFactory()
+        form = SurveyFormFactory(parent=survey)
+        SurveyFormSettings.objects.create(is_active=True, is_editable=True, form=form)
+
+        response = self.submit(api_client, survey, normal_user)
+
+        assert response.status_code == 201
+        answer_set = AnswerSet.objects.get(uuid=response.json()["data"]["answer_set"])
+        assert answer_set.user == normal_user
+        assert answer_set.survey_form == form
+
+    def test_if_user_max_limit_returns_403(self, api_client, normal_user):
+        survey = SurveyFactory()
+        form = SurveyFormFactory(parent=survey)
+        SurveyFormSettings.objects.create(
+            is_active=True, is_editable=True, form=form, max_submissions_per_user=1
+        )
+
+        assert self.submit(api_client, survey, normal_user).status_code == 201
+        response = self.submit(api_client, survey, normal_user)
+
+        assert response.status_code == 403
+        assert response.json()["code"] == "TOO_MANY_SUBMISSIONS"
+
+    def test_if_form_has_target_not_authenticated_returns_401(self, api_client):
+        survey = SurveyFactory()
+        form = SurveyFormFactory(parent=survey, target=TargetAudienceFactory())
+        SurveyFormSettings.objects.create(is_active=True, is_editable=True, form=form)
+
+        response = self.submit(api_client, survey)
+
+        assert response.status_code == 401
+
+    def test_if_survey_has_no_active_version_returns_404(self, api_client):
+        response = self.submit(api_client, SurveyFactory())
+
+        assert response.status_code == 404
+
+    def test_if_survey_uuid_malformed_returns_404(self, api_client):
+        response = api_client.post(
+            reverse(self.view_name, args=["not-a-uuid"]),
+            data={"metadata": {"q1": "answer"}},
+            format="json",
+        )
+
+        assert response.status_code == 404
+
+
+@pytest.mark.django_db
+class TestPendingAnswerSets:
+    def test_unacknowledged_batch_is_claimed_again(self, settings):
+        connection = get_redis_connection("default")
+        answer_set = AnswerSetFactory(metadata={})
+        connection.rpush(PENDING_ANSWER_SETS_KEY, answer_set.pk)
+
+        # دسته برداشته شده ولی تایید نشده (مثلا کارگر از کار افتاده است)
+        assert claim_pending_answer_sets(10) == ([answer_set.pk], 0)
+        assert claim_pending_answer_sets(10) == ([], 0)
+
+        settings.SUBMISSION_BATCH_CLAIM_IDLE = 0
+        handle_pending_answer_sets()
+
+        assert connection.zcard(PENDING_ANSWER_SETS_PROCESSING_KEY) == 0
+        assert claim_pending_answer_sets(10) == ([], 0)
+
+
+@pytest.mark.django_db
+class TestBufferedAnswerSetCreation:
+    submission_view_name = "survey-submissions-list"
+    status_view_name = "survey-submissions-submission-status"
+
+    def test_buffered_submission_is_persisted_once(
+        self, api_client, normal_user, settings, django_capture_on_commit_callbacks
+    ):
+        settings.SUBMISSION_BUFFER_ENABLED = True
+        survey = SurveyFactory()
+        form = SurveyFormFactory(parent=survey)
+        SurveyFormSettings.objects.create(is_active=True, is_editable=True, form=form)
+
+        api_client.force_authenticate(user=normal_user)
+        with django_capture_on_commit_callbacks(execute=True):
+            response = api_client.post(
+                reverse(self.submission_view_name, args=[survey.uuid]),
+                data={"metadata": {"q1": "answer"}},
+                format="json",
+            )
+
+        assert response.status_code == 202
+        answer_set_uuid = response.data["data"]["answer_set"]
+        status_url = reverse(self.status_view_name, args=[survey.uuid, answer_set_uuid])
+        assert api_client.get(status_url).data["status"] == "pending"
+        assert not AnswerSet.objects.filter(uuid=answer_set_uuid).exists()
+
+        persist_buffered_answer_sets()
+        persist_buffered_answer_sets()
+
+        answer_set = AnswerSet.objects.get(uuid=answer_set_uuid)
+        assert answer_set.user == normal_user
+        assert answer_set.metadata == {"q1": "answer"}
+        assert api_client.get(status_url).data["status"] == "persisted"
+
+    def test_quota_not_reconciled_while_submissions_are_buffered(
+        self, api_client, normal_user, settings, django_capture_on_commit_callbacks
+    ):
+        settings.SUBMISSION_BUFFER_ENABLED = True
+        survey = SurveyFactory()
+        form = SurveyFormFactory(parent=survey)
+        SurveyFormSettings.objects.create(
+            is_active=True, is_editable=True, form=form, max_submissions_per_user=1
+        )
+
+        api_client.force_authenticate(user=normal_user)
+        with django_capture_on_commit_callbacks(execute=True):
+            response = api_client.post(
+                reverse(self.submission_view_name, args=[survey.uuid]),
+                data={"metadata": {}},
+                format="json",
+            )
+        assert response.status_code == 202
+
+        assert reconcile_submission_quotas(form) is False
+        quota = SubmissionQuota.objects.get(user=normal_user, survey_form=form)
+        assert quota.count == 1
+
+        persist_buffered_answer_sets()
+
+        assert reconcile_submission_quotas(form) is True
+        quota.refresh_from_db()
+        assert quota.count == 1
+
+    def test_rolled_back_submission_is_not_buffered(self, normal_user, settings):
+        settings.SUBMISSION_BUFFER_ENABLED = True
+        form = SurveyFormFactory()
+        SurveyFormSettings.objects.create(is_active=True, is_editable=True, form=form)
+        context = get_submission_context(form.parent.uuid)
+
+        with pytest.raises(RuntimeError):
+            with transaction.atomic():
+                answer_set = save_answerset(
+                    context=context, user=normal_user, metadata={}
+                )
+                raise RuntimeError
+
+        assert get_buffered_answer_set_status(answer_set.uuid) is None
+
+    def test_invalid_buffered_entry_is_marked_failed(self, normal_user):
+        form = SurveyFormFactory()
+        valid = AnswerSet(user=normal_user, survey_form=form, metadata={})
+        invalid = AnswerSet(user_id="invalid", survey_form=form, metadata={})
+        buffer_answer_set(valid)
+        buffer_answer_set(invalid)
+
+        persist_buffered_answer_sets()
+
+        assert get_buffered_answer_set_status(valid.uuid) == "persisted"
+        assert get_buffered_answer_set_status(invalid.uuid) == "failed"
+        assert read_buffered_answer_sets(10) == []
+
+    def test_status_if_answer_set_unknown_returns_404(self, api_client):
+        survey = SurveyFactory()
+
+        response = api_client.get(
+            reverse(self.status_view_name, args=[survey.uuid, uuid.uuid4()])
+        )
+
+        assert response.status_code == 404
+
+
 @pytest.mark.django_db
 class TestAnswerSetUpdate:
     view_name = "survey-submissions-detail"
@@ -340,6 +594,37 @@ class TestAnswerSetUpdate:
         )
         assert response.status_code == 200
 
+    def test_if_survey_uuid_malformed_returns_404(self, api_client, normal_user):
+        answer_set = AnswerSetFactory(user=normal_user)
+        api_client.force_authenticate(user=normal_user)
+
+        response = api_client.patch(
+            reverse(self.view_name, args=["not-a-uuid", answer_set.uuid]),
+            data={"metadata": {}},
+            format="json",
+        )
+
+        assert response.status_code == 404
+
+    def test_null_answer_removes_question_from_metadata(self, api_client, normal_user):
+        survey = SurveyFactory()
+        form = SurveyFormFactory(parent=survey)
+        SurveyFormSettings.objects.create(is_active=True, is_editable=True, form=form)
+        answer_set = AnswerSetFactory(
+            user=normal_user, survey_form=form, metadata={"q1": "a", "q2": "b"}
+        )
+
+        api_client.force_authenticate(user=normal_user)
+        response = api_client.patch(
+            reverse(self.view_name, args=[survey.uuid, answer_set.uuid]),
+            data={"metadata": {"q1": None, "q2": "c"}},
+            format="json",
+        )
+
+        assert response.status_code == 200
+        answer_set.refresh_from_db()
+        assert answer_set.metadata == {"q2": "c"}
+
     def test_if_editable_form_not_owner_returns_403(
         self, api_client, normal_user, student
     ):
@@ -0,0 +1,163 @@
+import json
+import os
+
+import pytest
+from rest_framework.exceptions import ValidationError
+
+from config.env import BASE_DIR
+from surveys.context import get_submission_context
+from surveys.schema import get_form_schema
+from surveys.tests.factories import SurveyFormFactory
+from surveys.utils import ingest_survey_form
+
+from ..api.services import save_answerset
+from ..models import Answer, AnswerSet
+from ..tasks import handle_create_post_save_answer_set
+from ..utils import create_answers, update_answers
+from .factories import AnswerSetFactory
+
+
+def load_json(file_name):
+    with open(os.path.join(BASE_DIR, "submissions", "tests", file_name)) as file:
+        return json.load(file)
+
+
+@pytest.fixture
+def form(db):
+    form = SurveyFormFactory(metadata=load_json("form.json"))
+    ingest_survey_form(form)
+    return form
+
+
+@pytest.mark.django_db
+class TestCreateAnswers:
+    def test_answers_are_built_from_submission(self, form):
+        metadata = load_json("submit.json")
+        answer_set = AnswerSetFactory(survey_form=form, metadata=metadata)
+
+        create_answers(answer_set=answer_set)
+
+        answers = {
+            answer.question.name: answer
+            for answer in Answer.objects.filter(answer_set=answer_set).select_related(
+                "question__parent"
+            )
+        }
+        assert set(answers) == set(metadata)
+
+        # سوالات داخل پنل به سوال تو در توی همان پنل وصل می شوند
+        first_name = answers["first-name"]
+        assert first_name.question.parent.name == "full-name"
+        assert first_name.answer_type == Answer.AnswerType.TEXT
+        assert first_name.text_value == "test"
+
+        symptoms = answers["symptoms"]
+        assert symptoms.answer_type == Answer.AnswerType.JSON
+        assert symptoms.json_value == metadata["symptoms"]
+
+        contacts = answers["emergency-contacts"]
+        assert contacts.question.type == "paneldynamic"
+        assert contacts.answer_type == Answer.AnswerType.JSON
+        assert contacts.json_value == metadata["emergency-contacts"]
+
+        assert answers["travelled"].answer_type == Answer.AnswerType.BOOLEAN
+        assert answers["travelled"].boolean_value is True
+        assert answers["signature"].answer_type == Answer.AnswerType.FILE
+
+    def test_answers_are_inserted_with_one_query(self, form, django_assert_num_queries):
+        answer_set = AnswerSetFactory(
+            survey_form=form, metadata=load_json("submit.json")
+        )
+        schema = get_form_schema(form)
+
+        # یک INSERT و خواندن شناسه تراکنش برای شمارنده ها
+        with django_assert_num_queries(2) as context:
+            answers = create_answers(answer_set=answer_set, schema=schema)
+
+        inserts = [
+            query
+            for query in context.captured_queries
+            if query["sql"].startswith("INSERT")
+        ]
+        assert len(inserts) == 1
+        assert len(answers) == len(answer_set.metadata)
+
+    def test_task_materializes_answer_set(self, form):
+        answer_set = AnswerSetFactory(
+            survey_form=form, metadata=load_json("submit.json")
+        )
+
+        handle_create_post_save_answer_set(answer_set.pk)
+
+        assert Answer.objects.filter(answer_set=answer_set).count() == len(
+            answer_set.metadata
+        )
+
+    def test_task_skips_answer_set_with_answers(self, form):
+        answer_set = AnswerSetFactory(
+            survey_form=form, metadata=load_json("submit.json")
+        )
+        create_answers(answer_set=answer_set)
+
+        handle_create_post_save_answer_set(answer_set.pk)
+
+        assert Answer.objects.filter(answer_set=answer_set).count() == len(
+            answer_set.metadata
+        )
+
+    def test_invalid_submission_is_rejected(self, form, normal_user):
+        context = get_submission_context(form.parent.uuid)
+
+        with pytest.raises(ValidationError):
+            save_answerset(
+                context=context, user=normal_user, metadata={"first-name": "a" * 256}
+            )
+
+        assert not AnswerSet.objects.exists()
+
+
+@pytest.mark.django_db
+class TestUpdateAnswers:
+    def create_answer_set(self, form, metadata):
+        answer_set = AnswerSetFactory(survey_form=form, metadata=metadata)
+        create_answers(answer_set=answer_set)
+        return answer_set
+
+    def edit(self, answer_set, metadata):
+        answer_set.metadata = metadata
+        return update_answers(answer_set=answer_set)
+
+    def test_only_changed_answers_are_written(self, form):
+        answer_set = self.create_answer_set(
+            form, {"first-name": "a", "last-name": "b", "travelled": True}
+        )
+        unchanged = Answer.objects.get(
+            answer_set=answer_set, question__name="last-name"
+        )
+
+        changed = self.edit(
+            answer_set, {"first-name": "c", "last-name": "b", "travelled": True}
+        )
+
+        assert [answer.text_value for answer in changed] == ["c"]
+        answers = Answer.objects.filter(answer_set=answer_set)
+        assert answers.get(question__name="first-name").text_value == "c"
+        assert (
+            answers.get(question__name="last-name").updated_at == unchanged.updated_at
+        )
+
+    def test_removed_answer_is_soft_deleted_and_restored(self, form):
+        answer_set = self.create_answer_set(form, {"first-name": "a", "last-name": "b"})
+
+        self.edit(answer_set, {"last-name": "b"})
+
+        removed = Answer.objects.get(answer_set=answer_set, question__name="first-name")
+        assert removed.deleted_at is not None
+        assert Answer.active_objects.filter(answer_set=answer_set).count() == 1
+
+        changed = self.edit(answer_set, {"first-name": "a", "last-name": "b"})
+
+        assert len(changed) == 1
+        removed.refresh_from_db()
+        assert removed.deleted_at is None
+        assert removed.text_value == "a"
@@ -0,0 +1,211 @@
+from unittest.mock import patch
+
+import pytest
+from django.urls import reverse
+from django.utils import timezone
+
+from surveys.models import Question, QuestionOptions, SurveyForm, SurveyFormSettings
+from surveys.tasks import handle_form_soft_delete
+from surveys.tests.factories import SurveyFormFactory
+
+from ..api.selectors import (
+    filter_answersets_by_option,
+    get_cached_charts_data,
+    get_charts_data,
+)
+from ..counters import (
+    answer_to_counted,
+    count_form_answers,
+    get_counters_generation,
+    get_counters_snapshot,
+    update_option_counters,
+)
+from ..models import Answer, AnswerSet
+from .factories import AnswerSetFactory
+
+# شناسه تراکنش هایی که پیش از / پس از گرفتن snapshot شمارنده ها commit شده اند
+EARLIER_TRANSACTION_ID = 3
+LATER_TRANSACTION_ID = 10**12
+
+
+def create_question(form, name, question_type, options):
+    question = Question.objects.create(survey=form, name=name, type=question_type)
+
+    for value, text in options:
+        if question_type == Question.QuestionType.BOOLEAN:
+            QuestionOptions.objects.create(
+                question=question,
+                type=QuestionOptions.OptionType.BOOLEAN,
+                value=value,
+                boolean_value=text,
+            )
+        else:
+            QuestionOptions.objects.create(
+                question=question,
+                type=QuestionOptions.OptionType.TEXT,
+                value=value,
+                text_value=text,
+            )
+
+    return question
+
+
+def create_answer(form, question, deleted=False, **values):
+    answer_set = AnswerSetFactory(
+        survey_form=form, deleted_at=timezone.now() if deleted else None
+    )
+    return Answer.objects.create(
+        answer_set=answer_set, question=question, question_type=question.type, **values
+    )
+
+
+@pytest.mark.django_db
+class TestChartsData:
+    def test_radiogroup_counts_answers_per_option(self):
+        form = SurveyFormFactory()
+        question = create_question(
+            form, "color", "radiogroup", [("red", "Red"), ("blue", "Blue")]
+        )
+        for value in ["red", "red", "blue"]:
+            create_answer(form, question, answer_type="text", text_value=value)
+        create_answer(
+            form, question, deleted=True, answer_type="text", text_value="red"
+        )
+
+        [chart] = get_charts_data(form)
+
+        assert chart["question_name"] == "color"
+        assert chart["options"] == {"Red": 2, "Blue": 1}
+        assert chart["total_submissions"] == 3
+
+    def test_checkbox_counts_exact_option_values(self):
+        form = SurveyFormFactory()
+        question = create_question(
+            form, "tags", "checkbox", [("a", "A"), ("ab", "AB"), ("c", "C")]
+        )
+        for values in [["ab"], ["a", "ab"], ["c"]]:
+            create_answer(form, question, answer_type="json", json_value=values)
+
+        [chart] = get_charts_data(form)
+
+        assert chart["options"] == {"A": 1, "AB": 2, "C": 1}
+        assert chart["total_submissions"] == 3
+
+    def test_filter_answersets_by_option_matches_exact_values(self):
+        form = SurveyFormFactory()
+        question = create_question(form, "tags", "checkbox", [("a", "A"), ("ab", "AB")])
+        picked = create_answer(
+            form, question, answer_type="json", json_value=["a", "ab"]
+        ).answer_set
+        create_answer(form, question, answer_type="json", json_value=["ab"])
+
+        answer_sets = filter_answersets_by_option(AnswerSet.objects.all(), "tags", "a")
+
+        assert list(answer_sets) == [picked]
+
+    def test_boolean_counts_answers_per_label(self):
+        form = SurveyFormFactory()
+        question = create_question(
+            form, "agree", "boolean", [("labelTrue", True), ("labelFalse", False)]
+        )
+        for value in [True, True, False]:
+            create_answer(form, question, answer_type="boolean", boolean_value=value)
+
+        [chart] = get_charts_data(form)
+
+        assert chart["options"] == {"labelTrue": 2, "labelFalse": 1}
+        assert chart["total_submissions"] == 3
+
+    def test_cached_charts_data_is_refreshed_when_counters_change(self):
+        form = SurveyFormFactory()
+        question = create_question(form, "color", "radiogroup", [("red", "Red")])
+        create_answer(form, question, answer_type="text", text_value="red")
+
+        [chart] = get_cached_charts_data(form)
+        assert chart["options"] == {"Red": 1}
+
+        answer = create_answer(form, question, answer_type="text", text_value="red")
+        [chart] = get_cached_charts_data(form)
+        assert chart["options"] == {"Red": 1}
+
+        update_option_counters(
+            form.id, LATER_TRANSACTION_ID, added=[answer_to_counted(answer)]
+        )
+        [chart] = get_cached_charts_data(form)
+        assert chart["options"] == {"Red": 2}
+
+    def test_update_already_counted_is_ignored(self):
+        form = SurveyFormFactory()
+        question = create_question(form, "color", "radiogroup", [("red", "Red")])
+        answer = create_answer(form, question, answer_type="text", text_value="red")
+
+        get_charts_data(form)
+        generation = get_counters_generation(form.id)
+
+        update_option_counters(
+            form.id, EARLIER_TRANSACTION_ID, added=[answer_to_counted(answer)]
+        )
+
+        [chart] = get_charts_data(form)
+        assert chart["options"] == {"Red": 1}
+        assert get_counters_generation(form.id) == generation
+
+    def test_update_during_rebuild_keeps_counters_ready(self):
+        form = SurveyFormFactory()
+        question = create_question(form, "color", "radiogroup", [("red", "Red")])
+        counted = create_answer(form, question, answer_type="text", text_value="red")
+        later = Answer(question=question, question_type=question.type)
+        later.answer_type, later.text_value = "text", "red"
+
+        def count_with_concurrent_updates(form):
+            result = count_form_answers(form)
+            # یکی پیش از snapshot شمارش شده و دیگری پس از آن commit شده است
+            update_option_counters(
+                form.id, EARLIER_TRANSACTION_ID, added=[answer_to_counted(counted)]
+            )
+            update_option_counters(
+                form.id, LATER_TRANSACTION_ID, added=[answer_to_counted(later)]
+            )
+            return result
+
+        with patch(
+            "submissions.counters.count_form_answers",
+            side_effect=count_with_concurrent_updates,
+        ):
+            get_charts_data(form)
+
+        assert get_counters_snapshot(form.id) is not None
+        [chart] = get_charts_data(form)
+        assert chart["options"] == {"Red": 2}
+        assert chart["total_submissions"] == 2
+
+    def test_form_soft_delete_invalidates_counters(
+        self, django_capture_on_commit_callbacks
+    ):
+        form = SurveyFormFactory()
+        question = create_question(form, "color", "radiogroup", [("red", "Red")])
+        create_answer(form, question, answer_type="text", text_value="red")
+
+        [chart] = get_cached_charts_data(form)
+        assert chart["total_submissions"] == 1
+
+        SurveyForm.objects.filter(pk=form.pk).update(deleted_at=timezone.now())
+        with django_capture_on_commit_callbacks(execute=True):
+            handle_form_soft_delete(form.pk)
+
+        [chart] = get_cached_charts_data(form)
+        assert chart["total_submissions"] == 0
+
+    def test_chart_endpoint_filters_questions(self, api_client):
+        form = SurveyFormFactory()
+        SurveyFormSettings.objects.create(form=form, is_active=True, is_editable=False)
+        create_question(form, "color", "radiogroup", [("red", "Red")])
+        create_question(form, "size", "dropdown", [("s", "S")])
+
+        response = api_client.get(
+            reverse("survey-submissions-chart", args=[form.parent.uuid]),
+            {"form_uuid": str(form.uuid), "questions": "size"},
+        )
+
+        assert response.status_code == 200
+        assert [chart["question_name"] for chart in response.data] == ["size"]
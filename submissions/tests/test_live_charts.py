@@ -0,0 +1,49 @@
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from surveys.tests.factories import SurveyFactory, SurveyFormFactory
+
+from ..tasks import broadcast_live_charts, schedule_live_charts_broadcast
+
+
+@pytest.fixture
+def survey(db):
+    survey = SurveyFactory(is_live=True)
+    survey.active_version = SurveyFormFactory(parent=survey)
+    survey.save(update_fields=["active_version"])
+    return survey
+
+
+@pytest.mark.django_db
+@patch("submissions.tasks.broadcast_live_charts.apply_async")
+class TestLiveChartsBroadcast:
+    def test_updates_in_window_schedule_one_broadcast(self, mock_apply_async, survey):
+        for _ in range(5):
+            schedule_live_charts_broadcast(survey)
+
+        mock_apply_async.assert_called_once()
+        assert mock_apply_async.call_args.args == ((survey.pk,),)
+
+    def test_updates_after_broadcast_schedule_the_next_one(
+        self, mock_apply_async, survey
+    ):
+        schedule_live_charts_broadcast(survey)
+
+        with patch("submissions.tasks.get_channel_layer") as mock_channel_layer:
+            mock_channel_layer.return_value.group_send = AsyncMock()
+            broadcast_live_charts(survey.pk)
+
+        mock_channel_layer.return_value.group_send.assert_awaited_once()
+
+        schedule_live_charts_broadcast(survey)
+        schedule_live_charts_broadcast(survey)
+
+        assert mock_apply_async.call_count == 2
+
+    def test_not_live_survey_is_not_broadcast(self, mock_apply_async, survey):
+        survey.is_live = False
+
+        schedule_live_charts_broadcast(survey)
+
+        mock_apply_async.assert_not_called()
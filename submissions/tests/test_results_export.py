@@ -0,0 +1,85 @@
+import csv
+
+import pytest
+from django.urls import reverse
+from django.utils import timezone
+
+from surveys.models import Question, QuestionOptions
+from surveys.tests.factories import SurveyFormFactory
+
+from .factories import AnswerSetFactory
+
+
+@pytest.mark.django_db
+class TestResultsExport:
+    view_name = "survey-submissions-export"
+
+    def export(self, api_client, form, file_format):
+        api_client.force_authenticate(user=form.parent.created_by)
+        url = reverse(self.view_name, args=[form.parent.uuid, file_format])
+        return api_client.get(url, {"form_uuid": str(form.uuid)})
+
+    def test_export_csv_has_one_column_per_question(self, api_client):
+        form = SurveyFormFactory()
+        color = Question.objects.create(
+            survey=form, name="color", title="Color", type="radiogroup"
+        )
+        QuestionOptions.objects.create(
+            question=color,
+            type=QuestionOptions.OptionType.TEXT,
+            value="red",
+            text_value="Red",
+        )
+        Question.objects.create(survey=form, name="comment", type="text")
+        answer_set = AnswerSetFactory(
+            survey_form=form, metadata={"color": "red", "comment": "ok"}
+        )
+        AnswerSetFactory(survey_form=form, deleted_at=timezone.now())
+
+        response = self.export(api_client, form, "csv")
+
+        assert response.status_code == 200
+        content = b"".join(response.streaming_content).decode("utf-8-sig")
+        header, *rows = csv.reader(content.splitlines())
+        assert header == ["answer_set", "user", "created_at", "Color", "comment"]
+        assert len(rows) == 1
+        assert rows[0][0] == str(answer_set.uuid)
+        assert rows[0][3:] == ["Red", "ok"]
+
+    def test_export_columns_follow_form_pages(self, api_client):
+        form = SurveyFormFactory(
+            metadata={
+                "pages": [
+                    {"elements": [{"name": "second"}]},
+                    {"elements": [{"name": "first"}]},
+                ]
+            }
+        )
+        Question.objects.create(survey=form, name="first", type="text")
+        Question.objects.create(survey=form, name="second", type="text")
+
+        response = self.export(api_client, form, "csv")
+
+        content = b"".join(response.streaming_content).decode("utf-8-sig")
+        header = next(csv.reader(content.splitlines()))
+        assert header[3:] == ["second", "first"]
+
+    def test_export_xlsx_returns_attachment(self, api_client):
+        form = SurveyFormFactory()
+        AnswerSetFactory(survey_form=form)
+
+        response = self.export(api_client, form, "xlsx")
+
+        assert response.status_code == 200
+        assert response["Content-Disposition"].startswith("attachment")
+
+    def test_export_if_not_allowed_users_returns_403(self, api_client, student):
+        form = SurveyFormFactory()
+
+        api_client.force_authenticate(user=student)
+        response = api_client.get(
+            reverse(self.view_name, args=[form.parent.uuid, "csv"]),
+            {"form_uuid": str(form.uuid)},
+        )
+
+        assert response.status_code == 403
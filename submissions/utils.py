@@ -1,168 +1,341 @@
-import json
+import logging
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.utils import timezone
+from django_redis import get_redis_connection
 
 from surveys.models import Question
+from surveys.schema import FormSchema, QuestionSchema, get_form_schema
 
+from .counters import answer_to_counted, update_option_counters_on_commit
 from .models import Answer, AnswerSet
 
+ANSWER_VALUE_FIELDS = [
+    "question_type",
+    "answer_type",
+    "text_value",
+    "boolean_value",
+    "numeric_value",
+    "file_value",
+    "json_value",
+]
+
+PENDING_ANSWER_SETS_KEY = "submissions:pending_answer_sets"
+PENDING_ANSWER_SETS_DRAIN_KEY = "submissions:pending_answer_sets:drain"
+PENDING_ANSWER_SETS_PROCESSING_KEY = "submissions:pending_answer_sets:processing"
+SUBMISSION_RATE_KEY = "submissions:rate"
+LIVE_BROADCAST_KEY = "submissions:live_broadcast"
+
+logger = logging.getLogger(__name__)
+
+# Move up to ARGV[1] ids to the processing set (scored by claim time), first
+# the ids claimed more than ARGV[3] seconds ago and never acknowledged, then
+# new ids from the head of the queue.
+CLAIM_PENDING_ANSWER_SETS_SCRIPT = """
+local now = tonumber(ARGV[2])
+local pks = redis.call(
+    'ZRANGEBYSCORE', KEYS[2], '-inf', now - tonumber(ARGV[3]),
+    'LIMIT', 0, tonumber(ARGV[1])
+)
+local missing = tonumber(ARGV[1]) - #pks
+if missing > 0 then
+    local popped = redis.call('LPOP', KEYS[1], missing)
+    if popped then
+        for _, pk in ipairs(popped) do
+            table.insert(pks, pk)
+        end
+    end
+end
+for _, pk in ipairs(pks) do
+    redis.call('ZADD', KEYS[2], now, pk)
+end
+return {pks, redis.call('LLEN', KEYS[1])}
+"""
+
+
+def validate_answer(answer: Answer) -> None:
+    """
+    Enforce the type/value rules of ``Answer`` without hitting the database.
+
+    ``bulk_create`` bypasses ``Answer.save``, so the rules of ``full_clean``
+    are applied here, except for the foreign key and uniqueness checks that
+    would cost a query per answer.
+    """
+    answer.clean_fields(exclude=["answer_set", "question"])
+    answer.clean()
+
 
-def create_answer(
+def build_answers(
     *,
     answer_set: AnswerSet,
-    question_name: str,
+    question: QuestionSchema,
     answer_value: str | int | bool | list | dict,
-) -> Answer:
-    form = answer_set.survey_form
-    try:
-        question = form.questions.get(name=question_name)
-
-        if isinstance(answer_value, str):
-            question_type = question.type
-
-            if question_type == Question.QuestionType.SIGNATUREPAD:
-                answer = Answer(
-                    answer_set=answer_set,
-                    question=question,
-                    question_type=question_type,
-                    answer_type=Answer.AnswerType.FILE,
-                    file_value=answer_value,
-                )
+    schema: FormSchema,
+) -> list[Answer]:
+    question_type = question.type
+    answer = Answer(
+        answer_set=answer_set,
+        question_id=question.id,
+        question_type=question_type,
+    )
+    nested_answers = []
 
-            else:
-                answer = Answer(
-                    answer_set=answer_set,
-                    question=question,
-                    question_type=question.type,
-                    answer_type=Answer.AnswerType.TEXT,
-                    text_value=answer_value,
-                )
+    if isinstance(answer_value, str):
+        if question_type == Question.QuestionType.SIGNATUREPAD:
+            answer.answer_type = Answer.AnswerType.FILE
+            answer.file_value = answer_value
+        else:
+            answer.answer_type = Answer.AnswerType.TEXT
+            answer.text_value = answer_value
 
-        elif isinstance(answer_value, bool):
-            answer = Answer(
-                answer_set=answer_set,
-                question=question,
-                question_type=question.type,
-                answer_type=Answer.AnswerType.BOOLEAN,
-                boolean_value=answer_value,
-            )
-
-        elif isinstance(answer_value, int):
-            answer = Answer(
-                answer_set=answer_set,
-                question=question,
-                question_type=question.type,
-                answer_type=Answer.AnswerType.NUMERIC,
-                numeric_value=answer_value,
-            )
-
-        elif isinstance(answer_value, list):
-            question_type = question.type
-            if question_type == Question.QuestionType.FILE:
-                file_value = answer_value[0].get("content")
-
-                answer = Answer(
-                    answer_set=answer_set,
-                    question=question,
-                    question_type=question_type,
-                    answer_type=Answer.AnswerType.FILE,
-                    file_value=file_value,
-                )
+    elif isinstance(answer_value, bool):
+        answer.answer_type = Answer.AnswerType.BOOLEAN
+        answer.boolean_value = answer_value
 
-            else:
-                answer = Answer(
-                    answer_set=answer_set,
-                    question=question,
-                    question_type=question_type,
-                    answer_type=Answer.AnswerType.JSON,
-                    json_value=json.dumps(answer_value),
-                )
+    elif isinstance(answer_value, int):
+        answer.answer_type = Answer.AnswerType.NUMERIC
+        answer.numeric_value = answer_value
+
+    elif isinstance(answer_value, list):
+        if question_type == Question.QuestionType.FILE:
+            answer.answer_type = Answer.AnswerType.FILE
+            answer.file_value = answer_value[0].get("content")
+        else:
+            answer.answer_type = Answer.AnswerType.JSON
+            answer.json_value = answer_value
+
+    elif isinstance(answer_value, dict):
+        answer.answer_type = Answer.AnswerType.JSON
+        answer.json_value = answer_value
+
+        if question_type == Question.QuestionType.MULTIPLETEXT:
+            for nested_name, nested_value in answer_value.items():
+                nested_question = schema.children.get((question.id, nested_name))
+                if nested_question is None:
+                    continue
 
-        elif isinstance(answer_value, dict):
-            question_type = question.type
-            answer = Answer(
-                answer_set=answer_set,
-                question=question,
-                question_type=question_type,
-                answer_type=Answer.AnswerType.JSON,
-                json_value=answer_value,
-            )
-
-            if question_type == Question.QuestionType.MULTIPLETEXT:
-
-                for question_name, question_value in answer_value.items():
-                    nested_question = question.children.get(name=question_name)
-                    nested_answer = Answer(
+                nested_answers.append(
+                    Answer(
                         answer_set=answer_set,
-                        question=nested_question,
+                        question_id=nested_question.id,
                         question_type=question_type,
                         answer_type=Answer.AnswerType.TEXT,
-                        text_value=question_value,
+                        text_value=nested_value,
                     )
-                    nested_answer.full_clean()
-                    nested_answer.save()
+                )
+
+    else:
+        return []
 
-        answer.full_clean()
-        answer.save()
-        return answer
+    return [answer, *nested_answers]
 
-    except Question.DoesNotExist:
-        pass
 
+def build_answer_set_answers(
+    *, answer_set: AnswerSet, schema: FormSchema
+) -> list[Answer]:
+    """
+    Build (without saving) every ``Answer`` row of ``answer_set`` in memory.
+    """
+    answers = {}
 
-def update_answer(answer_set: AnswerSet, question_name: str, answer_value) -> Answer:
-    form = answer_set.survey_form
-    try:
-        question = form.questions.get(name=question_name)
+    for question_name, answer_value in answer_set.metadata.items():
+        question = schema.by_name.get(question_name)
+        if question is None:
+            continue
 
-        answer, created = Answer.objects.get_or_create(
+        for answer in build_answers(
             answer_set=answer_set,
             question=question,
-            defaults={
-                "question_type": question.type,
-            },
+            answer_value=answer_value,
+            schema=schema,
+        ):
+            validate_answer(answer)
+            answers[answer.question_id] = answer
+
+    return list(answers.values())
+
+
+def count_created_answers(answers: list[Answer]) -> None:
+    """Add ``answers`` to the option counters once the transaction commits."""
+    answers_by_form = defaultdict(list)
+    for answer in answers:
+        answers_by_form[answer.answer_set.survey_form_id].append(
+            answer_to_counted(answer)
         )
 
-        answer.text_value = None
-        answer.numeric_value = None
-        answer.boolean_value = None
-        answer.json_value = None
-        answer.file_value = None
+    for form_id, form_answers in answers_by_form.items():
+        update_option_counters_on_commit(form_id, added=form_answers)
 
-        if isinstance(answer_value, bool):
-            answer.boolean_value = answer_value
 
-        elif isinstance(answer_value, str):
-            if question.type == Question.QuestionType.SIGNATUREPAD:
-                answer.file_value = answer_value
-            else:
-                answer.text_value = answer_value
+def create_answers(
+    *,
+    answer_set: AnswerSet,
+    schema: FormSchema | None = None,
+) -> list[Answer]:
+    """
+    Materialize the metadata of ``answer_set`` with one ``bulk_create``.
 
-        elif isinstance(answer_value, int):
-            answer.numeric_value = answer_value
+    Submissions are validated up front, so a ``ValidationError`` here is
+    raised instead of leaving the answer set without answers.
+    """
+    if schema is None:
+        schema = get_form_schema(answer_set.survey_form)
 
-        elif isinstance(answer_value, list) or isinstance(answer_value, dict):
-            answer.json_value = (
-                answer_value
-                if isinstance(answer_value, dict)
-                else json.dumps(answer_value)
-            )
+    answers = build_answer_set_answers(answer_set=answer_set, schema=schema)
+    answers = Answer.objects.bulk_create(answers)
+    count_created_answers(answers)
+    return answers
 
-        answer.full_clean()
-        answer.save()
 
-        if question.type == Question.QuestionType.MULTIPLETEXT and isinstance(
-            answer_value, dict
-        ):
-            for nested_name, nested_value in answer_value.items():
-                nested_question = question.children.get(name=nested_name)
-                nested_answer, _ = Answer.objects.get_or_create(
-                    answer_set=answer_set,
-                    question=nested_question,
-                    defaults={"question_type": question.type},
-                )
-                nested_answer.text_value = nested_value
-                nested_answer.full_clean()
-                nested_answer.save()
+def create_answers_for_answer_sets(answer_sets: list[AnswerSet]) -> list[Answer]:
+    """
+    Materialize the answers of many answer sets with one ``bulk_create``.
+
+    The schema of each form is loaded once and shared between its answer
+    sets. An invalid answer set raises ``ValidationError`` for the whole batch.
+    """
+    schemas = {}
+    answers = []
+
+    for answer_set in answer_sets:
+        form_id = answer_set.survey_form_id
+        if form_id not in schemas:
+            schemas[form_id] = get_form_schema(answer_set.survey_form)
+
+        answers.extend(
+            build_answer_set_answers(answer_set=answer_set, schema=schemas[form_id])
+        )
+
+    answers = Answer.objects.bulk_create(answers)
+    count_created_answers(answers)
+    return answers
+
+
+def push_pending_answer_set(pk: int) -> int | None:
+    """
+    Queue ``pk`` for batched materialization when submissions arrive faster
+    than ``SUBMISSION_BATCH_THRESHOLD`` per second.
+
+    Returns the queue length, or ``None`` when the load is low and the
+    answer set should take the single submission path.
+    """
+    connection = get_redis_connection("default")
+    rate_key = f"{SUBMISSION_RATE_KEY}:{int(time.time())}"
+
+    pipeline = connection.pipeline()
+    pipeline.incr(rate_key)
+    pipeline.expire(rate_key, 2)
+    rate, _ = pipeline.execute()
+
+    if rate <= settings.SUBMISSION_BATCH_THRESHOLD:
+        return None
+
+    return connection.rpush(PENDING_ANSWER_SETS_KEY, pk)
+
+
+def acquire_pending_answer_sets_drain() -> bool:
+    """Return ``True`` if no drain of the pending queue is scheduled yet."""
+    connection = get_redis_connection("default")
+    timeout = max(int(settings.SUBMISSION_BATCH_MAX_WAIT * 1000), 1) * 10
+    return bool(connection.set(PENDING_ANSWER_SETS_DRAIN_KEY, 1, nx=True, px=timeout))
+
+
+def claim_pending_answer_sets(count: int) -> tuple[list[int], int]:
+    """
+    Claim up to ``count`` queued answer set ids.
+
+    The ids are moved to a processing set rather than removed, so a batch
+    whose transaction fails (or whose worker dies) is not lost: ids that are
+    not acknowledged with ``ack_pending_answer_sets`` within
+    ``SUBMISSION_BATCH_CLAIM_IDLE`` seconds are claimed again.
+
+    Returns the ids and the number of ids still waiting in the queue.
+    """
+    connection = get_redis_connection("default")
+    connection.delete(PENDING_ANSWER_SETS_DRAIN_KEY)
+
+    claim = connection.register_script(CLAIM_PENDING_ANSWER_SETS_SCRIPT)
+    pks, remaining = claim(
+        keys=[PENDING_ANSWER_SETS_KEY, PENDING_ANSWER_SETS_PROCESSING_KEY],
+        args=[count, time.time(), settings.SUBMISSION_BATCH_CLAIM_IDLE],
+    )
+
+    return [int(pk) for pk in pks], remaining
+
+
+def ack_pending_answer_sets(pks: list[int]) -> None:
+    """Remove materialized (or dropped) ids from the processing set."""
+    if pks:
+        connection = get_redis_connection("default")
+        connection.zrem(PENDING_ANSWER_SETS_PROCESSING_KEY, *pks)
+
+
+def update_answers(
+    *,
+    answer_set: AnswerSet,
+    schema: FormSchema | None = None,
+) -> list[Answer]:
+    """
+    Sync the ``Answer`` rows of an edited ``answer_set`` with its metadata.
+
+    Only answers whose value changed are written, with a single
+    ``INSERT ... ON CONFLICT (question_id, answer_set_id) DO UPDATE`` that
+    also restores a soft deleted row, and answers whose question is no
+    longer in the metadata are soft deleted in the same pass.
+    """
+    if schema is None:
+        schema = get_form_schema(answer_set.survey_form)
+
+    answers = build_answer_set_answers(answer_set=answer_set, schema=schema)
+    stored_answers = {
+        stored["question_id"]: stored
+        for stored in Answer.objects.filter(answer_set=answer_set).values(
+            "question_id", "deleted_at", *ANSWER_VALUE_FIELDS
+        )
+    }
+    active_answers = {
+        question_id: stored
+        for question_id, stored in stored_answers.items()
+        if stored["deleted_at"] is None
+    }
+
+    changed_answers = [
+        answer
+        for answer in answers
+        if answer.question_id not in active_answers
+        or any(
+            getattr(answer, field) != active_answers[answer.question_id][field]
+            for field in ANSWER_VALUE_FIELDS
+        )
+    ]
+    removed_question_ids = set(active_answers) - {
+        answer.question_id for answer in answers
+    }
+
+    if changed_answers:
+        Answer.objects.bulk_create(
+            changed_answers,
+            update_conflicts=True,
+            unique_fields=["question", "answer_set"],
+            update_fields=[*ANSWER_VALUE_FIELDS, "deleted_at", "updated_at"],
+        )
+
+    if removed_question_ids:
+        Answer.active_objects.filter(
+            answer_set=answer_set, question_id__in=removed_question_ids
+        ).update(deleted_at=timezone.now())
+
+    previous_answers = [
+        active_answers[answer.question_id]
+        for answer in changed_answers
+        if answer.question_id in active_answers
+    ] + [active_answers[question_id] for question_id in removed_question_ids]
+    update_option_counters_on_commit(
+        answer_set.survey_form_id,
+        added=[answer_to_counted(answer) for answer in changed_answers],
+        removed=previous_answers,
+    )
 
-        return answer
-    except Question.DoesNotExist:
-        pass
+    return changed_answers
@@ -8,6 +8,7 @@ from .models import (
     SurveyForm,
     SurveyFormSettings,
     TargetAudience,
+    TargetAudienceMember,
 )
 
 
@@ -44,3 +45,9 @@ class SurveyFormSettingsAdmin(admin.ModelAdmin):
 @admin.register(TargetAudience)
 class TargetAudienceAdmin(admin.ModelAdmin):
     pass
+
+
+@admin.register(TargetAudienceMember)
+class TargetAudienceMemberAdmin(admin.ModelAdmin):
+    list_display = ["target", "user"]
+    raw_id_fields = ["user"]
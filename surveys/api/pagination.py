@@ -0,0 +1,7 @@
+from django.conf import settings
+from rest_framework.pagination import LimitOffsetPagination
+
+
+class OneTimeLinkPagination(LimitOffsetPagination):
+    default_limit = settings.ONE_TIME_LINKS_PAGE_SIZE
+    max_limit = settings.ONE_TIME_LINKS_MAX_PAGE_SIZE
@@ -1,9 +1,13 @@
+from typing import Iterable
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.db.models import Q, QuerySet
 from django.utils.translation import gettext_lazy as _
 from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework.generics import get_object_or_404
 
+from ..links import clean_one_time_link_token, is_one_time_link_token_known
 from ..models import (
     OneTimeLink,
     Question,
@@ -121,13 +125,50 @@ def get_all_users_target(target: TargetAudience) -> QuerySet[User]:
     return users.distinct()
 
 
+def get_existing_phone_numbers(phone_numbers: Iterable[str]) -> set[str]:
+    """
+    Return the numbers of ``phone_numbers`` that belong to a user, checked
+    with one ``IN`` query per ``TARGET_AUDIENCE_PHONE_CHUNK_SIZE`` numbers.
+    """
+    phone_numbers = list(phone_numbers)
+    chunk_size = settings.TARGET_AUDIENCE_PHONE_CHUNK_SIZE
+    existing = set()
+
+    for start in range(0, len(phone_numbers), chunk_size):
+        end = start + chunk_size
+        existing.update(
+            User.objects.filter(phone_number__in=phone_numbers[start:end]).values_list(
+                "phone_number", flat=True
+            )
+        )
+
+    return existing
+
+
+def get_user_target_audiences(user: User) -> QuerySet[TargetAudience]:
+    """Audiences whose rules (see ``get_all_users_target``) include ``user``."""
+    # جامعه هدف بدون نقش و شماره شامل همه کاربران است
+    query = Q(roles=[], include_phone_numbers=[])
+
+    if user.role is not None:
+        query |= Q(roles__contains=[user.role])
+
+    query |= Q(include_phone_numbers__contains=[user.phone_number])
+
+    return TargetAudience.objects.filter(query).exclude(
+        exclude_phone_numbers__contains=[user.phone_number]
+    )
+
+
 def get_all_one_time_links(survey_uuid: str) -> QuerySet:
     survey = get_survey_by_uuid(survey_uuid)
     return OneTimeLink.objects.filter(survey=survey)
 
 
 def get_one_time_link_by_token(token: str):
-    token = token.rstrip("/").strip()
+    token = clean_one_time_link_token(token)
+    if not is_one_time_link_token_known(token):
+        raise NotFound()
     return get_object_or_404(OneTimeLink, token=token)
 
 
@@ -1,6 +1,7 @@
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.core.validators import MinValueValidator
-from django.db import IntegrityError
+from django.core.validators import MaxValueValidator, MinValueValidator
+from django.db import IntegrityError, transaction
 from django.utils.translation import gettext_lazy as _
 from rest_framework import serializers
 
@@ -12,8 +13,13 @@ from ..models import (
     SurveyFormSettings,
     TargetAudience,
 )
-from .selectors import get_survey_by_uuid
-from .services import create_survey, create_survey_form
+from .selectors import get_existing_phone_numbers, get_survey_by_uuid
+from .services import (
+    TARGET_AUDIENCE_PHONE_LISTS,
+    clone_prebuilt_survey,
+    create_survey,
+    create_survey_form,
+)
 
 User = get_user_model()
 
@@ -90,13 +96,14 @@ class SurveySerializer(serializers.ModelSerializer):
         user = self.context["request"].user
         survey_json = validated_data.get("data")
 
-        survey = create_survey(user=user, title=survey_json.get("title", None))
-        create_survey_form(
-            parent=survey,
-            json_data=survey_json,
-            version=1,
-            description=survey_json.get("description", None),
-        )
+        with transaction.atomic():
+            survey = create_survey(user=user, title=survey_json.get("title", None))
+            create_survey_form(
+                parent=survey,
+                json_data=survey_json,
+                version=1,
+                description=survey_json.get("description", None),
+            )
 
         return survey
 
@@ -228,25 +235,22 @@ class TargetAudienceSerializer(serializers.ModelSerializer):
             "exclude_phone_numbers",
         ]
 
-    def validate_include_phone_numbers(self, value):
+    def _validate_phone_numbers(self, value):
         phone_numbers = {str(num).strip() for num in (value or [])}
-        errors = []
-        for phone_number in phone_numbers:
-            if not User.objects.filter(phone_number=phone_number).exists():
-                errors.append(_(f"{phone_number} چنین شماره‌ای وجود ندارد."))
+        existing = get_existing_phone_numbers(phone_numbers)
+        errors = [
+            _(f"{phone_number} چنین شماره‌ای وجود ندارد.")
+            for phone_number in phone_numbers - existing
+        ]
         if errors:
             raise serializers.ValidationError(errors)
         return list(phone_numbers)
 
+    def validate_include_phone_numbers(self, value):
+        return self._validate_phone_numbers(value)
+
     def validate_exclude_phone_numbers(self, value):
-        phone_numbers = {str(num).strip() for num in (value or [])}
-        errors = []
-        for phone_number in phone_numbers:
-            if not User.objects.filter(phone_number=phone_number).exists():
-                errors.append(_(f"{phone_number} چنین شماره‌ای وجود ندارد."))
-        if errors:
-            raise serializers.ValidationError(errors)
-        return list(phone_numbers)
+        return self._validate_phone_numbers(value)
 
     def validate(self, attrs):
         include = {str(num).strip() for num in attrs.get("include_phone_numbers", [])}
@@ -263,9 +267,61 @@ class TargetAudienceSerializer(serializers.ModelSerializer):
         return attrs
 
 
+class TargetAudienceUploadSerializer(serializers.Serializer):
+    file = serializers.FileField()
+    list_name = serializers.ChoiceField(
+        choices=TARGET_AUDIENCE_PHONE_LISTS, default="include_phone_numbers"
+    )
+    name = serializers.CharField(max_length=255, required=False)
+    description = serializers.CharField(max_length=255, required=False)
+
+
+class TargetAudienceCombineSerializer(serializers.Serializer):
+    union = serializers.ListField(child=serializers.IntegerField(), required=False)
+    intersection = serializers.ListField(
+        child=serializers.IntegerField(), required=False
+    )
+    difference = serializers.ListField(child=serializers.IntegerField(), required=False)
+    roles = serializers.ListField(
+        child=serializers.ChoiceField(choices=User.UserRole.choices), required=False
+    )
+
+    def validate(self, attrs):
+        if not (attrs.get("union") or attrs.get("intersection") or attrs.get("roles")):
+            raise serializers.ValidationError(
+                {"message": _("حداقل یک جامعه هدف یا نقش باید انتخاب شود.")}
+            )
+
+        target_ids = {
+            *attrs.get("union", []),
+            *attrs.get("intersection", []),
+            *attrs.get("difference", []),
+        }
+        existing_ids = set(
+            TargetAudience.objects.filter(id__in=target_ids).values_list(
+                "id", flat=True
+            )
+        )
+        missing_ids = target_ids - existing_ids
+        if missing_ids:
+            raise serializers.ValidationError(
+                {
+                    "message": _(
+                        f"جامعه هدف {', '.join(map(str, sorted(missing_ids)))} وجود ندارد."
+                    )
+                }
+            )
+
+        return attrs
+
+
 class OneTimeLinkSerializer(serializers.ModelSerializer):
     numbers = serializers.IntegerField(
-        write_only=True, validators=[MinValueValidator(1)]
+        write_only=True,
+        validators=[
+            MinValueValidator(1),
+            MaxValueValidator(settings.ONE_TIME_LINKS_MAX_NUMBER),
+        ],
     )
 
     class Meta:
@@ -296,10 +352,16 @@ class QuestionSerializer(serializers.ModelSerializer):
 class PreBuiltSurveySerializer(serializers.ModelSerializer):
     forms_metadata = serializers.SerializerMethodField()
     version = serializers.IntegerField(validators=[MinValueValidator(1)])
+    titles = serializers.ListField(
+        child=serializers.CharField(max_length=255),
+        write_only=True,
+        min_length=1,
+        max_length=settings.PREBUILT_CLONE_BATCH_MAX_SIZE,
+    )
 
     class Meta:
         model = Survey
-        fields = ["uuid", "title", "forms_metadata", "version"]
+        fields = ["uuid", "title", "forms_metadata", "version", "titles"]
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -316,6 +378,7 @@ class PreBuiltSurveySerializer(serializers.ModelSerializer):
             elif action == "list":
                 self.fields.pop("forms_metadata")
                 self.fields.pop("version")
+                self.fields.pop("titles")
 
             elif action == "create_prebuilt":
                 allowed_fields = {"version", "title"}
@@ -323,6 +386,12 @@ class PreBuiltSurveySerializer(serializers.ModelSerializer):
                 for field in set(self.fields) - allowed_fields:
                     self.fields.pop(field)
 
+            elif action == "create_prebuilt_batch":
+                allowed_fields = {"version", "titles"}
+
+                for field in set(self.fields) - allowed_fields:
+                    self.fields.pop(field)
+
     def validate_version(self, version):
         survey_uuid = self.context["survey_uuid"]
         exists = SurveyForm.active_objects.filter(
@@ -344,15 +413,17 @@ class PreBuiltSurveySerializer(serializers.ModelSerializer):
         prebuilt_survey = get_survey_by_uuid(self.context["survey_uuid"])
 
         version = validated_data["version"]
-        title = validated_data.get("title", prebuilt_survey.title)
+        titles = validated_data.get(
+            "titles", [validated_data.get("title", prebuilt_survey.title)]
+        )
 
         prebuilt_form = SurveyForm.active_objects.get(
             parent=prebuilt_survey, version=version
         )
-        new_survey = create_survey(user=user, title=title)
-        create_survey_form(
-            parent=new_survey,
-            json_data=prebuilt_form.metadata,
-            version=1,
+        surveys = clone_prebuilt_survey(
+            user=user, prebuilt_form=prebuilt_form, titles=titles
         )
-        return new_survey
+
+        if "titles" in validated_data:
+            return surveys
+        return surveys[0]
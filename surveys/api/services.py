@@ -1,19 +1,59 @@
-from typing import Optional
+import csv
+import io
+import json
+from contextlib import contextmanager
+from typing import Iterable, Iterator, Optional
+from uuid import uuid4
 
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import IntegrityError, transaction
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
+from openpyxl import load_workbook
 from rest_framework.exceptions import ValidationError
 
-from ..models import OneTimeLink, Question, Survey, SurveyForm, TargetAudience
+from common.utils import enqueue_outbox_event, enqueue_outbox_events
+
+from ..context import invalidate_submission_context
+from ..models import Question, Survey, SurveyForm, TargetAudience
+from ..schema import invalidate_form_schema
+from ..tasks import handle_form_post_save, handle_one_time_links_generation
+from ..utils import (
+    copy_form_questions,
+    copy_form_settings,
+    count_questions,
+    create_one_time_links,
+    get_survey_pages,
+    ingest_survey_form,
+    set_one_time_links_job,
+)
+from .selectors import get_existing_phone_numbers
 
 User = get_user_model()
 
 
+def _error_messages(exc: Exception) -> list[str]:
+    if isinstance(exc, DjangoValidationError):
+        return exc.messages
+    return [str(exc)]
+
+
+@contextmanager
+def _survey_ingestion_errors(field: str):
+    """Report a SurveyJS document that fails to ingest as an error of ``field``."""
+    try:
+        yield
+    except (DjangoValidationError, IntegrityError) as exc:
+        raise ValidationError({field: _error_messages(exc)})
+
+
 def create_survey(user: User, title: Optional[str] = None) -> Survey:
     return Survey.objects.create(created_by=user, title=title)
 
 
+@transaction.atomic
 def create_survey_form(
     parent: Survey,
     json_data,
@@ -21,7 +61,7 @@ def create_survey_form(
     description: str | None = None,
     target: int | None = None,
 ) -> SurveyForm:
-    return SurveyForm.objects.create(
+    form = SurveyForm.objects.create(
         parent=parent,
         metadata=json_data,
         version=version,
@@ -29,7 +69,16 @@ def create_survey_form(
         target=target,
     )
 
+    # فرم های کوچک همین جا ساخته می شوند تا بلافاصله قابل پاسخ دادن باشند
+    with _survey_ingestion_errors("metadata"):
+        pages = get_survey_pages(json_data)
+        if count_questions(pages) <= settings.SURVEY_INLINE_INGESTION_MAX_QUESTIONS:
+            ingest_survey_form(form)
 
+    return form
+
+
+@transaction.atomic
 def delete_survey(survey: Survey, user: User) -> None:
     if user.is_superuser:
         survey.delete()
@@ -38,6 +87,7 @@ def delete_survey(survey: Survey, user: User) -> None:
         survey.save(update_fields=["deleted_at"])
 
 
+@transaction.atomic
 def restore_survey(survey: Survey) -> None:
     survey.deleted_at = None
     survey.save(update_fields=["deleted_at"])
@@ -53,6 +103,7 @@ def activate_form(form: SurveyForm):
     settings.save(update_fields=["is_active"])
 
 
+@transaction.atomic
 def delete_form(form: SurveyForm, user: User):
     if user.is_superuser:
         form.delete()
@@ -61,14 +112,27 @@ def delete_form(form: SurveyForm, user: User):
         form.save(update_fields=["deleted_at"])
 
 
+@transaction.atomic
 def restore_form(form: SurveyForm):
     form.deleted_at = None
     form.save(update_fields=["deleted_at"])
 
 
 def generate_one_time_links(survey: Survey, number_of_links: int):
-    for i in range(number_of_links):
-        OneTimeLink.objects.create(survey=survey)
+    create_one_time_links(survey, number_of_links)
+
+
+def start_one_time_links_job(survey: Survey, number_of_links: int) -> str:
+    """
+    Generate the links of ``survey`` in the background. Returns the id of
+    the job, whose progress ``get_one_time_links_job`` reports.
+    """
+    job_id = uuid4().hex
+    set_one_time_links_job(job_id, status="pending", total=number_of_links, created=0)
+    enqueue_outbox_event(
+        handle_one_time_links_generation, survey.pk, number_of_links, job_id
+    )
+    return job_id
 
 
 def add_target_audience(form: SurveyForm, target: TargetAudience):
@@ -76,6 +140,7 @@ def add_target_audience(form: SurveyForm, target: TargetAudience):
         raise ValidationError({"message": "جامعه هدف فعلی همین است."})
     form.target = target
     form.save(update_fields=["target"])
+    invalidate_submission_context(form.parent.uuid)
 
 
 def remove_target_audience(form: SurveyForm):
@@ -83,6 +148,7 @@ def remove_target_audience(form: SurveyForm):
         raise ValidationError({"message": "جامعه هدفی قرار داده نشده است."})
     form.target = None
     form.save(update_fields=["target"])
+    invalidate_submission_context(form.parent.uuid)
 
 
 def live_survey(survey: Survey):
@@ -93,8 +159,289 @@ def live_survey(survey: Survey):
 def toggle_live_question(question: Question):
     question.is_live = not question.is_live
     question.save(update_fields=["is_live"])
+    invalidate_form_schema(question.survey.uuid)
     return question
 
 
 def active_prebuilt(survey: Survey):
     pass
+
+
+@transaction.atomic
+def clone_prebuilt_survey(
+    *, user: User, prebuilt_form: SurveyForm, titles: list[str | None]
+) -> list[Survey]:
+    """
+    Create one survey per title from ``prebuilt_form`` by copying its
+    questions, options and settings rows instead of ingesting its metadata.
+
+    ``prebuilt_form`` is ingested first if its questions are not created
+    yet, so its copies are never empty.
+    """
+    with _survey_ingestion_errors("message"):
+        ingest_survey_form(prebuilt_form)
+
+    surveys = Survey.objects.bulk_create(
+        [Survey(created_by=user, title=title) for title in titles]
+    )
+    forms = SurveyForm.objects.bulk_create(
+        [
+            SurveyForm(
+                parent=survey,
+                metadata=prebuilt_form.metadata,
+                version=1,
+                description=prebuilt_form.description,
+            )
+            for survey in surveys
+        ]
+    )
+    form_ids = [form.id for form in forms]
+
+    copy_form_settings(source_form=prebuilt_form, target_form_ids=form_ids)
+    copy_form_questions(source_form=prebuilt_form, target_form_ids=form_ids)
+
+    for survey, form in zip(surveys, forms):
+        survey.active_version = form
+    Survey.objects.bulk_update(surveys, ["active_version"])
+
+    return surveys
+
+
+def parse_survey_document(line: bytes | str) -> dict:
+    """Parse and validate one NDJSON line of ``import_surveys``."""
+    try:
+        document = json.loads(line)
+    except ValueError:
+        raise DjangoValidationError(_("سند JSON معتبر نیست."))
+
+    if not isinstance(document, dict):
+        raise DjangoValidationError(_("سند باید یک شیء JSON باشد."))
+    get_survey_pages(document)
+
+    Survey(title=document.get("title")).clean_fields(
+        exclude=["created_by", "active_version"]
+    )
+    SurveyForm(
+        metadata=document, version=1, description=document.get("description")
+    ).clean_fields(exclude=["parent", "target"])
+
+    return document
+
+
+def import_survey_batch(
+    *, user: User, documents: list[tuple[int, dict]]
+) -> tuple[list[dict], list[dict]]:
+    """
+    Create the surveys of ``documents`` (``(line_number, document)`` pairs)
+    with bulk inserts and ingest their forms like ``create_survey_form``:
+    small forms right away, each in its own savepoint so a document that
+    fails to ingest is rolled back on its own and reported, larger ones by
+    ``handle_form_post_save``.
+    """
+    created = []
+    errors = []
+
+    with transaction.atomic():
+        surveys = Survey.objects.bulk_create(
+            [
+                Survey(created_by=user, title=document.get("title"))
+                for _line_number, document in documents
+            ]
+        )
+        forms = SurveyForm.objects.bulk_create(
+            [
+                SurveyForm(
+                    parent=survey,
+                    metadata=document,
+                    version=1,
+                    description=document.get("description"),
+                )
+                for survey, (_line_number, document) in zip(surveys, documents)
+            ]
+        )
+
+        deferred_form_ids = []
+        failed_survey_ids = []
+        for survey, form, (line_number, document) in zip(surveys, forms, documents):
+            pages = document.get("pages", [])
+            if count_questions(pages) > settings.SURVEY_INLINE_INGESTION_MAX_QUESTIONS:
+                deferred_form_ids.append([form.id])
+            else:
+                try:
+                    with transaction.atomic(), _survey_ingestion_errors("errors"):
+                        ingest_survey_form(form)
+                except ValidationError as exc:
+                    failed_survey_ids.append(survey.id)
+                    errors.append({"line": line_number, **exc.detail})
+                    continue
+
+            created.append({"line": line_number, "survey_uuid": str(survey.uuid)})
+
+        if failed_survey_ids:
+            Survey.objects.filter(id__in=failed_survey_ids).delete()
+
+        # bulk_create سیگنال post_save فرم را اجرا نمی کند
+        enqueue_outbox_events(handle_form_post_save, deferred_form_ids)
+
+    return created, errors
+
+
+def import_surveys(*, user: User, lines: Iterable[bytes | str]) -> dict:
+    """
+    Import an NDJSON stream of SurveyJS documents, one survey per line.
+
+    ``lines`` is consumed lazily and documents are created in batches of
+    ``SURVEY_IMPORT_BATCH_SIZE``. Returns the created surveys and the
+    errors, both with the line number of their document.
+    """
+    created = []
+    errors = []
+    batch = []
+
+    def flush():
+        batch_created, batch_errors = import_survey_batch(user=user, documents=batch)
+        created.extend(batch_created)
+        errors.extend(batch_errors)
+        batch.clear()
+
+    for line_number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+
+        try:
+            batch.append((line_number, parse_survey_document(line)))
+        except DjangoValidationError as exc:
+            errors.append({"line": line_number, "errors": _error_messages(exc)})
+
+        if len(batch) >= settings.SURVEY_IMPORT_BATCH_SIZE:
+            flush()
+
+    if batch:
+        flush()
+
+    return {"created": created, "errors": errors}
+
+
+TARGET_AUDIENCE_PHONE_LISTS = ["include_phone_numbers", "exclude_phone_numbers"]
+
+
+def _normalize_phone_number(value) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, (int, float)):
+        # صفر ابتدای شماره در سلول عددی اکسل حذف می شود
+        return f"0{int(value)}"
+    return str(value).strip()
+
+
+def read_phone_number_rows(file) -> Iterator[tuple[int, str]]:
+    """
+    Yield ``(row_number, phone_number)`` for the first column of an uploaded
+    CSV or XLSX ``file``, reading it row by row. A header row and empty
+    rows are skipped.
+    """
+    file_name = (file.name or "").lower()
+
+    if file_name.endswith(".xlsx"):
+        workbook = load_workbook(file, read_only=True, data_only=True)
+        try:
+            rows = (
+                row[0] if row else None
+                for row in workbook.active.iter_rows(values_only=True)
+            )
+            yield from _enumerate_phone_numbers(rows)
+        finally:
+            workbook.close()
+
+    elif file_name.endswith(".csv"):
+        reader = csv.reader(io.TextIOWrapper(file, encoding="utf-8-sig"))
+        yield from _enumerate_phone_numbers(row[0] if row else None for row in reader)
+
+    else:
+        raise ValidationError({"file": _("فایل باید با فرمت CSV یا XLSX باشد.")})
+
+
+def _enumerate_phone_numbers(values: Iterable) -> Iterator[tuple[int, str]]:
+    for row_number, value in enumerate(values, start=1):
+        phone_number = _normalize_phone_number(value)
+        if not phone_number or (row_number == 1 and not phone_number[0].isdigit()):
+            continue
+        yield row_number, phone_number
+
+
+def upload_target_audience_phone_numbers(
+    *, target: TargetAudience, file, list_name: str
+) -> dict:
+    """
+    Add the phone numbers of an uploaded CSV/XLSX ``file`` to the
+    ``list_name`` phone list of ``target``, which is created if unsaved. Numbers are checked in chunks of
+    ``TARGET_AUDIENCE_PHONE_CHUNK_SIZE``; invalid, unknown, duplicate and
+    conflicting rows are skipped and reported with their row number.
+    """
+    phone_number_field = User._meta.get_field("phone_number")
+    other_list_name = next(
+        name for name in TARGET_AUDIENCE_PHONE_LISTS if name != list_name
+    )
+    current = set(getattr(target, list_name) or [])
+    conflicting = set(getattr(target, other_list_name) or [])
+    added = set()
+    errors = []
+    chunk = []
+
+    def flush():
+        existing = get_existing_phone_numbers(
+            phone_number for _row_number, phone_number in chunk
+        )
+        for row_number, phone_number in chunk:
+            if phone_number in existing:
+                added.add(phone_number)
+            else:
+                errors.append(
+                    {
+                        "row": row_number,
+                        "errors": [_(f"{phone_number} چنین شماره‌ای وجود ندارد.")],
+                    }
+                )
+        chunk.clear()
+
+    seen = set()
+    for row_number, phone_number in read_phone_number_rows(file):
+        try:
+            phone_number_field.run_validators(phone_number)
+        except DjangoValidationError as exc:
+            errors.append({"row": row_number, "errors": _error_messages(exc)})
+            continue
+
+        if phone_number in seen:
+            errors.append(
+                {"row": row_number, "errors": [_("این شماره در فایل تکراری است.")]}
+            )
+            continue
+        seen.add(phone_number)
+
+        if phone_number in conflicting:
+            errors.append(
+                {
+                    "row": row_number,
+                    "errors": [_("شماره نمی‌تواند هم‌زمان در لیست مجاز و غیرمجاز باشد.")],
+                }
+            )
+            continue
+        if phone_number in current:
+            continue
+
+        chunk.append((row_number, phone_number))
+        if len(chunk) >= settings.TARGET_AUDIENCE_PHONE_CHUNK_SIZE:
+            flush()
+
+    if chunk:
+        flush()
+
+    setattr(target, list_name, sorted(current | added))
+    if target.pk is None:
+        target.save()
+    elif added:
+        target.save(update_fields=[list_name])
+
+    errors.sort(key=lambda error: error["row"])
+    return {"id": target.id, "added": len(added), "errors": errors}
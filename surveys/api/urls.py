@@ -1,7 +1,7 @@
 from django.urls import path
 from rest_framework_nested.routers import DefaultRouter, NestedDefaultRouter
 
-from submissions.api.views import AnswerSetViewSet
+from submissions.api.views import AnswerSetViewSet, submit_answer_set
 from surveys.api.views import (
     OneTimeLinkAccessView,
     OneTimeLinkViewSet,
@@ -35,5 +35,10 @@ survey_forms_router.register(
 urlpatterns = router.urls + surveys_router.urls + survey_forms_router.urls
 
 urlpatterns += [
+    path(
+        "surveys/<str:survey_uuid>/submit/",
+        submit_answer_set,
+        name="survey-submit",
+    ),
     path("<str:token>/", OneTimeLinkAccessView.as_view(), name="one-time-link-access"),
 ]
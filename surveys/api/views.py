@@ -1,15 +1,26 @@
+from django.conf import settings
+from django.db import transaction
 from django.db.models import Prefetch
+from django.urls import reverse
+from django.utils.timezone import localtime
 from django.utils.translation import gettext_lazy as _
 from rest_framework import mixins, status
 from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound
 from rest_framework.generics import get_object_or_404
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.viewsets import GenericViewSet, ModelViewSet, ReadOnlyModelViewSet
 
-from ..models import Survey
+from common.exports import stream_csv_response, xlsx_file_response
+from common.mixins import SerializerProjectionMixin
+
+from ..audiences import count_combined_audience
+from ..models import Survey, TargetAudience
+from ..utils import get_one_time_links_job
 from . import selectors, services
+from .pagination import OneTimeLinkPagination
 from .permissions import IsManagementOrProfessorOrAdmin, IsOwnerOrAdmin
 from .serializers import (
     OneTimeLinkSerializer,
@@ -18,11 +29,13 @@ from .serializers import (
     SurveyFormSerializer,
     SurveyFormSettingsSerializer,
     SurveySerializer,
+    TargetAudienceCombineSerializer,
     TargetAudienceSerializer,
+    TargetAudienceUploadSerializer,
 )
 
 
-class SurveyViewSet(ModelViewSet):
+class SurveyViewSet(SerializerProjectionMixin, ModelViewSet):
     serializer_class = SurveySerializer
     lookup_field = "uuid"
     http_method_names = ["get", "post", "patch", "delete"]
@@ -42,7 +55,7 @@ class SurveyViewSet(ModelViewSet):
         ).prefetch_related(
             Prefetch(
                 "forms",
-                queryset=forms_queryset,
+                queryset=forms_queryset.defer("metadata"),
                 to_attr=prefetch_attr,
             )
         )
@@ -63,6 +76,7 @@ class SurveyViewSet(ModelViewSet):
         if self.action in [
             "create",
             "list_deleted",
+            "import_surveys",
         ]:
             return [IsManagementOrProfessorOrAdmin()]
 
@@ -105,7 +119,7 @@ class SurveyViewSet(ModelViewSet):
 
     @action(detail=False, methods=["get"], url_path="archived")
     def list_deleted(self, request, *args, **kwargs):
-        queryset = self.get_queryset()
+        queryset = self.filter_queryset(self.get_queryset())
         serializer = self.get_serializer(queryset, many=True)
         return Response(serializer.data)
 
@@ -115,6 +129,17 @@ class SurveyViewSet(ModelViewSet):
         services.live_survey(survey)
         return Response(status=status.HTTP_200_OK)
 
+    @action(detail=False, methods=["post"], url_path="import")
+    def import_surveys(self, request, *args, **kwargs):
+        # بدنه درخواست (یا فایل آپلود شده) خط به خط خوانده می شود
+        if request.content_type.startswith("multipart/"):
+            lines = request.FILES.get("file") or []
+        else:
+            lines = request.stream or []
+
+        result = services.import_surveys(user=request.user, lines=lines)
+        return Response(result, status=status.HTTP_200_OK)
+
     @action(detail=True, methods=["post"], url_path="prebuilt/add")
     def prebuilt_add(self, request, *args, **kwargs):
         survey = self.get_object()
@@ -132,7 +157,7 @@ class SurveyViewSet(ModelViewSet):
         return Response(status=status.HTTP_200_OK)
 
 
-class SurveyFormViewSet(ModelViewSet):
+class SurveyFormViewSet(SerializerProjectionMixin, ModelViewSet):
     serializer_class = SurveyFormSerializer
     lookup_field = "uuid"
     http_method_names = ["get", "options", "head", "post", "delete"]
@@ -204,7 +229,9 @@ class SurveyFormViewSet(ModelViewSet):
 
     @action(detail=False, methods=["get"], url_path="archived")
     def list_forms_deleted(self, request, *args, **kwargs):
-        queryset = self.get_queryset().filter(parent__uuid=self.kwargs["survey_uuid"])
+        queryset = self.filter_queryset(self.get_queryset()).filter(
+            parent__uuid=self.kwargs["survey_uuid"]
+        )
         serializer = self.get_serializer(queryset, many=True)
         return Response(serializer.data)
 
@@ -239,12 +266,49 @@ class TargetAudienceViewSet(ModelViewSet):
     http_method_names = ["get", "patch", "head", "post", "delete"]
     permission_classes = [IsManagementOrProfessorOrAdmin]
 
+    @action(detail=False, methods=["post"])
+    def combine(self, request, *args, **kwargs):
+        serializer = TargetAudienceCombineSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        count = count_combined_audience(**serializer.validated_data)
+        return Response({"count": count}, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=["post"], url_path="upload")
+    def create_from_file(self, request, *args, **kwargs):
+        serializer = TargetAudienceUploadSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+
+        with transaction.atomic():
+            result = services.upload_target_audience_phone_numbers(
+                target=TargetAudience(
+                    name=data.get("name"), description=data.get("description")
+                ),
+                file=data["file"],
+                list_name=data["list_name"],
+            )
+        return Response(result, status=status.HTTP_201_CREATED)
+
+    @action(detail=True, methods=["post"])
+    def upload(self, request, *args, **kwargs):
+        target = self.get_object()
+        serializer = TargetAudienceUploadSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+
+        with transaction.atomic():
+            result = services.upload_target_audience_phone_numbers(
+                target=target, file=data["file"], list_name=data["list_name"]
+            )
+        return Response(result, status=status.HTTP_200_OK)
+
 
 class OneTimeLinkViewSet(
     mixins.ListModelMixin, mixins.CreateModelMixin, GenericViewSet
 ):
     serializer_class = OneTimeLinkSerializer
     permission_classes = [IsOwnerOrAdmin]
+    pagination_class = OneTimeLinkPagination
 
     def get_serializer_context(self):
         context = super().get_serializer_context()
@@ -254,14 +318,58 @@ class OneTimeLinkViewSet(
     def get_queryset(self):
         return selectors.get_all_one_time_links(survey_uuid=self.kwargs["survey_uuid"])
 
-    def create(self, request, *args, **kwargs):
+    def get_survey(self):
         survey = selectors.get_survey_by_uuid(uuid=self.kwargs["survey_uuid"])
-        self.check_object_permissions(request, survey)
+        self.check_object_permissions(self.request, survey)
+        return survey
+
+    def create(self, request, *args, **kwargs):
+        survey = self.get_survey()
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         numbers_of_links = serializer.validated_data["numbers"]
-        services.generate_one_time_links(survey, numbers_of_links)
-        return Response(status=status.HTTP_201_CREATED)
+
+        if numbers_of_links <= settings.ONE_TIME_LINKS_INLINE_MAX:
+            services.generate_one_time_links(survey, numbers_of_links)
+            return Response(status=status.HTTP_201_CREATED)
+
+        job_id = services.start_one_time_links_job(survey, numbers_of_links)
+        return Response({"job_id": job_id}, status=status.HTTP_202_ACCEPTED)
+
+    @action(detail=False, methods=["get"], url_path=r"jobs/(?P<job_id>[0-9a-f]+)")
+    def job(self, request, *args, **kwargs):
+        self.get_survey()
+        job = get_one_time_links_job(kwargs["job_id"])
+        if job is None:
+            raise NotFound({"message": _("چنین عملیاتی یافت نشد.")})
+        return Response(job, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=["get"], url_path=r"export/(?P<file_format>csv|xlsx)")
+    def export(self, request, *args, **kwargs):
+        survey = self.get_survey()
+        links = (
+            self.get_queryset()
+            .order_by("created_at", "id")
+            .values_list("token", "is_used", "created_at")
+            .iterator(chunk_size=settings.EXPORT_CHUNK_SIZE)
+        )
+        rows = (
+            [
+                token,
+                request.build_absolute_uri(
+                    reverse("one-time-link-access", args=[token])
+                ),
+                is_used,
+                localtime(created_at).strftime("%Y-%m-%d %H:%M:%S"),
+            ]
+            for token, is_used, created_at in links
+        )
+        header = ["token", "link", "is_used", "created_at"]
+        filename = f"links-{survey.uuid}.{kwargs['file_format']}"
+
+        if kwargs["file_format"] == "xlsx":
+            return xlsx_file_response(header=header, rows=rows, filename=filename)
+        return stream_csv_response(header=header, rows=rows, filename=filename)
 
 
 class OneTimeLinkAccessView(APIView):
@@ -328,3 +436,23 @@ class PreBuiltSurvey(ReadOnlyModelViewSet):
             {"survey_uuid": str(survey.uuid), "message": "نظرسنجی جدید ساخته شد."},
             status=201,
         )
+
+    @action(detail=True, methods=["post"], url_path="create/batch")
+    def create_prebuilt_batch(self, request, *args, **kwargs):
+        serializer = self.serializer_class(
+            data=request.data,
+            context={
+                "request": request,
+                "action": "create_prebuilt_batch",
+                "survey_uuid": self.kwargs["uuid"],
+            },
+        )
+        serializer.is_valid(raise_exception=True)
+        surveys = serializer.save()
+        return Response(
+            {
+                "survey_uuids": [str(survey.uuid) for survey in surveys],
+                "message": "نظرسنجی های جدید ساخته شدند.",
+            },
+            status=201,
+        )
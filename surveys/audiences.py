@@ -0,0 +1,144 @@
+from typing import Iterable
+from uuid import uuid4
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django_redis import get_redis_connection
+
+from .models import TargetAudienceMember
+
+User = get_user_model()
+
+AUDIENCE_BITMAP_KEY = "audiences:bitmap"
+
+
+def _target_bitmap_key(target_id: int) -> str:
+    return f"{AUDIENCE_BITMAP_KEY}:target:{target_id}"
+
+
+def _role_bitmap_key(role: int) -> str:
+    return f"{AUDIENCE_BITMAP_KEY}:role:{role}"
+
+
+def build_bitmap(user_ids: Iterable[int]) -> bytes:
+    """
+    Encode ``user_ids`` as a redis bitmap: bit ``n`` (most significant bit
+    first, as ``SETBIT``/``GETBIT`` address it) is set for user id ``n``.
+    """
+    user_ids = list(user_ids)
+    if not user_ids:
+        return b""
+
+    bitmap = bytearray(max(user_ids) // 8 + 1)
+    for user_id in user_ids:
+        bitmap[user_id // 8] |= 0x80 >> (user_id % 8)
+    return bytes(bitmap)
+
+
+def _ensure_bitmaps(
+    connection, *, target_ids: Iterable[int] = (), roles: Iterable[int] = ()
+) -> None:
+    """Build the missing bitmaps of ``target_ids`` and ``roles`` from the db."""
+    sources = [
+        (
+            _target_bitmap_key(target_id),
+            TargetAudienceMember.objects.filter(target_id=target_id).values_list(
+                "user_id", flat=True
+            ),
+        )
+        for target_id in target_ids
+    ] + [
+        (
+            _role_bitmap_key(role),
+            User.objects.filter(role=role).values_list("id", flat=True),
+        )
+        for role in roles
+    ]
+
+    pipeline = connection.pipeline(transaction=False)
+    for key, _user_ids in sources:
+        pipeline.exists(key)
+    missing = [
+        (key, user_ids)
+        for (key, user_ids), exists in zip(sources, pipeline.execute())
+        if not exists
+    ]
+
+    if missing:
+        pipeline = connection.pipeline(transaction=False)
+        for key, user_ids in missing:
+            pipeline.set(
+                key, build_bitmap(user_ids), ex=settings.AUDIENCE_BITMAP_TIMEOUT
+            )
+        pipeline.execute()
+
+
+def count_combined_audience(
+    *,
+    union: list[int] = (),
+    intersection: list[int] = (),
+    difference: list[int] = (),
+    roles: list[int] = (),
+) -> int:
+    """
+    Count the users of a composite audience evaluated with ``BITOP``:
+    the union of the ``union`` audiences, intersected with every
+    ``intersection`` audience and with the users of any of ``roles``,
+    minus the users of the ``difference`` audiences.
+    """
+    connection = get_redis_connection("default")
+    _ensure_bitmaps(
+        connection,
+        target_ids={*union, *intersection, *difference},
+        roles=set(roles),
+    )
+
+    result_key = f"{AUDIENCE_BITMAP_KEY}:tmp:{uuid4().hex}"
+    removed_key = f"{result_key}:removed"
+    pipeline = connection.pipeline(transaction=True)
+
+    if union:
+        pipeline.bitop("OR", result_key, *map(_target_bitmap_key, union))
+        and_keys = [_target_bitmap_key(target_id) for target_id in intersection]
+    elif intersection:
+        pipeline.bitop("AND", result_key, *map(_target_bitmap_key, intersection))
+        and_keys = []
+    else:
+        pipeline.bitop("OR", result_key, *map(_role_bitmap_key, roles))
+        and_keys = []
+        roles = []
+
+    if roles:
+        roles_key = f"{result_key}:roles"
+        pipeline.bitop("OR", roles_key, *map(_role_bitmap_key, roles))
+        and_keys.append(roles_key)
+    if and_keys:
+        pipeline.bitop("AND", result_key, result_key, *and_keys)
+
+    if difference:
+        # A - B = A XOR (A AND B)، چون NOT بیت های بعد از طول B را از دست می دهد
+        pipeline.bitop("OR", removed_key, *map(_target_bitmap_key, difference))
+        pipeline.bitop("AND", removed_key, result_key, removed_key)
+        pipeline.bitop("XOR", result_key, result_key, removed_key)
+
+    pipeline.bitcount(result_key)
+    pipeline.delete(result_key, removed_key, f"{result_key}:roles")
+    *_results, count, _deleted = pipeline.execute()
+
+    return count
+
+
+def invalidate_audience_bitmaps(
+    *, target_ids: Iterable[int] = (), roles: bool = False
+) -> None:
+    """
+    Drop the bitmaps of ``target_ids`` (and of every role if ``roles``)
+    once the transaction commits; they are rebuilt on their next use.
+    """
+    keys = [_target_bitmap_key(target_id) for target_id in target_ids]
+    if roles:
+        keys += [_role_bitmap_key(role) for role in User.UserRole.values]
+
+    if keys:
+        transaction.on_commit(lambda: get_redis_connection("default").delete(*keys))
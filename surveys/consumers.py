@@ -1,8 +1,9 @@
 from asgiref.sync import sync_to_async
 from channels.generic.websocket import AsyncJsonWebsocketConsumer
 
-from submissions.api.selectors import get_charts_data
+from submissions.api.selectors import get_cached_charts_data
 from surveys.api.selectors import get_active_version_form
+from surveys.schema import get_form_schema
 
 
 class SurveyLiveConsumer(AsyncJsonWebsocketConsumer):
@@ -40,8 +41,8 @@ class SurveyLiveConsumer(AsyncJsonWebsocketConsumer):
 
     @sync_to_async
     def get_live_questions(self, form):
-        return list(form.questions.filter(is_live=True).values_list("name", flat=True))
+        return get_form_schema(form).get_live_question_names()
 
     async def get_charts_data(self, form):
         questions = await self.get_live_questions(form)
-        return await sync_to_async(get_charts_data)(form, questions)
+        return await sync_to_async(get_cached_charts_data)(form, questions)
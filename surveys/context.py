@@ -0,0 +1,113 @@
+from dataclasses import dataclass
+from datetime import datetime
+from uuid import UUID
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import NotFound
+
+from .models import Survey
+
+SUBMISSION_CONTEXT_KEY = "surveys:submission_context"
+
+
+@dataclass(frozen=True)
+class SubmissionContext:
+    """
+    What a submission to a survey needs to know about its active version:
+    the form, its settings window and rules and its target audience.
+    """
+
+    survey_id: int
+    form_id: int
+    start_date: datetime | None
+    end_date: datetime | None
+    is_editable: bool
+    max_submissions_per_user: int | None
+    target_id: int | None
+
+
+def _parse_survey_uuid(survey_uuid: UUID | str) -> UUID:
+    # شناسه نامعتبر مانند نظرسنجی ناموجود 404 برمی گرداند
+    if isinstance(survey_uuid, UUID):
+        return survey_uuid
+    try:
+        return UUID(str(survey_uuid))
+    except ValueError:
+        raise NotFound()
+
+
+def _submission_context_key(survey_uuid: UUID | str) -> str:
+    return f"{SUBMISSION_CONTEXT_KEY}:{survey_uuid}"
+
+
+def _get_submission_context_queryset(survey_uuid: UUID | str):
+    return Survey.objects.filter(uuid=survey_uuid).values(
+        "id",
+        "active_version_id",
+        "active_version__target_id",
+        "active_version__settings__start_date",
+        "active_version__settings__end_date",
+        "active_version__settings__is_editable",
+        "active_version__settings__max_submissions_per_user",
+    )
+
+
+def _to_submission_context(survey: dict | None) -> SubmissionContext:
+    if survey is None:
+        raise NotFound()
+    if survey["active_version_id"] is None:
+        raise NotFound({"message": _("هیچ نسخه فعالی برای این نظرسنجی یافت نشد.")})
+
+    return SubmissionContext(
+        survey_id=survey["id"],
+        form_id=survey["active_version_id"],
+        start_date=survey["active_version__settings__start_date"],
+        end_date=survey["active_version__settings__end_date"],
+        is_editable=bool(survey["active_version__settings__is_editable"]),
+        max_submissions_per_user=survey[
+            "active_version__settings__max_submissions_per_user"
+        ],
+        target_id=survey["active_version__target_id"],
+    )
+
+
+def build_submission_context(survey_uuid: UUID | str) -> SubmissionContext:
+    survey_uuid = _parse_survey_uuid(survey_uuid)
+    return _to_submission_context(_get_submission_context_queryset(survey_uuid).first())
+
+
+def get_submission_context(survey_uuid: UUID | str) -> SubmissionContext:
+    survey_uuid = _parse_survey_uuid(survey_uuid)
+    key = _submission_context_key(survey_uuid)
+
+    context = cache.get(key)
+    if context is None:
+        context = build_submission_context(survey_uuid)
+        cache.set(key, context, timeout=settings.SUBMISSION_CONTEXT_CACHE_TIMEOUT)
+
+    return context
+
+
+async def aget_submission_context(survey_uuid: UUID | str) -> SubmissionContext:
+    survey_uuid = _parse_survey_uuid(survey_uuid)
+    key = _submission_context_key(survey_uuid)
+
+    context = await cache.aget(key)
+    if context is None:
+        context = _to_submission_context(
+            await _get_submission_context_queryset(survey_uuid).afirst()
+        )
+        await cache.aset(
+            key, context, timeout=settings.SUBMISSION_CONTEXT_CACHE_TIMEOUT
+        )
+
+    return context
+
+
+def invalidate_submission_context(survey_uuid: UUID | str) -> None:
+    """Drop the cached context of ``survey_uuid`` once the transaction commits."""
+    key = _submission_context_key(survey_uuid)
+    transaction.on_commit(lambda: cache.delete(key))
@@ -0,0 +1,89 @@
+from typing import Iterable
+
+from django.conf import settings
+from django_redis import get_redis_connection
+
+from .models import OneTimeLink
+
+ONE_TIME_LINK_TOKENS_KEY = "surveys:one_time_links:tokens"
+ONE_TIME_LINK_TOKENS_READY_KEY = f"{ONE_TIME_LINK_TOKENS_KEY}:ready"
+
+
+def clean_one_time_link_token(token: str) -> str:
+    return token.rstrip("/").strip()
+
+
+def redeem_one_time_link(token: str, survey_id: int) -> bool:
+    """
+    Mark the unused link ``token`` of ``survey_id`` as used with a single
+    conditional update. Returns ``False`` if no such link was unused, which
+    also holds for the loser of two concurrent redemptions: its update waits
+    for the winner's row lock and then no longer matches ``is_used=False``.
+    """
+    return bool(
+        OneTimeLink.objects.filter(
+            token=token, survey_id=survey_id, is_used=False
+        ).update(is_used=True)
+    )
+
+
+def remember_one_time_link_tokens(tokens: Iterable[str]) -> None:
+    """Add newly created ``tokens`` to the set of known tokens."""
+    tokens = list(tokens)
+    if tokens:
+        get_redis_connection("default").sadd(ONE_TIME_LINK_TOKENS_KEY, *tokens)
+
+
+def is_one_time_link_token_known(token: str) -> bool:
+    """
+    Return ``False`` only if ``token`` is certainly not a link, so lookups
+    of made up tokens are answered from redis without querying the db.
+
+    Until ``rebuild_one_time_link_tokens`` has filled the set every token
+    is reported as known and left to the db.
+    """
+    pipeline = get_redis_connection("default").pipeline(transaction=False)
+    pipeline.exists(ONE_TIME_LINK_TOKENS_READY_KEY)
+    pipeline.sismember(ONE_TIME_LINK_TOKENS_KEY, token)
+    ready, known = pipeline.execute()
+
+    return not ready or bool(known)
+
+
+def rebuild_one_time_link_tokens() -> bool:
+    """
+    Load the tokens of every link into the set of known tokens, if it is not
+    marked as complete. Returns ``True`` if the set was rebuilt.
+    """
+    connection = get_redis_connection("default")
+    if connection.exists(ONE_TIME_LINK_TOKENS_READY_KEY):
+        return False
+
+    # توکن هایی که در حین بازسازی ساخته می شوند مستقیم به مجموعه اصلی اضافه
+    # می شوند، پس مجموعه جدید جداگانه ساخته و با آن ادغام می شود
+    loading_key = f"{ONE_TIME_LINK_TOKENS_KEY}:loading"
+    connection.delete(loading_key)
+
+    tokens = OneTimeLink.objects.values_list("token", flat=True).iterator(
+        chunk_size=settings.ONE_TIME_LINK_TOKENS_BATCH_SIZE
+    )
+    batch = []
+    for token in tokens:
+        batch.append(token)
+        if len(batch) == settings.ONE_TIME_LINK_TOKENS_BATCH_SIZE:
+            connection.sadd(loading_key, *batch)
+            batch = []
+    if batch:
+        connection.sadd(loading_key, *batch)
+
+    pipeline = connection.pipeline(transaction=True)
+    pipeline.sunionstore(
+        ONE_TIME_LINK_TOKENS_KEY, [ONE_TIME_LINK_TOKENS_KEY, loading_key]
+    )
+    pipeline.delete(loading_key)
+    pipeline.set(
+        ONE_TIME_LINK_TOKENS_READY_KEY, 1, ex=settings.ONE_TIME_LINK_TOKENS_TIMEOUT
+    )
+    pipeline.execute()
+
+    return True
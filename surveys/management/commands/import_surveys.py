@@ -0,0 +1,40 @@
+import sys
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from ...api.services import import_surveys
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = "Import SurveyJS documents from an NDJSON file, one survey per line."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="NDJSON file path, or - for stdin")
+        parser.add_argument(
+            "--user", required=True, help="phone number of the surveys creator"
+        )
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(phone_number=options["user"])
+        except User.DoesNotExist:
+            raise CommandError(f"user {options['user']} does not exist")
+
+        if options["path"] == "-":
+            result = import_surveys(user=user, lines=sys.stdin)
+        else:
+            with open(options["path"], encoding="utf-8") as lines:
+                result = import_surveys(user=user, lines=lines)
+
+        for error in result["errors"]:
+            self.stderr.write(f"line {error['line']}: {'; '.join(error['errors'])}")
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Imported {len(result['created'])} surveys, "
+                f"{len(result['errors'])} failed."
+            )
+        )
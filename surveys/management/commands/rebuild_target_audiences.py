@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from ...models import TargetAudience
+from ...utils import rebuild_target_audience_members
+
+
+class Command(BaseCommand):
+    help = "Rebuild the membership index of every target audience."
+
+    def handle(self, *args, **options):
+        count = 0
+        for target in TargetAudience.objects.iterator():
+            rebuild_target_audience_members(target)
+            count += 1
+
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {count} target audiences."))
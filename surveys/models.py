@@ -119,6 +119,31 @@ class TargetAudience(BaseModel):
         super().save(*args, **kwargs)
 
 
+class TargetAudienceMember(BaseModel):
+    """
+    Precomputed membership of a target audience, rebuilt when its rules
+    change and kept in sync when a user's role or phone number changes.
+    """
+
+    target = models.ForeignKey(
+        TargetAudience,
+        verbose_name=_("جامعه هدف"),
+        on_delete=models.CASCADE,
+        related_name="members",
+    )
+    user = models.ForeignKey(
+        User,
+        verbose_name=_("کاربر"),
+        on_delete=models.CASCADE,
+        related_name="target_memberships",
+    )
+
+    class Meta:
+        verbose_name = _("عضو جامعه هدف")
+        verbose_name_plural = _("اعضای جامعه هدف")
+        unique_together = ["target", "user"]
+
+
 class SurveyForm(BaseModel, SafeDeleteModel):
     uuid = models.UUIDField(
         verbose_name=_("uuid"),
@@ -290,6 +315,24 @@ class Question(BaseModel):
         blank=True,
         related_name="children",
     )
+    definition_hash = models.CharField(
+        verbose_name=_("هش تعریف سوال"),
+        max_length=64,
+        null=True,
+        blank=True,
+        db_index=True,
+        help_text=_("هش تعریف SurveyJS سوال برای استفاده مجدد در نسخه های بعدی"),
+    )
+    # سوالی که این سوال از آن ساخته یا کپی شده است (نسخه قبل یا فرم پیش ساخته)؛
+    # در کپی فرم های پیش ساخته کلید نگاشت سوال پدر هم هست
+    source = models.ForeignKey(
+        "self",
+        verbose_name=_("سوال نسخه قبل"),
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="derived_questions",
+    )
 
     class Meta:
         verbose_name = _("سوال")
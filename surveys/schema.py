@@ -0,0 +1,196 @@
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from uuid import UUID
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Question, SurveyForm
+
+FORM_SCHEMA_KEY = "surveys:form_schema"
+
+
+@dataclass(frozen=True)
+class OptionSchema:
+    value: str
+    type: str
+    text_value: str | None = None
+    boolean_value: bool | None = None
+    numeric_value: int | None = None
+    image_value: str | None = None
+    json_value: list | dict | None = None
+
+
+@dataclass(frozen=True)
+class QuestionSchema:
+    id: int
+    name: str
+    title: str | None
+    type: str
+    is_live: bool
+    parent_id: int | None
+    options: tuple[OptionSchema, ...] = ()
+    # مقدار گزینه -> متن نمایش داده شده
+    labels: dict[str, str] = field(default_factory=dict)
+
+
+@dataclass(frozen=True)
+class FormSchema:
+    """
+    Read-only compiled question tree of a form version.
+
+    ``questions`` keeps the default question ordering, ``by_name`` resolves
+    metadata keys (top-level questions win over nested ones with the same
+    name) and ``children`` resolves nested questions by
+    ``(parent_id, name)``.
+    """
+
+    form_id: int
+    form_uuid: UUID
+    questions: tuple[QuestionSchema, ...]
+    by_name: dict[str, QuestionSchema]
+    children: dict[tuple[int, str], QuestionSchema]
+
+    def get_questions(
+        self, types: list[str] | None = None, names: list[str] | None = None
+    ) -> list[QuestionSchema]:
+        return [
+            question
+            for question in self.questions
+            if (types is None or question.type in types)
+            and (names is None or question.name in names)
+        ]
+
+    def get_live_question_names(self) -> list[str]:
+        return [question.name for question in self.questions if question.is_live]
+
+
+def build_form_schema(form: SurveyForm) -> FormSchema:
+    questions = []
+    by_name = {}
+    children = {}
+
+    for question in Question.objects.filter(survey=form).prefetch_related("options"):
+        options = tuple(
+            OptionSchema(
+                value=option.value,
+                type=option.type,
+                text_value=option.text_value,
+                boolean_value=option.boolean_value,
+                numeric_value=option.numeric_value,
+                image_value=option.image_value,
+                json_value=option.json_value,
+            )
+            for option in question.options.all()
+        )
+        question_schema = QuestionSchema(
+            id=question.id,
+            name=question.name,
+            title=question.title,
+            type=question.type,
+            is_live=question.is_live,
+            parent_id=question.parent_id,
+            options=options,
+            labels={
+                option.value: option.text_value
+                for option in options
+                if option.text_value is not None
+            },
+        )
+        questions.append(question_schema)
+
+        if question.parent_id is not None:
+            children[(question.parent_id, question.name)] = question_schema
+
+        # سوالات سطح اول در صورت هم نام بودن با سوالات تو در تو اولویت دارند
+        if question.parent_id is None or question.name not in by_name:
+            by_name[question.name] = question_schema
+
+    return FormSchema(
+        form_id=form.id,
+        form_uuid=form.uuid,
+        questions=tuple(questions),
+        by_name=by_name,
+        children=children,
+    )
+
+
+class _LocalSchemaCache:
+    """
+    Small in-process LRU in front of redis. Entries expire after
+    ``FORM_SCHEMA_LOCAL_TIMEOUT`` seconds so invalidations made by other
+    processes are picked up.
+    """
+
+    def __init__(self):
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> FormSchema | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+
+            expires_at, schema = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+
+            self._entries.move_to_end(key)
+            return schema
+
+    def set(self, key: str, schema: FormSchema) -> None:
+        with self._lock:
+            self._entries[key] = (
+                time.monotonic() + settings.FORM_SCHEMA_LOCAL_TIMEOUT,
+                schema,
+            )
+            self._entries.move_to_end(key)
+            while len(self._entries) > settings.FORM_SCHEMA_LOCAL_CACHE_SIZE:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+_local_cache = _LocalSchemaCache()
+
+
+def _form_schema_key(form_uuid: UUID | str) -> str:
+    return f"{FORM_SCHEMA_KEY}:{form_uuid}"
+
+
+def get_form_schema(form: SurveyForm) -> FormSchema:
+    key = _form_schema_key(form.uuid)
+
+    schema = _local_cache.get(key)
+    if schema is not None:
+        return schema
+
+    schema = cache.get(key)
+    if schema is None:
+        schema = build_form_schema(form)
+        cache.set(key, schema, timeout=settings.FORM_SCHEMA_CACHE_TIMEOUT)
+
+    _local_cache.set(key, schema)
+    return schema
+
+
+def invalidate_form_schema(form_uuid: UUID | str) -> None:
+    """Drop the cached schema of ``form_uuid`` once the transaction commits."""
+    key = _form_schema_key(form_uuid)
+
+    def invalidate():
+        cache.delete(key)
+        _local_cache.delete(key)
+
+    transaction.on_commit(invalidate)
@@ -1,8 +1,13 @@
-from django.db import transaction
-from django.db.models.signals import post_save, pre_save
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import receiver
 
-from .models import Survey, SurveyForm, SurveyFormSettings
+from common.utils import enqueue_outbox_event
+
+from .context import invalidate_submission_context
+from .links import remember_one_time_link_tokens
+from .models import OneTimeLink, Survey, SurveyForm, SurveyFormSettings, TargetAudience
+from .schema import invalidate_form_schema
 from .tasks import (
     handle_form_post_save,
     handle_form_restore_delete,
@@ -10,9 +15,19 @@ from .tasks import (
     handle_survey_restore_delete,
     handle_survey_soft_delete,
 )
-from .utils import survey_settings_activation
+from .utils import (
+    rebuild_target_audience_members,
+    survey_settings_activation,
+    sync_user_target_memberships,
+)
+
+User = get_user_model()
 
 _old_deleted_at = {}
+_old_target_rules = {}
+
+TARGET_RULE_FIELDS = ["roles", "include_phone_numbers", "exclude_phone_numbers"]
+MEMBERSHIP_USER_FIELDS = {"role", "phone_number"}
 
 
 @receiver(post_save, sender=SurveyFormSettings)
@@ -23,7 +38,7 @@ def handle_active_survey_form(sender, instance: SurveyFormSettings, **kwargs):
 @receiver(post_save, sender=SurveyForm)
 def post_save_create_form_settings(sender, instance: SurveyForm, created, **kwargs):
     if created:
-        transaction.on_commit(lambda: handle_form_post_save.delay(instance.pk))
+        enqueue_outbox_event(handle_form_post_save, instance.pk)
 
 
 @receiver(pre_save, sender=Survey)
@@ -42,17 +57,42 @@ def pre_save_survey_form(sender, instance: SurveyForm, **kwargs):
             _old_deleted_at[instance.pk] = old.deleted_at
 
 
+@receiver(post_save, sender=Survey)
+@receiver(post_delete, sender=Survey)
+def invalidate_survey_submission_context(sender, instance: Survey, **kwargs):
+    invalidate_submission_context(instance.uuid)
+
+
+@receiver(post_save, sender=OneTimeLink)
+def post_save_remember_one_time_link(sender, instance: OneTimeLink, created, **kwargs):
+    if created:
+        remember_one_time_link_tokens([instance.token])
+
+
+@receiver(post_delete, sender=SurveyForm)
+def invalidate_form_submission_context(sender, instance: SurveyForm, **kwargs):
+    survey_uuid = (
+        Survey.objects.filter(pk=instance.parent_id)
+        .values_list("uuid", flat=True)
+        .first()
+    )
+    if survey_uuid:
+        invalidate_submission_context(survey_uuid)
+
+
 @receiver(post_save, sender=Survey)
 def post_save_survey_soft_delete(sender, instance: Survey, created, **kwargs):
     if created:
         return
 
     if instance.deleted_at:
-        handle_survey_soft_delete.delay(instance.pk)
+        enqueue_outbox_event(handle_survey_soft_delete, instance.pk)
     else:
         delete_time = _old_deleted_at.pop(instance.pk, None)
         if delete_time:
-            handle_survey_restore_delete.delay(instance.pk, delete_time.isoformat())
+            enqueue_outbox_event(
+                handle_survey_restore_delete, instance.pk, delete_time.isoformat()
+            )
 
 
 @receiver(post_save, sender=SurveyForm)
@@ -60,14 +100,51 @@ def post_save_form_soft_delete(sender, instance: SurveyForm, created, **kwargs):
     if created:
         return
 
+    invalidate_form_schema(instance.uuid)
+
     if instance.deleted_at:
         if instance.parent and instance.parent.active_version == instance:
             settings = instance.settings
             settings.is_active = False
             settings.save(update_fields=["is_active"])
 
-        handle_form_soft_delete.delay(instance.pk)
+        enqueue_outbox_event(handle_form_soft_delete, instance.pk)
     else:
         delete_time = _old_deleted_at.pop(instance.pk, None)
         if delete_time:
-            handle_form_restore_delete.delay(instance.pk, delete_time.isoformat())
+            enqueue_outbox_event(
+                handle_form_restore_delete, instance.pk, delete_time.isoformat()
+            )
+
+
+@receiver(pre_save, sender=TargetAudience)
+def pre_save_target_audience(sender, instance: TargetAudience, **kwargs):
+    if instance.pk:
+        old = (
+            TargetAudience.objects.filter(pk=instance.pk)
+            .values_list(*TARGET_RULE_FIELDS)
+            .first()
+        )
+        if old:
+            _old_target_rules[instance.pk] = old
+
+
+@receiver(post_save, sender=TargetAudience)
+def post_save_target_audience_members(
+    sender, instance: TargetAudience, created, **kwargs
+):
+    rules = tuple(getattr(instance, field) for field in TARGET_RULE_FIELDS)
+    old_rules = _old_target_rules.pop(instance.pk, None)
+
+    if created or old_rules != rules:
+        rebuild_target_audience_members(instance)
+
+
+@receiver(post_save, sender=User)
+def post_save_user_target_memberships(
+    sender, instance, created, update_fields=None, **kwargs
+):
+    if update_fields is not None and not MEMBERSHIP_USER_FIELDS & set(update_fields):
+        return
+
+    sync_user_target_memberships(instance)
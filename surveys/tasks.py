@@ -1,14 +1,18 @@
 from datetime import datetime
 
 from celery import shared_task
+from django.conf import settings
 from django.db import transaction
 from django.utils.dateparse import parse_datetime
 from django.utils.timezone import is_naive, make_aware
 
+from submissions.counters import invalidate_option_counters
 from submissions.models import Answer, AnswerSet
 
-from .models import Survey, SurveyForm, SurveyFormSettings
-from .utils import create_questions
+from .links import rebuild_one_time_link_tokens
+from .models import Survey, SurveyForm
+from .schema import invalidate_form_schema
+from .utils import create_one_time_links, ingest_survey_form, set_one_time_links_job
 
 
 def _parse_datetime(dt):
@@ -22,19 +26,22 @@ def _parse_datetime(dt):
     return parsed
 
 
-@shared_task
+@shared_task(
+    soft_time_limit=settings.LONG_TASK_SOFT_TIME_LIMIT,
+    time_limit=settings.LONG_TASK_TIME_LIMIT,
+)
 def handle_form_post_save(form_pk: int):
     try:
         form = SurveyForm.objects.get(pk=form_pk)
-        with transaction.atomic():
-            SurveyFormSettings.objects.create(form=form, is_editable=False)
-            pages = form.metadata.get("pages", [])
-            create_questions(form=form, pages=pages)
+        ingest_survey_form(form)
     except SurveyForm.DoesNotExist:
         return
 
 
-@shared_task
+@shared_task(
+    soft_time_limit=settings.LONG_TASK_SOFT_TIME_LIMIT,
+    time_limit=settings.LONG_TASK_TIME_LIMIT,
+)
 def handle_survey_soft_delete(survey_pk: int):
     try:
         survey = Survey.deleted_objects.get(pk=survey_pk)
@@ -43,6 +50,8 @@ def handle_survey_soft_delete(survey_pk: int):
         with transaction.atomic():
             forms = SurveyForm.active_objects.filter(parent=survey)
             forms_id = list(forms.values_list("id", flat=True))
+            for form_uuid in forms.values_list("uuid", flat=True):
+                invalidate_form_schema(form_uuid)
             forms.update(deleted_at=delete_time)
 
             answer_sets = AnswerSet.active_objects.filter(survey_form_id__in=forms_id)
@@ -52,11 +61,16 @@ def handle_survey_soft_delete(survey_pk: int):
             answers = Answer.active_objects.filter(answer_set_id__in=answer_sets_id)
             answers.update(deleted_at=delete_time)
 
+            transaction.on_commit(lambda: invalidate_option_counters(forms_id))
+
     except Survey.DoesNotExist:
         return
 
 
-@shared_task
+@shared_task(
+    soft_time_limit=settings.LONG_TASK_SOFT_TIME_LIMIT,
+    time_limit=settings.LONG_TASK_TIME_LIMIT,
+)
 def handle_survey_restore_delete(survey_pk: int, delete_time):
     try:
         parsed_delete_time = _parse_datetime(delete_time)
@@ -67,6 +81,8 @@ def handle_survey_restore_delete(survey_pk: int, delete_time):
                 parent=survey, deleted_at=parsed_delete_time
             )
             forms_id = list(forms.values_list("id", flat=True))
+            for form_uuid in forms.values_list("uuid", flat=True):
+                invalidate_form_schema(form_uuid)
             forms.update(deleted_at=None)
 
             answer_sets = AnswerSet.deleted_objects.filter(
@@ -79,11 +95,16 @@ def handle_survey_restore_delete(survey_pk: int, delete_time):
                 answer_set_id__in=answer_sets_id, deleted_at=parsed_delete_time
             )
             answers.update(deleted_at=None)
+
+            transaction.on_commit(lambda: invalidate_option_counters(forms_id))
     except Survey.DoesNotExist:
         return
 
 
-@shared_task
+@shared_task(
+    soft_time_limit=settings.LONG_TASK_SOFT_TIME_LIMIT,
+    time_limit=settings.LONG_TASK_TIME_LIMIT,
+)
 def handle_form_soft_delete(form_pk: int):
     try:
         form = SurveyForm.deleted_objects.get(pk=form_pk)
@@ -97,11 +118,16 @@ def handle_form_soft_delete(form_pk: int):
             answers = Answer.active_objects.filter(answer_set_id__in=answer_sets_id)
             answers.update(deleted_at=delete_time)
 
+            transaction.on_commit(lambda: invalidate_option_counters([form.pk]))
+
     except SurveyForm.DoesNotExist:
         return
 
 
-@shared_task
+@shared_task(
+    soft_time_limit=settings.LONG_TASK_SOFT_TIME_LIMIT,
+    time_limit=settings.LONG_TASK_TIME_LIMIT,
+)
 def handle_form_restore_delete(form_pk: int, delete_time):
     try:
         parsed_delete_time = _parse_datetime(delete_time)
@@ -118,5 +144,31 @@ def handle_form_restore_delete(form_pk: int, delete_time):
                 answer_set_id__in=answer_sets_id, deleted_at=parsed_delete_time
             )
             answers.update(deleted_at=None)
+
+            transaction.on_commit(lambda: invalidate_option_counters([form.pk]))
     except SurveyForm.DoesNotExist:
         return
+
+
+@shared_task(
+    soft_time_limit=settings.LONG_TASK_SOFT_TIME_LIMIT,
+    time_limit=settings.LONG_TASK_TIME_LIMIT,
+)
+def handle_one_time_links_generation(survey_pk: int, number_of_links: int, job_id: str):
+    try:
+        survey = Survey.objects.get(pk=survey_pk)
+    except Survey.DoesNotExist:
+        set_one_time_links_job(
+            job_id, status="failed", total=number_of_links, created=0
+        )
+        return
+
+    create_one_time_links(survey, number_of_links, job_id=job_id)
+
+
+@shared_task(
+    soft_time_limit=settings.LONG_TASK_SOFT_TIME_LIMIT,
+    time_limit=settings.LONG_TASK_TIME_LIMIT,
+)
+def refresh_one_time_link_tokens():
+    rebuild_one_time_link_tokens()
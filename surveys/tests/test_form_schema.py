@@ -0,0 +1,40 @@
+import pytest
+
+from ..api.services import toggle_live_question
+from ..models import Question, QuestionOptions
+from ..schema import get_form_schema
+from .factories import SurveyFormFactory
+
+
+@pytest.mark.django_db
+class TestFormSchema:
+    def test_schema_maps_questions_children_and_labels(self):
+        form = SurveyFormFactory()
+        panel = Question.objects.create(survey=form, name="panel", type="panel")
+        color = Question.objects.create(
+            survey=form, name="color", type="radiogroup", parent=panel
+        )
+        QuestionOptions.objects.create(
+            question=color, type="text", value="red", text_value="Red"
+        )
+        Question.objects.create(survey=form, name="color", type="text")
+
+        schema = get_form_schema(form)
+
+        assert schema.by_name["color"].parent_id is None
+        assert schema.children[(panel.id, "color")].labels == {"red": "Red"}
+
+    def test_schema_is_cached_until_invalidated(
+        self, django_assert_num_queries, django_capture_on_commit_callbacks
+    ):
+        form = SurveyFormFactory()
+        question = Question.objects.create(survey=form, name="q1", type="boolean")
+
+        assert get_form_schema(form).get_live_question_names() == []
+        with django_assert_num_queries(0):
+            get_form_schema(form)
+
+        with django_capture_on_commit_callbacks(execute=True):
+            toggle_live_question(question)
+
+        assert get_form_schema(form).get_live_question_names() == ["q1"]
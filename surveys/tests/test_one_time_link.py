@@ -1,8 +1,11 @@
 import uuid
+from unittest.mock import patch
 
 import pytest
 from django.urls import reverse
 
+from surveys.api.pagination import OneTimeLinkPagination
+from surveys.tasks import handle_one_time_links_generation
 from surveys.tests.factories import OneTimeLinkFactory, SurveyFactory
 
 
@@ -21,7 +24,22 @@ class TestOneTimeLink:
             response = api_client.get(reverse(self.view_name, args=[survey.uuid]))
 
             assert response.status_code == 200
-            assert len(response.data) == 10
+            assert response.data["count"] == 10
+            assert len(response.data["results"]) == 10
+
+    def test_list_is_paginated_by_default(self, api_client):
+        survey = SurveyFactory()
+        OneTimeLinkFactory.create_batch(5, survey=survey)
+        api_client.force_authenticate(user=survey.created_by)
+
+        with patch.multiple(OneTimeLinkPagination, default_limit=2, max_limit=3):
+            url = reverse(self.view_name, args=[survey.uuid])
+            default_page = api_client.get(url)
+            max_page = api_client.get(url, {"limit": 100})
+
+        assert len(default_page.data["results"]) == 2
+        assert len(max_page.data["results"]) == 3
+        assert max_page.data["count"] == 5
 
     def test_if_superuser_data_valid_returns_201(self, api_client, superuser):
         survey = SurveyFactory()
@@ -106,3 +124,50 @@ class TestOneTimeLink:
         response = api_client.post(reverse(self.view_name, args=[survey.uuid]), data={})
 
         assert response.status_code == 401
+
+    def test_if_many_links_generates_them_in_background_job(
+        self, api_client, superuser, settings
+    ):
+        settings.ONE_TIME_LINKS_INLINE_MAX = 5
+        settings.ONE_TIME_LINKS_BATCH_SIZE = 4
+        survey = SurveyFactory()
+
+        api_client.force_authenticate(user=superuser)
+        response = api_client.post(
+            reverse(self.view_name, args=[survey.uuid]), data={"numbers": 10}
+        )
+
+        assert response.status_code == 202
+        job_id = response.data["job_id"]
+
+        handle_one_time_links_generation(survey.pk, 10, job_id)
+
+        assert survey.onetime_links.count() == 10
+        response = api_client.get(
+            reverse("survey-links-job", args=[survey.uuid, job_id])
+        )
+        assert response.data == {"status": "done", "total": 10, "created": 10}
+
+    def test_export_csv_streams_every_link(self, api_client):
+        survey = SurveyFactory()
+        links = OneTimeLinkFactory.create_batch(3, survey=survey)
+
+        api_client.force_authenticate(user=survey.created_by)
+        response = api_client.get(
+            reverse("survey-links-export", args=[survey.uuid, "csv"])
+        )
+
+        assert response.status_code == 200
+        rows = b"".join(response.streaming_content).decode("utf-8-sig").splitlines()
+        assert rows[0] == "token,link,is_used,created_at"
+        assert {row.split(",")[0] for row in rows[1:]} == {link.token for link in links}
+
+    def test_export_if_not_allowed_users_returns_403(self, api_client, student):
+        survey = SurveyFactory()
+
+        api_client.force_authenticate(user=student)
+        response = api_client.get(
+            reverse("survey-links-export", args=[survey.uuid, "xlsx"])
+        )
+
+        assert response.status_code == 403
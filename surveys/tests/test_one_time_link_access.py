@@ -1,6 +1,7 @@
 import pytest
 from django.urls import reverse
 
+from ..links import rebuild_one_time_link_tokens
 from .factories import OneTimeLinkFactory, SurveyFactory
 
 
@@ -26,3 +27,22 @@ class TestOneTimeLinkAccessView:
         response = api_client.get(url)
 
         assert response.status_code == 404
+
+    def test_if_token_unknown_returns_404_without_querying_db(
+        self, api_client, django_assert_num_queries
+    ):
+        rebuild_one_time_link_tokens()
+        url = reverse(self.view_name, args=["unknown_token"])
+
+        with django_assert_num_queries(0):
+            response = api_client.get(url)
+
+        assert response.status_code == 404
+
+    def test_if_link_created_after_rebuild_returns_200(self, api_client):
+        rebuild_one_time_link_tokens()
+        link = OneTimeLinkFactory()
+
+        response = api_client.get(reverse(self.view_name, args=[link.token]))
+
+        assert response.status_code == 200
@@ -0,0 +1,103 @@
+import os
+
+import pytest
+from django.urls import reverse
+
+from config.env import BASE_DIR
+
+from ..models import QuestionOptions, Survey
+from .factories import SurveyFactory
+
+
+@pytest.mark.django_db
+class TestPreBuiltSurveyClone:
+    view_name = "prebuilt-survey-create-prebuilt-batch"
+
+    def create_prebuilt_survey(self, api_client, user):
+        file_path = os.path.join(BASE_DIR, "submissions", "tests", "form.json")
+
+        with open(file_path) as f:
+            data = {"data": f.read()}
+
+        api_client.force_authenticate(user=user)
+        api_client.post(reverse("survey-list"), data=data)
+
+        survey = Survey.objects.get(created_by=user)
+        survey.is_prebuilt = True
+        survey.save(update_fields=["is_prebuilt"])
+        return survey
+
+    def test_batch_clone_copies_questions_and_settings(self, api_client, superuser):
+        prebuilt = self.create_prebuilt_survey(api_client, superuser)
+        prebuilt_form = prebuilt.forms.get()
+
+        response = api_client.post(
+            reverse(self.view_name, args=[prebuilt.uuid]),
+            data={"version": 1, "titles": ["first", "second"]},
+            format="json",
+        )
+
+        assert response.status_code == 201
+        assert len(response.data["survey_uuids"]) == 2
+
+        for survey in Survey.objects.filter(uuid__in=response.data["survey_uuids"]):
+            form = survey.active_version
+            assert form.settings.is_active
+            assert form.questions.count() == prebuilt_form.questions.count()
+            assert set(
+                form.questions.filter(parent__isnull=False).values_list(
+                    "parent__survey", flat=True
+                )
+            ) == {form.id}
+            assert (
+                QuestionOptions.objects.filter(question__survey=form).count()
+                == QuestionOptions.objects.filter(
+                    question__survey=prebuilt_form
+                ).count()
+            )
+
+    def test_batch_clone_keeps_question_order(self, api_client, superuser):
+        prebuilt = self.create_prebuilt_survey(api_client, superuser)
+        prebuilt_form = prebuilt.forms.get()
+
+        response = api_client.post(
+            reverse(self.view_name, args=[prebuilt.uuid]),
+            data={"version": 1, "titles": ["first"]},
+            format="json",
+        )
+
+        form = Survey.objects.get(uuid=response.data["survey_uuids"][0]).active_version
+        assert list(form.questions.values_list("name", flat=True)) == list(
+            prebuilt_form.questions.values_list("name", flat=True)
+        )
+
+    def test_batch_clone_ingests_prebuilt_form_first(
+        self, api_client, superuser, settings
+    ):
+        settings.SURVEY_INLINE_INGESTION_MAX_QUESTIONS = 0
+        prebuilt = self.create_prebuilt_survey(api_client, superuser)
+        prebuilt_form = prebuilt.forms.get()
+        assert not prebuilt_form.questions.exists()
+
+        response = api_client.post(
+            reverse(self.view_name, args=[prebuilt.uuid]),
+            data={"version": 1, "titles": ["first"]},
+            format="json",
+        )
+
+        assert response.status_code == 201
+        form = Survey.objects.get(uuid=response.data["survey_uuids"][0]).active_version
+        assert prebuilt_form.questions.exists()
+        assert form.questions.count() == prebuilt_form.questions.count()
+
+    def test_batch_clone_if_version_not_exists_returns_400(self, api_client, superuser):
+        prebuilt = SurveyFactory(is_prebuilt=True)
+
+        api_client.force_authenticate(user=superuser)
+        response = api_client.post(
+            reverse(self.view_name, args=[prebuilt.uuid]),
+            data={"version": 1, "titles": ["first"]},
+            format="json",
+        )
+
+        assert response.status_code == 400
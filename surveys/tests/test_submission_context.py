@@ -0,0 +1,47 @@
+import pytest
+
+from ..api.services import add_target_audience
+from ..context import get_submission_context
+from ..models import SurveyFormSettings
+from .factories import SurveyFormFactory, TargetAudienceFactory
+
+
+@pytest.mark.django_db
+class TestSubmissionContext:
+    def test_context_is_cached_until_settings_change(
+        self, django_assert_num_queries, django_capture_on_commit_callbacks
+    ):
+        form = SurveyFormFactory()
+        with django_capture_on_commit_callbacks(execute=True):
+            settings = SurveyFormSettings.objects.create(
+                form=form, is_active=True, is_editable=False
+            )
+
+        context = get_submission_context(form.parent.uuid)
+        assert context.form_id == form.id
+        assert not context.is_editable
+        with django_assert_num_queries(0):
+            get_submission_context(form.parent.uuid)
+
+        with django_capture_on_commit_callbacks(execute=True):
+            settings.is_editable = True
+            settings.save()
+
+        assert get_submission_context(form.parent.uuid).is_editable
+
+    def test_context_is_invalidated_when_target_changes(
+        self, django_capture_on_commit_callbacks
+    ):
+        form = SurveyFormFactory()
+        with django_capture_on_commit_callbacks(execute=True):
+            SurveyFormSettings.objects.create(
+                form=form, is_active=True, is_editable=False
+            )
+
+        assert get_submission_context(form.parent.uuid).target_id is None
+
+        target = TargetAudienceFactory()
+        with django_capture_on_commit_callbacks(execute=True):
+            add_target_audience(form, target)
+
+        assert get_submission_context(form.parent.uuid).target_id == target.id
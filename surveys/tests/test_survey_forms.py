@@ -1,6 +1,9 @@
+import json
 import os
 
 import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.utils import timezone
 
@@ -38,6 +41,37 @@ class TestSurveyFormCreation:
 
             assert response.status_code == 201
 
+    def test_new_version_reuses_unchanged_questions(self, api_client, superuser):
+        survey = SurveyFactory()
+
+        file_path = os.path.join(BASE_DIR, "surveys", "tests", "example.json")
+
+        with open(file_path, "r") as f:
+            metadata = json.load(f)
+
+        api_client.force_authenticate(user=superuser)
+        for version in [1, 2]:
+            if version == 2:
+                metadata["pages"][0]["elements"][2]["title"] = "changed"
+
+            response = api_client.post(
+                reverse(self.view_name, args=[survey.uuid]),
+                data={"version": version, "metadata": metadata},
+                format="json",
+            )
+
+            assert response.status_code == 201
+
+        first, second = SurveyForm.objects.filter(parent=survey).order_by("version")
+        previous = {question.name: question for question in first.questions.all()}
+        for question in second.questions.all():
+            source = previous[question.name]
+            assert question.source == source
+            assert (question.definition_hash == source.definition_hash) == (
+                question.name != "passive_experience"
+            )
+            assert question.options.count() == source.options.count()
+
     def test_if_data_valid_target_exists_returns_201(self, api_client, superuser):
         survey = SurveyFactory()
 
@@ -530,6 +564,19 @@ class TestSurveyFormList:
             assert response.status_code == 200
             assert len(response.data) == 10
 
+    def test_get_list_does_not_fetch_metadata(self, api_client, superuser):
+        survey = SurveyFactory()
+        SurveyFormFactory.create_batch(2, parent=survey)
+
+        api_client.force_authenticate(user=superuser)
+
+        with CaptureQueriesContext(connection) as context:
+            response = api_client.get(reverse(self.view_name, args=[survey.uuid]))
+
+        assert response.status_code == 200
+        assert "metadata" not in response.data[0]
+        assert not any('"metadata"' in query["sql"] for query in context)
+
     def test_get_list_if_not_allowed_returns_401(
         self, api_client, student, employee, personal
     ):
@@ -1,3 +1,4 @@
+import json
 import os
 from unittest.mock import patch
 
@@ -5,10 +6,15 @@ import pytest
 from django.urls import reverse
 from django.utils import timezone
 
+from common.models import OutboxEvent
 from config.env import BASE_DIR
 
-from ..models import Survey, SurveyForm
-from ..tasks import handle_survey_restore_delete, handle_survey_soft_delete
+from ..models import QuestionOptions, Survey, SurveyForm
+from ..tasks import (
+    handle_form_post_save,
+    handle_survey_restore_delete,
+    handle_survey_soft_delete,
+)
 from .factories import SurveyFactory, SurveyFormFactory
 
 
@@ -32,6 +38,23 @@ class TestSurveyCreation:
 
             assert response.status_code == 201
 
+    def test_if_data_valid_creates_questions_and_settings(self, api_client, superuser):
+        file_path = os.path.join(BASE_DIR, "surveys", "tests", "example.json")
+
+        with open(file_path) as f:
+            data = {"data": f.read()}
+
+        api_client.force_authenticate(user=superuser)
+
+        response = api_client.post(self.url, data=data)
+
+        assert response.status_code == 201
+
+        form = SurveyForm.objects.get(parent__created_by=superuser)
+        assert form.settings.is_editable is False
+        assert form.questions.count() == 4
+        assert QuestionOptions.objects.filter(question__survey=form).count() == 17
+
     def test_if_data_invalid_returns_400(self, api_client, superuser):
 
         api_client.force_authenticate(user=superuser)
@@ -40,6 +63,37 @@ class TestSurveyCreation:
 
         assert response.status_code == 400
 
+    def test_if_questions_invalid_returns_400(self, api_client, superuser):
+        data = {
+            "title": "survey",
+            "pages": [{"elements": [{"type": "unknown", "name": "q1"}]}],
+        }
+        api_client.force_authenticate(user=superuser)
+
+        response = api_client.post(self.url, data={"data": json.dumps(data)})
+
+        assert response.status_code == 400
+        assert not Survey.objects.filter(created_by=superuser).exists()
+
+    @pytest.mark.parametrize(
+        "elements",
+        [
+            ["q1"],
+            [{"type": "multipletext", "name": "q1", "items": "a"}],
+            [{"type": "imagepicker", "name": "q1", "choices": ["a"]}],
+            [{"type": "panel", "name": "p1", "elements": {"name": "q1"}}],
+        ],
+    )
+    def test_if_questions_malformed_returns_400(self, api_client, superuser, elements):
+        data = {"title": "survey", "pages": [{"elements": elements}]}
+        api_client.force_authenticate(user=superuser)
+
+        response = api_client.post(self.url, data={"data": json.dumps(data)})
+
+        assert response.status_code == 400
+        assert "metadata" in response.data
+        assert not Survey.objects.filter(created_by=superuser).exists()
+
     def test_if_creator_not_authenticated_returns_401(self, api_client, superuser):
         file_path = os.path.join(BASE_DIR, "surveys", "tests", "example.json")
 
@@ -62,6 +116,74 @@ class TestSurveyCreation:
             assert response.status_code == 403
 
 
+@pytest.mark.django_db
+class TestSurveyImport:
+    url = reverse("survey-import-surveys")
+
+    def test_if_documents_valid_creates_surveys_and_reports_errors(
+        self, api_client, superuser
+    ):
+        file_path = os.path.join(BASE_DIR, "surveys", "tests", "example.json")
+
+        with open(file_path) as f:
+            document = json.dumps(json.load(f))
+
+        unknown_type = json.dumps(
+            {"pages": [{"elements": [{"type": "unknown", "name": "q"}]}]}
+        )
+        body = "\n".join([document, "not json", "", "[]", unknown_type, document])
+
+        api_client.force_authenticate(user=superuser)
+
+        response = api_client.post(
+            self.url, data=body, content_type="application/x-ndjson"
+        )
+
+        assert response.status_code == 200
+        assert [item["line"] for item in response.data["created"]] == [1, 6]
+        assert [error["line"] for error in response.data["errors"]] == [2, 4, 5]
+
+        surveys = Survey.objects.filter(created_by=superuser)
+        assert surveys.count() == 2
+        for survey in surveys:
+            assert survey.active_version.questions.count() == 4
+            assert survey.active_version.settings.is_active
+
+    def test_large_documents_are_ingested_by_task(
+        self, api_client, superuser, settings
+    ):
+        settings.SURVEY_INLINE_INGESTION_MAX_QUESTIONS = 1
+        file_path = os.path.join(BASE_DIR, "surveys", "tests", "example.json")
+
+        with open(file_path) as f:
+            document = json.dumps(json.load(f))
+
+        api_client.force_authenticate(user=superuser)
+
+        response = api_client.post(
+            self.url, data=document, content_type="application/x-ndjson"
+        )
+
+        assert response.status_code == 200
+        form = SurveyForm.objects.get(parent__created_by=superuser)
+        assert form.questions.count() == 0
+
+        event = OutboxEvent.objects.get(task=handle_form_post_save.name)
+        handle_form_post_save(*event.args)
+
+        assert form.questions.count() == 4
+        assert Survey.objects.get(pk=form.parent_id).active_version == form
+
+    def test_if_not_allowed_user_returns_403(self, api_client, student):
+        api_client.force_authenticate(user=student)
+
+        response = api_client.post(
+            self.url, data="{}", content_type="application/x-ndjson"
+        )
+
+        assert response.status_code == 403
+
+
 @pytest.mark.django_db
 class TestSurveySoftDeleteOperation:
     soft_delete_view_name = "survey-detail"
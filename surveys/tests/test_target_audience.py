@@ -1,6 +1,10 @@
 import pytest
+from django.core.files.uploadedfile import SimpleUploadedFile
 from django.urls import reverse
 
+from accounts.models import User
+from accounts.tests.factories import UserFactory
+
 from ..models import TargetAudience
 from .factories import TargetAudienceFactory
 
@@ -157,3 +161,144 @@ class TestTargetAudienceViewSet:
 
         assert response.status_code == 201
         assert TargetAudience.objects.filter(name="Valid Audience").exists()
+
+
+@pytest.mark.django_db
+class TestTargetAudienceUpload:
+    create_view_name = "target-audience-create-from-file"
+    upload_view_name = "target-audience-upload"
+
+    def make_file(self, *rows):
+        return SimpleUploadedFile("roster.csv", "\n".join(rows).encode())
+
+    def test_create_from_file_reports_invalid_rows(
+        self, api_client, superuser, student, professor
+    ):
+        api_client.force_authenticate(user=superuser)
+        file = self.make_file(
+            "phone_number",
+            student.phone_number,
+            "12345",
+            "09120000000",
+            professor.phone_number,
+            student.phone_number,
+        )
+
+        response = api_client.post(
+            reverse(self.create_view_name), data={"name": "Roster", "file": file}
+        )
+
+        assert response.status_code == 201
+        assert response.data["added"] == 2
+        assert [error["row"] for error in response.data["errors"]] == [3, 4, 6]
+
+        target = TargetAudience.objects.get(id=response.data["id"])
+        assert set(target.include_phone_numbers) == {
+            student.phone_number,
+            professor.phone_number,
+        }
+        assert set(target.members.values_list("user_id", flat=True)) == {
+            student.id,
+            professor.id,
+        }
+
+    def test_upload_extends_existing_audience(self, api_client, superuser, student):
+        target = TargetAudienceFactory(roles=[User.UserRole.PROFESSOR])
+
+        api_client.force_authenticate(user=superuser)
+        response = api_client.post(
+            reverse(self.upload_view_name, args=[target.id]),
+            data={
+                "file": self.make_file(student.phone_number),
+                "list_name": "exclude_phone_numbers",
+            },
+        )
+
+        assert response.status_code == 200
+        target.refresh_from_db()
+        assert target.exclude_phone_numbers == [student.phone_number]
+
+    def test_upload_if_unsupported_file_returns_400(self, api_client, superuser):
+        api_client.force_authenticate(user=superuser)
+        response = api_client.post(
+            reverse(self.create_view_name),
+            data={"file": SimpleUploadedFile("roster.txt", b"09121234567")},
+        )
+
+        assert response.status_code == 400
+
+
+@pytest.mark.django_db
+class TestTargetAudienceMembers:
+    def get_member_ids(self, target):
+        return set(target.members.values_list("user_id", flat=True))
+
+    def test_members_rebuilt_when_rules_change(self, student, professor, management):
+        target = TargetAudienceFactory(
+            roles=[User.UserRole.STUDENT, User.UserRole.MANAGEMENT],
+            include_phone_numbers=[professor.phone_number],
+            exclude_phone_numbers=[management.phone_number],
+        )
+
+        assert self.get_member_ids(target) == {student.id, professor.id}
+
+        target.roles = []
+        target.save()
+
+        assert self.get_member_ids(target) == {professor.id}
+
+    def test_members_synced_when_user_role_changes(self, student, management):
+        target = TargetAudienceFactory(roles=[User.UserRole.STUDENT])
+        assert self.get_member_ids(target) == {student.id}
+
+        management.role = User.UserRole.STUDENT
+        management.save()
+        student.role = User.UserRole.PROFESSOR
+        student.save(update_fields=["role"])
+
+        assert self.get_member_ids(target) == {management.id}
+
+
+@pytest.mark.django_db
+class TestTargetAudienceCombine:
+    view_name = "target-audience-combine"
+
+    def test_combine_counts_union_intersection_and_difference(
+        self, api_client, student, professor, management
+    ):
+        # نقش مدیر سیستم ثابت است تا در هیچ جامعه هدفی شمرده نشود
+        superuser = UserFactory(
+            is_staff=True, is_superuser=True, role=User.UserRole.EMPLOYEE
+        )
+        students = TargetAudienceFactory(roles=[User.UserRole.STUDENT])
+        staff = TargetAudienceFactory(
+            roles=[User.UserRole.PROFESSOR, User.UserRole.MANAGEMENT]
+        )
+        managers = TargetAudienceFactory(roles=[User.UserRole.MANAGEMENT])
+
+        api_client.force_authenticate(user=superuser)
+        response = api_client.post(
+            reverse(self.view_name),
+            data={"union": [students.id, staff.id], "difference": [managers.id]},
+            format="json",
+        )
+
+        assert response.status_code == 200
+        assert response.data["count"] == 2
+
+        response = api_client.post(
+            reverse(self.view_name),
+            data={"intersection": [staff.id], "roles": [User.UserRole.PROFESSOR]},
+            format="json",
+        )
+
+        assert response.status_code == 200
+        assert response.data["count"] == 1
+
+    def test_combine_if_target_not_exists_returns_400(self, api_client, superuser):
+        api_client.force_authenticate(user=superuser)
+        response = api_client.post(
+            reverse(self.view_name), data={"union": [0]}, format="json"
+        )
+
+        assert response.status_code == 400
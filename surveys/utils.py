@@ -1,6 +1,42 @@
-from django.db import transaction
-
-from .models import Question, QuestionOptions, Survey, SurveyForm, SurveyFormSettings
+import hashlib
+import json
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db import connection, transaction
+from django.utils.translation import gettext_lazy as _
+
+from .api.selectors import get_all_users_target, get_user_target_audiences
+from .audiences import invalidate_audience_bitmaps
+from .context import invalidate_submission_context
+from .links import remember_one_time_link_tokens
+from .models import (
+    OneTimeLink,
+    Question,
+    QuestionOptions,
+    Survey,
+    SurveyForm,
+    SurveyFormSettings,
+    TargetAudience,
+    TargetAudienceMember,
+)
+from .schema import invalidate_form_schema
+
+ONE_TIME_LINKS_JOB_KEY = "surveys:one_time_links_job"
+
+CHOICE_QUESTION_TYPES = ["radiogroup", "ranking", "checkbox", "dropdown", "tagbox"]
+
+QUESTION_OPTION_VALUE_FIELDS = [
+    "type",
+    "value",
+    "text_value",
+    "boolean_value",
+    "numeric_value",
+    "image_value",
+    "json_value",
+]
 
 
 def survey_settings_activation(settings: SurveyFormSettings):
@@ -20,38 +56,33 @@ def survey_settings_activation(settings: SurveyFormSettings):
             if parent_survey.active_version == form:
                 Survey.objects.filter(pk=parent_survey.pk).update(active_version=None)
 
+        invalidate_submission_context(parent_survey.uuid)
+
 
-def create_question(
+def build_question(
     *,
     form: SurveyForm,
     question_data: dict,
     parent_question: Question | None = None,
 ) -> Question:
-    question_name = question_data.get("name")
     question_type = question_data.get("type")
-    question_title = question_data.get("title", None)
 
-    question = Question.objects.create(
+    return Question(
         survey=form,
-        name=question_name,
+        name=question_data.get("name"),
         type=Question.QuestionType[question_type.upper()],
-        title=question_title,
+        title=question_data.get("title", None),
         parent=parent_question,
     )
 
-    handle_question_options(question=question, question_data=question_data)
-
-    handle_nested_questions(
-        form=form, parent_question=question, question_data=question_data
-    )
-
-    return question
-
 
-def handle_question_options(*, question: Question, question_data: dict) -> None:
+def build_question_options(
+    *, question: Question, question_data: dict
+) -> list[QuestionOptions]:
     question_type = question_data.get("type")
+    question_options = []
 
-    if question_type in ["radiogroup", "ranking", "checkbox", "dropdown", "tagbox"]:
+    if question_type in CHOICE_QUESTION_TYPES:
         choices = question_data.get("choices", [])
 
         if choices:
@@ -76,8 +107,7 @@ def handle_question_options(*, question: Question, question_data: dict) -> None:
                         text_value=choice_text,
                     )
 
-                question_option.full_clean()
-                question_option.save()
+                question_options.append(question_option)
 
     elif question_type == "boolean":
         choices = {
@@ -86,14 +116,14 @@ def handle_question_options(*, question: Question, question_data: dict) -> None:
         }
 
         for label_value, boolean_value in choices.items():
-            question_option = QuestionOptions(
-                question=question,
-                type=QuestionOptions.OptionType.BOOLEAN,
-                value=label_value,
-                boolean_value=True if label_value == "labelTrue" else False,
+            question_options.append(
+                QuestionOptions(
+                    question=question,
+                    type=QuestionOptions.OptionType.BOOLEAN,
+                    value=label_value,
+                    boolean_value=True if label_value == "labelTrue" else False,
+                )
             )
-            question_option.full_clean()
-            question_option.save()
 
     elif question_type == "rating":
         choices = question_data.get("rateValues", None)
@@ -102,122 +132,577 @@ def handle_question_options(*, question: Question, question_data: dict) -> None:
         if choices:
             for choice in choices:
                 if isinstance(choice, dict):
-                    question_option = QuestionOptions(
-                        question=question,
-                        type=QuestionOptions.OptionType.NUMERIC,
-                        value=choice.get("text"),
-                        numeric_value=choice.get("value"),
+                    question_options.append(
+                        QuestionOptions(
+                            question=question,
+                            type=QuestionOptions.OptionType.NUMERIC,
+                            value=choice.get("text"),
+                            numeric_value=choice.get("value"),
+                        )
                     )
-                    question_option.full_clean()
-                    question_option.save()
                 elif isinstance(choice, int):
-                    question_option = QuestionOptions(
-                        question=question,
-                        type=QuestionOptions.OptionType.NUMERIC,
-                        value=str(choice),
-                        numeric_value=choice,
+                    question_options.append(
+                        QuestionOptions(
+                            question=question,
+                            type=QuestionOptions.OptionType.NUMERIC,
+                            value=str(choice),
+                            numeric_value=choice,
+                        )
                     )
-                    question_option.full_clean()
-                    question_option.save()
 
         elif rate_count:
             for i in range(1, rate_count + 1):
-                question_option = QuestionOptions(
-                    question=question,
-                    type=QuestionOptions.OptionType.NUMERIC,
-                    value=str(i),
-                    numeric_value=i,
+                question_options.append(
+                    QuestionOptions(
+                        question=question,
+                        type=QuestionOptions.OptionType.NUMERIC,
+                        value=str(i),
+                        numeric_value=i,
+                    )
                 )
-                question_option.full_clean()
-                question_option.save()
 
     elif question_type == "imagepicker":
         choices = question_data.get("choices", None)
         if choices is not None:
             for choice in choices:
-                question_option = QuestionOptions(
-                    question=question,
-                    type=QuestionOptions.OptionType.IMAGE,
-                    value=choice.get("value"),
-                    image_value=choice.get("imageLink"),
+                question_options.append(
+                    QuestionOptions(
+                        question=question,
+                        type=QuestionOptions.OptionType.IMAGE,
+                        value=choice.get("value"),
+                        image_value=choice.get("imageLink"),
+                    )
                 )
-                question_option.full_clean()
-                question_option.save()
 
     elif question_type in ["matrix", "matrixdropdown", "matrixdynamic"]:
-        rows = question_data.get("rows", None)
-        columns = question_data.get("columns", None)
-        choices = question_data.get("choices", None)
+        for value, json_value in [
+            ("matrix_rows", question_data.get("rows", None)),
+            ("matrix_choices", question_data.get("choices", None)),
+            ("matrix_columns", question_data.get("columns", None)),
+        ]:
+            if json_value:
+                question_options.append(
+                    QuestionOptions(
+                        question=question,
+                        type=QuestionOptions.OptionType.JSON,
+                        value=value,
+                        json_value=json_value,
+                    )
+                )
 
-        if rows:
-            rows_question_option = QuestionOptions(
-                question=question,
-                type=QuestionOptions.OptionType.JSON,
-                value="matrix_rows",
-                json_value=rows,
-            )
-            rows_question_option.full_clean()
-            rows_question_option.save()
+    return question_options
 
-        if choices:
-            choices_question_option = QuestionOptions(
-                question=question,
-                type=QuestionOptions.OptionType.JSON,
-                value="matrix_choices",
-                json_value=choices,
-            )
-            choices_question_option.full_clean()
-            choices_question_option.save()
-
-        if columns:
-            columns_question_option = QuestionOptions(
-                question=question,
-                type=QuestionOptions.OptionType.JSON,
-                value="matrix_columns",
-                json_value=columns,
+
+def validate_question_options(question_options: list[QuestionOptions]) -> None:
+    """
+    Validate options in memory before they are bulk inserted: field and
+    ``clean`` checks per option, uniqueness of ``value`` per question.
+    """
+    values = set()
+
+    for question_option in question_options:
+        question_option.clean_fields(exclude=["question"])
+        question_option.clean()
+
+        key = (question_option.question, question_option.value)
+        if key in values:
+            raise ValidationError(
+                {"value": _(f"گزینه {question_option.value} تکراری است.")}
             )
-            columns_question_option.full_clean()
-            columns_question_option.save()
+        values.add(key)
 
 
-def handle_nested_questions(
-    *, form: SurveyForm, parent_question: Question, question_data: dict
-) -> None:
+def get_nested_questions_data(question_data: dict) -> list[dict]:
     question_type = question_data.get("type")
 
     if question_type == "multipletext":
-        nested_question_items = question_data.get("items")
-
-        for nested_question_item in nested_question_items:
-            nested_data = {
+        return [
+            {
                 "type": "text",
                 "name": nested_question_item.get("name"),
                 "title": nested_question_item.get("title", None),
             }
-            create_question(
-                form=form, question_data=nested_data, parent_question=parent_question
-            )
+            for nested_question_item in question_data.get("items") or []
+        ]
 
     elif question_type in ["panel", "paneldynamic"]:
         nested_elements = question_data.get("elements") or question_data.get(
             "templateElements"
         )
+        return nested_elements or []
+
+    return []
+
+
+def _validate_list(value, message: str, item_types: tuple = (dict,)) -> None:
+    if value is None:
+        return
+    if not isinstance(value, list) or not all(
+        isinstance(item, item_types) for item in value
+    ):
+        raise ValidationError(message)
+
+
+def validate_survey_pages(pages) -> None:
+    """
+    Check that a SurveyJS page tree has the shape ``create_questions``
+    relies on, so malformed documents fail with a ``ValidationError``.
+    """
+    _validate_list(pages, _("صفحات سند باید لیستی از شیء ها باشند."))
+
+    level = []
+    for page in pages or []:
+        _validate_list(
+            page.get("elements"), _("عناصر صفحه باید لیستی از شیء ها باشند.")
+        )
+        level.extend(page.get("elements") or [])
+
+    while level:
+        next_level = []
+        for question_data in level:
+            question_type = question_data.get("type")
+            if (
+                not isinstance(question_type, str)
+                or question_type.upper() not in Question.QuestionType.names
+            ):
+                raise ValidationError(_(f"نوع سوال {question_type} معتبر نیست."))
+
+            if question_type in CHOICE_QUESTION_TYPES:
+                _validate_list(
+                    question_data.get("choices"),
+                    _("گزینه های سوال باید متن یا شیء باشند."),
+                    (str, dict),
+                )
+            elif question_type == "imagepicker":
+                _validate_list(
+                    question_data.get("choices"), _("گزینه های تصویر باید شیء باشند.")
+                )
+            elif question_type == "rating":
+                _validate_list(
+                    question_data.get("rateValues"),
+                    _("مقادیر امتیاز باید لیست باشند."),
+                    (object,),
+                )
+                rate_count = question_data.get("rateCount")
+                if rate_count is not None and not isinstance(rate_count, int):
+                    raise ValidationError(_("تعداد امتیاز باید عدد باشد."))
+            elif question_type == "multipletext":
+                _validate_list(
+                    question_data.get("items"),
+                    _("آیتم های سوال باید لیستی از شیء ها باشند."),
+                )
+            elif question_type in ["panel", "paneldynamic"]:
+                for key in ["elements", "templateElements"]:
+                    _validate_list(
+                        question_data.get(key),
+                        _("عناصر پنل باید لیستی از شیء ها باشند."),
+                    )
+
+            next_level.extend(get_nested_questions_data(question_data))
+        level = next_level
+
+
+def get_survey_pages(metadata) -> list[dict]:
+    """Return the validated page tree of a SurveyJS document."""
+    if metadata is None:
+        return []
+    if not isinstance(metadata, dict):
+        raise ValidationError(_("سند باید یک شیء JSON باشد."))
+
+    pages = metadata.get("pages", [])
+    validate_survey_pages(pages)
+    return pages or []
+
+
+def flatten_questions(pages: list[dict]) -> list[list[tuple[dict, int | None]]]:
+    """
+    Flatten the SurveyJS page/panel tree into levels. Every level holds
+    ``(question_data, parent_index)`` pairs, where ``parent_index`` points
+    into the previous level.
+    """
+    levels = []
+    level = [
+        (question_element, None)
+        for page in pages
+        for question_element in page.get("elements") or []
+    ]
+
+    while level:
+        levels.append(level)
+        level = [
+            (nested_data, parent_index)
+            for parent_index, (question_data, _parent_index) in enumerate(level)
+            for nested_data in get_nested_questions_data(question_data)
+        ]
+
+    return levels
+
+
+def count_questions(pages: list[dict]) -> int:
+    validate_survey_pages(pages)
+    return sum(len(level) for level in flatten_questions(pages))
+
+
+def hash_question_definition(question_data: dict) -> str:
+    definition = json.dumps(
+        question_data, sort_keys=True, ensure_ascii=False, separators=(",", ":")
+    )
+    return hashlib.sha256(definition.encode()).hexdigest()
+
+
+def get_previous_form(form: SurveyForm) -> SurveyForm | None:
+    return (
+        SurveyForm.objects.filter(parent_id=form.parent_id, version__lt=form.version)
+        .order_by("-version")
+        .first()
+    )
 
-        if nested_elements:
 
-            for nested_element in nested_elements:
-                create_question(
+def create_questions(
+    *,
+    form: SurveyForm,
+    pages: list[dict],
+    previous_form: SurveyForm | None = None,
+) -> list[Question]:
+    """
+    Create the questions of ``form`` with one insert per tree level (so
+    parents have their ids before their children are built) and all their
+    options with a single insert.
+
+    A question whose definition hash matches a question of
+    ``previous_form`` is copied from it, with its subtree and options,
+    instead of being parsed again. Questions copied from or replacing a
+    question of ``previous_form`` keep a link to it in ``source``.
+    """
+    validate_survey_pages(pages)
+
+    previous_by_hash = {}
+    previous_by_name = {}
+    previous_children = defaultdict(list)
+
+    if previous_form is not None:
+        for previous in Question.objects.filter(survey=previous_form):
+            if previous.definition_hash:
+                previous_by_hash.setdefault(previous.definition_hash, previous)
+            previous_by_name[(previous.parent_id, previous.name)] = previous
+            if previous.parent_id is not None:
+                previous_children[previous.parent_id].append(previous)
+
+    def parse(question_data: dict, parent_index: int | None) -> tuple:
+        definition_hash = hash_question_definition(question_data)
+        copied_from = previous_by_hash.get(definition_hash)
+        return question_data, copied_from, definition_hash, parent_index
+
+    created_questions = []
+    copied_questions = []
+    question_options = []
+    parent_questions = []
+    level = [
+        parse(question_element, None)
+        for page in pages
+        for question_element in page.get("elements") or []
+    ]
+
+    while level:
+        questions = []
+        for question_data, copied_from, definition_hash, parent_index in level:
+            parent_question = (
+                parent_questions[parent_index] if parent_index is not None else None
+            )
+
+            if copied_from is not None:
+                question = Question(
+                    survey=form,
+                    name=copied_from.name,
+                    title=copied_from.title,
+                    type=copied_from.type,
+                    parent=parent_question,
+                    definition_hash=copied_from.definition_hash,
+                    source=copied_from,
+                )
+            else:
+                question = build_question(
                     form=form,
-                    question_data=nested_element,
+                    question_data=question_data,
                     parent_question=parent_question,
                 )
+                question.definition_hash = definition_hash
+                question.source = previous_by_name.get(
+                    (
+                        parent_question.source_id if parent_question else None,
+                        question.name,
+                    )
+                )
+
+            questions.append(question)
+
+        Question.objects.bulk_create(questions)
+
+        next_level = []
+        for index, (question, item) in enumerate(zip(questions, level)):
+            question_data, copied_from = item[0], item[1]
+
+            if copied_from is not None:
+                copied_questions.append(question)
+                next_level.extend(
+                    (None, child, None, index)
+                    for child in previous_children[copied_from.id]
+                )
+            else:
+                question_options.extend(
+                    build_question_options(
+                        question=question, question_data=question_data
+                    )
+                )
+                next_level.extend(
+                    parse(nested_data, index)
+                    for nested_data in get_nested_questions_data(question_data)
+                )
+
+        created_questions.extend(questions)
+        parent_questions = questions
+        level = next_level
+
+    validate_question_options(question_options)
+
+    if copied_questions:
+        copies = defaultdict(list)
+        for question in copied_questions:
+            copies[question.source_id].append(question)
+
+        for option in QuestionOptions.objects.filter(question_id__in=copies).values(
+            "question_id", *QUESTION_OPTION_VALUE_FIELDS
+        ):
+            for question in copies[option.pop("question_id")]:
+                question_options.append(QuestionOptions(question=question, **option))
+
+    QuestionOptions.objects.bulk_create(question_options)
+
+    return created_questions
+
+
+COPY_ROOT_QUESTIONS_SQL = """
+    INSERT INTO {question_table} (
+        uuid, survey_id, name, title, type, is_live, parent_id,
+        definition_hash, source_id, created_at
+    )
+    SELECT
+        gen_random_uuid(), target.form_id, question.name, question.title,
+        question.type, false, NULL, question.definition_hash, question.id,
+        question.created_at
+    FROM {question_table} AS question
+    CROSS JOIN unnest(%s::bigint[]) AS target(form_id)
+    WHERE question.survey_id = %s AND question.parent_id IS NULL
+    RETURNING source_id
+"""
+
+COPY_CHILD_QUESTIONS_SQL = """
+    INSERT INTO {question_table} (
+        uuid, survey_id, name, title, type, is_live, parent_id,
+        definition_hash, source_id, created_at
+    )
+    SELECT
+        gen_random_uuid(), parent_copy.survey_id, question.name, question.title,
+        question.type, false, parent_copy.id, question.definition_hash,
+        question.id, question.created_at
+    FROM {question_table} AS question
+    INNER JOIN {question_table} AS parent_copy
+        ON parent_copy.source_id = question.parent_id
+    WHERE question.parent_id = ANY(%s)
+        AND parent_copy.survey_id = ANY(%s)
+    RETURNING source_id
+"""
+
+COPY_QUESTION_OPTIONS_SQL = """
+    INSERT INTO {option_table} (
+        question_id, type, value, text_value, boolean_value, numeric_value,
+        image_value, json_value, created_at
+    )
+    SELECT
+        question_copy.id, question_option.type, question_option.value,
+        question_option.text_value, question_option.boolean_value,
+        question_option.numeric_value, question_option.image_value,
+        question_option.json_value, question_option.created_at
+    FROM {option_table} AS question_option
+    INNER JOIN {question_table} AS question_copy
+        ON question_copy.source_id = question_option.question_id
+    WHERE question_copy.survey_id = ANY(%s)
+"""
+
+COPY_FORM_SETTINGS_SQL = """
+    INSERT INTO {settings_table} (
+        form_id, is_active, start_date, end_date, max_submissions_per_user,
+        is_editable, created_at
+    )
+    SELECT
+        target.form_id, true, NULL, NULL, settings.max_submissions_per_user,
+        COALESCE(settings.is_editable, false), now()
+    FROM unnest(%s::bigint[]) AS target(form_id)
+    LEFT JOIN {settings_table} AS settings ON settings.form_id = %s
+"""
+
+
+def copy_form_questions(*, source_form: SurveyForm, target_form_ids: list[int]) -> None:
+    """
+    Copy the question tree and options of ``source_form`` into every form of
+    ``target_form_ids`` with ``INSERT ... SELECT`` statements: one per tree
+    level for the questions, remapping parents through ``source_id``, and
+    one for all options. The target forms must not have questions yet.
+
+    Copies keep the ``created_at`` of their source rows, so they are listed
+    in the same order as the questions and options of ``source_form``.
+
+    ``source`` of a copy points to the question it was copied from, the same
+    lineage link ``create_questions`` keeps between form versions. Here it
+    is also the remap key: a copied parent is found by its ``source_id``
+    within ``target_form_ids``, which is unambiguous only because those
+    forms have no other questions.
+    """
+    if not target_form_ids:
+        return
+
+    tables = {
+        "question_table": Question._meta.db_table,
+        "option_table": QuestionOptions._meta.db_table,
+    }
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            COPY_ROOT_QUESTIONS_SQL.format(**tables),
+            [target_form_ids, source_form.id],
+        )
+        parent_ids = list({row[0] for row in cursor.fetchall()})
+
+        while parent_ids:
+            cursor.execute(
+                COPY_CHILD_QUESTIONS_SQL.format(**tables),
+                [parent_ids, target_form_ids],
+            )
+            parent_ids = list({row[0] for row in cursor.fetchall()})
+
+        cursor.execute(COPY_QUESTION_OPTIONS_SQL.format(**tables), [target_form_ids])
 
 
-def create_questions(*, form: SurveyForm, pages: list[dict]) -> None:
-    for page in pages:
-        questions_elements = page.get("elements")
-        for question_element in questions_elements:
-            create_question(
-                form=form,
-                question_data=question_element,
+def copy_form_settings(*, source_form: SurveyForm, target_form_ids: list[int]) -> None:
+    """
+    Create active settings for every form of ``target_form_ids`` with the
+    submission rules (not the dates) of ``source_form``.
+    """
+    sql = COPY_FORM_SETTINGS_SQL.format(
+        settings_table=SurveyFormSettings._meta.db_table
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [target_form_ids, source_form.id])
+
+
+def ingest_survey_form(form: SurveyForm) -> bool:
+    """
+    Create the settings and questions of a new ``form`` from its SurveyJS
+    metadata. Returns ``False`` if the form was already ingested.
+    """
+    with transaction.atomic():
+        # قفل فرم تا درخواست و تسک به طور هم زمان سوالات را نسازند
+        SurveyForm.objects.select_for_update().filter(pk=form.pk).first()
+        if SurveyFormSettings.objects.filter(form=form).exists():
+            return False
+
+        SurveyFormSettings.objects.create(form=form, is_editable=False)
+        pages = get_survey_pages(form.metadata)
+        create_questions(form=form, pages=pages, previous_form=get_previous_form(form))
+        invalidate_form_schema(form.uuid)
+
+    return True
+
+
+REBUILD_TARGET_AUDIENCE_MEMBERS_SQL = """
+    INSERT INTO {member_table} (target_id, user_id, created_at)
+    SELECT %s, audience.id, now()
+    FROM ({users_sql}) AS audience
+"""
+
+
+def rebuild_target_audience_members(target: TargetAudience) -> None:
+    """
+    Replace the membership rows of ``target`` with the users its rules
+    select, using a single ``INSERT ... SELECT``.
+    """
+    users_sql, users_params = (
+        get_all_users_target(target).order_by().values("id").query.sql_with_params()
+    )
+    sql = REBUILD_TARGET_AUDIENCE_MEMBERS_SQL.format(
+        member_table=TargetAudienceMember._meta.db_table, users_sql=users_sql
+    )
+
+    with transaction.atomic():
+        TargetAudienceMember.objects.filter(target=target).delete()
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [target.pk, *users_params])
+        invalidate_audience_bitmaps(target_ids=[target.pk])
+
+
+def sync_user_target_memberships(user) -> None:
+    """Add ``user`` to and remove it from audiences after a profile change."""
+    target_ids = set(get_user_target_audiences(user).values_list("id", flat=True))
+    previous_target_ids = set(
+        TargetAudienceMember.objects.filter(user=user).values_list(
+            "target_id", flat=True
+        )
+    )
+
+    with transaction.atomic():
+        TargetAudienceMember.objects.filter(user=user).exclude(
+            target_id__in=target_ids
+        ).delete()
+        TargetAudienceMember.objects.bulk_create(
+            [
+                TargetAudienceMember(target_id=target_id, user=user)
+                for target_id in target_ids
+            ],
+            ignore_conflicts=True,
+        )
+        invalidate_audience_bitmaps(
+            target_ids=target_ids ^ previous_target_ids, roles=True
+        )
+
+
+def _one_time_links_job_key(job_id: str) -> str:
+    return f"{ONE_TIME_LINKS_JOB_KEY}:{job_id}"
+
+
+def set_one_time_links_job(job_id: str, **state) -> None:
+    cache.set(
+        _one_time_links_job_key(job_id),
+        state,
+        timeout=settings.ONE_TIME_LINKS_JOB_TIMEOUT,
+    )
+
+
+def get_one_time_links_job(job_id: str) -> dict | None:
+    return cache.get(_one_time_links_job_key(job_id))
+
+
+def create_one_time_links(
+    survey: Survey, number_of_links: int, job_id: str | None = None
+) -> None:
+    """
+    Create ``number_of_links`` links for ``survey`` with one bulk insert per
+    ``ONE_TIME_LINKS_BATCH_SIZE`` links, reporting the progress of
+    ``job_id`` after every chunk.
+    """
+    created = 0
+
+    while created < number_of_links:
+        batch_size = min(settings.ONE_TIME_LINKS_BATCH_SIZE, number_of_links - created)
+        links = OneTimeLink.objects.bulk_create(
+            [OneTimeLink(survey=survey) for _index in range(batch_size)]
+        )
+        remember_one_time_link_tokens(link.token for link in links)
+        created += batch_size
+
+        if job_id is not None:
+            set_one_time_links_job(
+                job_id,
+                status="running" if created < number_of_links else "done",
+                total=number_of_links,
+                created=created,
             )